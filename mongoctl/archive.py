@@ -0,0 +1,229 @@
+__author__ = 'richardxx'
+
+import bz2
+import errno
+import os
+import subprocess
+import sys
+import zlib
+
+from utils import ensure_dir
+from errors import MongoctlException
+from mongoctl_logging import log_info, log_verbose
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+# bytes read from the mongo tools and from archives at a time
+CHUNK_SIZE = 1024 * 1024
+
+# compression used when none is specified or can be told from the archive
+DEFAULT_COMPRESSION = "gzip"
+
+GZIP_LEVEL = 6
+
+# suffix of archives being written, renamed once complete
+PARTIAL_ARCHIVE_SUFFIX = ".part"
+
+###############################################################################
+# Compression Class
+###############################################################################
+class Compression(object):
+    """
+        A named compression and how to create its streaming compressors and
+        decompressors. Compressors have compress(data) and flush() like
+        zlib's, decompressors decompress(data) and optionally flush().
+    """
+
+    ###########################################################################
+    def __init__(self, name, extension, new_compressor, new_decompressor):
+        self.name = name
+        self.extension = extension
+        self.new_compressor = new_compressor
+        self.new_decompressor = new_decompressor
+
+###############################################################################
+class NoCompressor(object):
+
+    ###########################################################################
+    def compress(self, data):
+        return data
+
+    ###########################################################################
+    def decompress(self, data):
+        return data
+
+    ###########################################################################
+    def flush(self):
+        return ""
+
+###############################################################################
+# Global variables: compression name -> Compression
+__compressions__ = {}
+
+###############################################################################
+def register_compression(compression):
+    __compressions__[compression.name] = compression
+
+###############################################################################
+def get_compression(name):
+    compression = __compressions__.get(name)
+    if compression is None:
+        raise MongoctlException("Unknown compression '%s'. Available "
+                                "compressions: %s" %
+                                (name, ", ".join(sorted(__compressions__))))
+    return compression
+
+###############################################################################
+def guess_compression(archive):
+    """
+        Returns the compression of an archive from its extension, or the
+        default one.
+    """
+    for compression in __compressions__.values():
+        if compression.extension and archive.endswith(compression.extension):
+            return compression
+    return get_compression(DEFAULT_COMPRESSION)
+
+###############################################################################
+register_compression(Compression(
+    "gzip", ".gz",
+    lambda: zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS),
+    lambda: zlib.decompressobj(16 + zlib.MAX_WBITS)))
+
+register_compression(Compression("bz2", ".bz2", bz2.BZ2Compressor,
+                                 bz2.BZ2Decompressor))
+
+register_compression(Compression("none", None, NoCompressor, NoCompressor))
+
+try:
+    import zstandard
+    register_compression(Compression(
+        "zstd", ".zst",
+        lambda: zstandard.ZstdCompressor().compressobj(),
+        lambda: zstandard.ZstdDecompressor().decompressobj()))
+except ImportError:
+    pass
+
+###############################################################################
+def write_archive(command, archive, compression):
+    """
+        Runs command and compresses what it writes to stdout into the archive
+        file (or stdout if archive is "-") as it comes, without writing an
+        uncompressed copy anywhere. The archive is written next to its final
+        path (in a directory created if needed) and only moved there once
+        complete.
+        Returns the number of bytes read from command and written.
+    """
+    compressor = compression.new_compressor()
+    if archive == "-":
+        archive_file = sys.stdout
+        partial_path = None
+    else:
+        # like mongodump does for --out
+        if os.path.dirname(archive):
+            ensure_dir(os.path.dirname(archive))
+        partial_path = archive + PARTIAL_ARCHIVE_SUFFIX
+        archive_file = open(partial_path, "wb")
+
+    process = subprocess.Popen(command, stdout=subprocess.PIPE)
+    read_size = 0
+    written_size = 0
+    try:
+        try:
+            while True:
+                chunk = process.stdout.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                read_size += len(chunk)
+                data = compressor.compress(chunk)
+                archive_file.write(data)
+                written_size += len(data)
+
+            data = compressor.flush()
+            archive_file.write(data)
+            written_size += len(data)
+            archive_file.flush()
+        except Exception:
+            process.kill()
+            raise
+        finally:
+            returncode = process.wait()
+            if partial_path:
+                archive_file.close()
+
+        if returncode != 0:
+            raise MongoctlException("'%s' failed with exit code %s" %
+                                    (os.path.basename(command[0]),
+                                     returncode))
+    except Exception:
+        if partial_path:
+            os.remove(partial_path)
+        raise
+
+    if partial_path:
+        os.rename(partial_path, archive)
+
+    log_verbose("Compressed %s byte(s) into %s byte(s) with %s" %
+                (read_size, written_size, compression.name))
+    return read_size, written_size
+
+###############################################################################
+def read_archive(command, archive, compression):
+    """
+        Decompresses the archive file (or stdin if archive is "-") into the
+        stdin of command as it is read.
+        Returns the number of bytes read and written to command.
+    """
+    decompressor = compression.new_decompressor()
+    if archive == "-":
+        archive_file = sys.stdin
+    else:
+        archive_file = open(archive, "rb")
+
+    process = subprocess.Popen(command, stdin=subprocess.PIPE)
+    read_size = 0
+    written_size = 0
+    try:
+        try:
+            while True:
+                chunk = archive_file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                read_size += len(chunk)
+                data = decompressor.decompress(chunk)
+                process.stdin.write(data)
+                written_size += len(data)
+
+            if hasattr(decompressor, "flush"):
+                data = decompressor.flush()
+                process.stdin.write(data)
+                written_size += len(data)
+            process.stdin.close()
+        except IOError, e:
+            # the command exited early; its exit code tells why
+            if e.errno != errno.EPIPE:
+                process.kill()
+                raise
+        except Exception:
+            process.kill()
+            raise
+    finally:
+        returncode = process.wait()
+        if archive_file is not sys.stdin:
+            archive_file.close()
+
+    if returncode != 0:
+        raise MongoctlException("'%s' failed with exit code %s" %
+                                (os.path.basename(command[0]), returncode))
+
+    log_verbose("Decompressed %s byte(s) into %s byte(s) with %s" %
+                (read_size, written_size, compression.name))
+    return read_size, written_size
+
+###############################################################################
+def log_archive_sizes(archive, read_size, written_size):
+    ratio = float(written_size) / read_size if read_size else 1
+    log_info("Archive '%s': %s byte(s) of dump stored in %s byte(s) (%.1f%%)"
+             % (archive, read_size, written_size, ratio * 100))
@@ -1,7 +1,9 @@
 __author__ = 'richardxx'
 
+import threading
 
 import mongoctl.repository as repository
+from mongoctl import config
 from mongoctl.utils import document_pretty_string
 from mongoctl.mongoctl_logging import log_info, log_error
 
@@ -9,16 +11,22 @@ from mongoctl.objects.sharded_cluster import ShardedCluster
 from mongoctl.objects.replicaset_cluster import ReplicaSetCluster
 
 from mongoctl.errors import MongoctlException
+from mongoctl.parallel import fan_out, fan_out_graph
 
 from mongoctl.commands.server.start import start_server
 from mongoctl.commands.server.stop import stop_server
 
+###############################################################################
+# CONSTS
+###############################################################################
+# max number of cluster servers started at once
+DEFAULT_START_CONCURRENCY = 8
 
 ###############################################################################
 # start/stop sharding/replicaset cluster command
 ###############################################################################
 def start_cluster_command(parsed_options):
-    cluster_id = parsed_options["ClusterId"]
+    cluster_id = parsed_options.ClusterId
     cluster = repository.lookup_and_validate_cluster(cluster_id)
 
     if isinstance(cluster, ShardedCluster):
@@ -28,45 +36,62 @@ def start_cluster_command(parsed_options):
 
 
 def stop_cluster_command(parsed_options):
-    cluster_id = parsed_options["ClusterId"]
+    cluster_id = parsed_options.ClusterId
     cluster = repository.lookup_and_validate_cluster(cluster_id)
+    username = getattr(parsed_options, "username", None)
+    password = getattr(parsed_options, "password", None)
 
     if isinstance(cluster, ShardedCluster):
-        stop_shard_cluster(cluster)
+        stop_shard_cluster(cluster, username=username, password=password)
     else:
-        stop_replicaset_cluster(cluster)
+        stop_replicaset_cluster(cluster, username=username, password=password)
 
 
 def start_shard_cluster(cluster):
-    #List of list of required servers
-    list_of_member_list = [cluster.shards, cluster.config_members, cluster.mongos_members]
-    #Record the list of started members
+    """
+    Starts the shards (servers or replica sets) and config servers
+    concurrently and each mongos once all config servers are up, at most
+    startConcurrency servers at a time, replica set members included.
+    If any fails, the servers started so far are stopped.
+    """
+    config_servers = [member.get_shard() for member in cluster.config_members]
+    shards = [member.get_shard() for member in cluster.shards]
+
+    dependencies = {}
+    mongos_servers = []
+    for member in cluster.mongos_members:
+        mongos_servers.append(member.get_shard())
+        dependencies[member.get_shard()] = config_servers
+
+    # shared by the pools of the replica set shards
+    start_slots = new_start_slots()
+
+    def start_member(shard):
+        if isinstance(shard, ReplicaSetCluster):
+            return start_replicaset_members(shard, start_slots=start_slots)
+        else:
+            return start_cluster_server(shard, start_slots=start_slots)
+
+    results = fan_out_graph(start_member,
+                            shards + config_servers + mongos_servers,
+                            dependencies=dependencies,
+                            max_workers=get_start_concurrency())
+
+    # We only stop the servers that were not running before
     started_members = []
-
-    # We first start the servers
-    for member_list in list_of_member_list:
-        for server_descriptor in member_list:
-            shard = server_descriptor.get_shard()
-
-            try:
-                if not isinstance(shard, ReplicaSetCluster):
-                    if not shard.is_online():
-                        # We set the server working in background compulsorily
-                        shard.set_cmd_option("fork", True)
-                        start_server(shard)
-                else:
-                    # TODO: Instructions for starting a replicaset cluster
-                    pass
-
-                started_members.append(shard)
-            except MongoctlException, e:
-                shutdown_severs(started_members)
-                log_error(e.message)
-                return False
-
-    # We add the shard servers to the sharding configuration
-    for server_descriptor in cluster.shards:
-        shard = server_descriptor.get_server()
+    for result in results:
+        if result.done and result.value:
+            started_members.extend(result.value)
+
+    errors = [result.error for result in results if result.error]
+    if errors:
+        shutdown_severs(started_members)
+        for e in errors:
+            log_error("%s" % e)
+        return False
+
+    # We add the shards to the sharding configuration
+    for shard in shards:
         if not cluster.is_shard_configured(shard):
             # It is never added to this sharding cluster
             cluster.add_shard(shard)
@@ -74,8 +99,88 @@ def start_shard_cluster(cluster):
     return True
 
 
+def start_cluster_server(server, start_slots=None):
+    """
+    Starts the server if it is not running yet, leaving its replica set
+    configuration to the caller. start_slots bounds the servers being
+    started at once.
+    @return: A list of the started servers
+    """
+    if server.is_online():
+        return []
+
+    # We set the server working in background compulsorily
+    server.set_cmd_option("fork", True)
+    with start_slots or new_start_slots():
+        start_server(server, configure_rs=False)
+    return [server]
+
+
+def get_start_concurrency():
+    return config.get_mongoctl_config_val("startConcurrency",
+                                          DEFAULT_START_CONCURRENCY)
+
+
+def new_start_slots():
+    return threading.BoundedSemaphore(get_start_concurrency())
+
+
 def start_replicaset_cluster(cluster):
-    pass
+    try:
+        start_replicaset_members(cluster)
+        return True
+    except MongoctlException, e:
+        log_error(e.message)
+        return False
+
+
+def start_replicaset_members(cluster, start_slots=None):
+    """
+    Starts all members concurrently then, once all starts are done and a
+    majority of the members is up, initializes the replica set (or adds the
+    members missing from its configuration) once. A replica set can only be
+    initiated once all its members respond.
+    If no majority comes up or the replica set can not be configured, the
+    members started are stopped.
+    @return: A list of the started servers
+    """
+    servers = [member.get_server() for member in cluster.get_members()]
+    start_slots = start_slots or new_start_slots()
+    results = fan_out_graph(lambda server: start_cluster_server(
+                                server, start_slots=start_slots),
+                            servers,
+                            max_workers=get_start_concurrency(),
+                            stop_on_error=False)
+
+    started_servers = []
+    for result in results:
+        if result.error:
+            log_error("Unable to start server '%s' of cluster '%s'. "
+                      "Cause: %s" % (result.item.id, cluster.id, result.error))
+        elif result.done:
+            started_servers.extend(result.value)
+
+    online_count = len([server for server in servers if server.is_online()])
+    if online_count <= len(servers) / 2:
+        shutdown_severs(started_servers)
+        raise MongoctlException("Unable to start replica set cluster '%s':"
+                                " only %s out of %s members are up." %
+                                (cluster.id, online_count, len(servers)))
+
+    try:
+        if not cluster.is_replicaset_initialized():
+            cluster.initialize_replicaset()
+        elif not all(map(cluster.is_member_configured_for, servers)):
+            cluster.configure_replicaset()
+        else:
+            log_info("Replica set cluster '%s' is up: %s out of %s members "
+                     "online." % (cluster.id, online_count, len(servers)))
+    except Exception:
+        # the caller can not stop what it does not know was started
+        shutdown_severs(started_servers)
+        raise
+
+    return started_servers
 
 
 def stop_shard_cluster(cluster, username=None, password=None):
@@ -85,33 +190,46 @@ def stop_shard_cluster(cluster, username=None, password=None):
     @param cluster:
     @return:
     """
-    list_of_server_list = [cluster.mongos_members()]
-    started_servers = []
+    started_servers = [server_descriptor.get_shard()
+                       for server_descriptor in cluster.mongos_members]
+
+    shutdown_severs(started_servers, username=username, password=password)
 
-    for server_list in list_of_server_list:
-        for server_descriptor in server_list:
-            shard = server_descriptor.get_shard()
-            started_servers.append(shard)
 
-    shutdown_severs(started_servers)
+def stop_replicaset_cluster(cluster, username=None, password=None):
+    """
+    Stops the secondaries (and other non primary members) concurrently, then
+    the primary so that no election happens in the meantime.
+    """
+    primary_member = cluster.get_primary_member()
+    primary_server = primary_member.get_server() if primary_member else None
+
+    servers = [member.get_server() for member in cluster.get_members()]
+    shutdown_severs([server for server in servers
+                     if server is not primary_server],
+                    username=username, password=password)
 
+    if primary_server is not None:
+        shutdown_severs([primary_server], username=username,
+                        password=password)
 
-def stop_replicaset_cluster():
-    pass
 
-def shutdown_severs(started_members):
+def shutdown_severs(started_members, username=None, password=None):
     """
-    Close the sharding members given in the list
+    Close the sharding members given in the list, all at once
     @param started_members: A list of correctly opened sharding members
     @return:
     """
-    for shard in started_members:
+    def stop_member(shard):
         try:
             if not isinstance(shard, ReplicaSetCluster):
-                stop_server(shard)
+                stop_server(shard, username=username, password=password)
             else:
-                pass
+                stop_replicaset_cluster(shard, username=username,
+                                        password=password)
 
         except MongoctlException, e:
             log_error(e.message)
 
+    fan_out(stop_member, started_members, timeout=0,
+            max_workers=get_start_concurrency())
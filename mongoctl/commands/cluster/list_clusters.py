@@ -1,31 +1,106 @@
 __author__ = 'abdul'
 
+import itertools
+import sys
+
 import mongoctl.repository as repository
 
 from mongoctl.mongoctl_logging import log_info
 from mongoctl.utils import to_string
+from mongoctl.parallel import fan_out
+from mongoctl.commands.command_utils import get_probe_options
+from mongoctl.objects.sharded_cluster import ShardedCluster
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+# number of clusters whose servers are checked at once with --status
+STATUS_BATCH_SIZE = 100
+
 ###############################################################################
 # list clusters command
 ###############################################################################
 def list_clusters_command(parsed_options):
-    clusters = repository.lookup_all_clusters()
-    if not clusters or len(clusters) < 1:
+    # sorted by id, streamed from the repository
+    clusters = repository.iter_clusters()
+    first_cluster = next(clusters, None)
+    if first_cluster is None:
         log_info("No clusters configured")
         return
 
-    # sort clusters by id
-    clusters = sorted(clusters, key=lambda c: c.id)
+    clusters = itertools.chain([first_cluster], clusters)
+    show_status = getattr(parsed_options, "status", False)
+
     bar = "-"*80
     print bar
     formatter = "%-25s %-40s %s"
-    print formatter % ("_ID", "DESCRIPTION", "MEMBERS")
+    if show_status:
+        formatter = "%-25s %-30s %-9s %s"
+        print formatter % ("_ID", "DESCRIPTION", "ONLINE", "MEMBERS")
+    else:
+        print formatter % ("_ID", "DESCRIPTION", "MEMBERS")
     print bar
 
-    for cluster in clusters:
-        desc = to_string(cluster.get_description())
+    if not show_status:
+        for cluster in clusters:
+            print formatter % (cluster.id,
+                               to_string(cluster.get_description()),
+                               get_members_info_str(cluster))
+        print "\n"
+        return
 
-        members_info = "[ %s ]" % ", ".join(cluster.get_members_info)
+    # the servers of each batch of clusters are checked concurrently
+    timeout, max_workers = get_probe_options(parsed_options)
+    while True:
+        batch = list(itertools.islice(clusters, STATUS_BATCH_SIZE))
+        if not batch:
+            break
 
-        print formatter % (cluster.id, desc, members_info)
+        online_servers = get_online_servers(batch, timeout=timeout,
+                                            max_workers=max_workers)
+        for cluster in batch:
+            servers = get_cluster_servers(cluster)
+            online = [server for server in servers
+                      if server.id in online_servers]
+            print formatter % (cluster.id,
+                               to_string(cluster.get_description()),
+                               "%d/%d" % (len(online), len(servers)),
+                               get_members_info_str(cluster))
+        sys.stdout.flush()
     print "\n"
 
+###############################################################################
+def get_members_info_str(cluster):
+    return "[ %s ]" % ", ".join(cluster.get_members_info)
+
+###############################################################################
+def get_online_servers(clusters, timeout=None, max_workers=None):
+    """
+        Returns the ids of the online member servers of all clusters, checking
+        all of them concurrently.
+    """
+    servers = {}
+    for cluster in clusters:
+        for server in get_cluster_servers(cluster):
+            servers[server.id] = server
+
+    results = fan_out(lambda server: server.is_online(), servers.values(),
+                      timeout=timeout, max_workers=max_workers)
+    return set(result.item.id for result in results
+               if result.done and result.value)
+
+###############################################################################
+def get_cluster_servers(cluster):
+    if isinstance(cluster, ShardedCluster):
+        servers = [member.get_server() for member in
+                   cluster.mongos_members + cluster.config_members]
+        for shard_member in cluster.shards:
+            if shard_member.get_cluster():
+                servers.extend(get_cluster_servers(shard_member.get_cluster()))
+            else:
+                servers.append(shard_member.get_server())
+    else:
+        servers = [member.get_server() for member in cluster.get_members()]
+
+    return [server for server in servers if server is not None]
@@ -0,0 +1,289 @@
+__author__ = 'richardxx'
+
+import threading
+import time
+
+import mongoctl.repository as repository
+from mongoctl import config
+from mongoctl.mongoctl_logging import log_info, log_warning, log_exception
+from mongoctl.errors import MongoctlException
+from mongoctl.parallel import fan_out_graph
+from mongoctl.context import get_context, execution_context
+from mongoctl.utils import wait_for
+
+from mongoctl.objects.replicaset_cluster import ReplicaSetCluster
+
+from mongoctl.commands.server.start import start_server
+from mongoctl.commands.server.stop import stop_server, step_server_down
+
+###############################################################################
+# CONSTS
+###############################################################################
+# fraction of the members restarted at once, never more than what keeps a
+# majority up
+DEFAULT_PARALLEL_FRACTION = 0.5
+
+# seconds of repl lag under which a restarted member has caught up
+DEFAULT_MAX_REPL_LAG = 10
+
+# seconds to wait for a restarted member to catch up
+CATCH_UP_TIMEOUT = 600
+
+# seconds to wait for a new primary after stepping down the old one
+ELECTION_TIMEOUT = 60
+
+# seconds the old primary does not seek election after stepping down, long
+# enough for it to be stopped before it can be elected again
+STEP_DOWN_SECS = ELECTION_TIMEOUT * 2
+
+# seconds between checks for a primary while restarting
+PRIMARY_CHECK_INTERVAL = 0.25
+
+###############################################################################
+# rolling-restart command
+###############################################################################
+def rolling_restart_command(parsed_options):
+    cluster_id = parsed_options.ClusterId
+    cluster = repository.lookup_and_validate_cluster(cluster_id)
+    if not isinstance(cluster, ReplicaSetCluster):
+        raise MongoctlException("Cluster '%s' is not a replicaset cluster" %
+                                cluster.id)
+
+    rolling_restart_replicaset(
+        cluster,
+        parallel_fraction=parsed_options.parallelFraction,
+        max_repl_lag=parsed_options.maxReplLag,
+        username=getattr(parsed_options, "username", None),
+        password=getattr(parsed_options, "password", None))
+
+###############################################################################
+def rolling_restart_replicaset(cluster, parallel_fraction=None,
+                               max_repl_lag=None, username=None,
+                               password=None):
+    """
+    Restarts the non primary members, several at a time as long as a
+    majority stays up, waiting for each batch to catch up with the primary.
+    Then steps the primary down once and restarts it.
+    @return: the number of seconds the cluster had no primary
+    """
+    if parallel_fraction is None:
+        parallel_fraction = config.get_mongoctl_config_val(
+            "rollingRestartFraction", DEFAULT_PARALLEL_FRACTION)
+    if max_repl_lag is None:
+        max_repl_lag = DEFAULT_MAX_REPL_LAG
+
+    primary_member = cluster.get_primary_member()
+    if primary_member is None:
+        raise MongoctlException("Unable to determine primary member for"
+                                " cluster '%s'" % cluster.id)
+    primary_server = primary_member.get_server()
+
+    servers = [member.get_server() for member in cluster.get_members()]
+    others = [server for server in servers if server is not primary_server]
+    batch_size = get_batch_size(cluster, servers, parallel_fraction)
+
+    log_info("Rolling restart of replica set cluster '%s': %s member(s) at "
+             "a time, then primary '%s'." %
+             (cluster.id, batch_size, primary_server.id))
+
+    def restart(server):
+        restart_member(cluster, server, max_repl_lag,
+                       username=username, password=password)
+
+    monitor = PrimaryMonitor(cluster)
+    monitor.start()
+    start_time = time.time()
+    try:
+        for i in range(0, len(others), batch_size):
+            batch = others[i:i + batch_size]
+            log_info("Restarting %s..." %
+                     ", ".join("'%s'" % server.id for server in batch))
+            results = fan_out_graph(restart, batch, max_workers=batch_size)
+            for result in results:
+                if result.error is not None:
+                    raise MongoctlException(
+                        "Rolling restart of cluster '%s' stopped: unable to"
+                        " restart server '%s'. Cause: %s" %
+                        (cluster.id, result.item.id, result.error))
+
+        step_down_primary(cluster, primary_server)
+        restart(primary_server)
+    finally:
+        monitor.stop()
+
+    log_info("Rolling restart of replica set cluster '%s' done in %.1f "
+             "second(s). Writes were unavailable (no primary) for %.1f "
+             "second(s)." % (cluster.id, time.time() - start_time,
+                             monitor.unavailable_time))
+    return monitor.unavailable_time
+
+###############################################################################
+def get_batch_size(cluster, servers, parallel_fraction):
+    online_count = len([server for server in servers if server.is_online()])
+    majority = len(servers) / 2 + 1
+    batch_size = min(int(len(servers) * parallel_fraction),
+                     online_count - majority)
+
+    if batch_size < 1:
+        if online_count - majority < 1:
+            log_warning("Only %s out of %s members of cluster '%s' are up. "
+                        "Restarting any of them will leave it without a "
+                        "majority." % (online_count, len(servers), cluster.id))
+        batch_size = 1
+
+    return batch_size
+
+###############################################################################
+def restart_member(cluster, server, max_repl_lag, username=None,
+                   password=None):
+    if server.is_online():
+        stop_server(server, username=username, password=password)
+    # the replica set config is left as it is
+    start_server(server, configure_rs=False)
+
+    member = cluster.get_member_for(server)
+    if member is not None and member.is_arbiter():
+        # arbiters have no data to catch up on
+        log_info("Waiting for arbiter '%s' to be up..." % server.id)
+
+        def is_back():
+            return is_arbiter_up(server)
+    else:
+        log_info("Waiting for server '%s' to catch up..." % server.id)
+
+        def is_back():
+            lag = get_member_lag(cluster, server)
+            return lag is not None and lag <= max_repl_lag
+
+    if not wait_for(is_back, timeout=CATCH_UP_TIMEOUT, sleep_duration=1):
+        raise MongoctlException("Timed out waiting for server '%s' to catch "
+                                "up with the primary of cluster '%s'" %
+                                (server.id, cluster.id))
+
+    log_info("Server '%s' is back." % server.id)
+
+###############################################################################
+def get_member_lag(cluster, server):
+    """
+    @return: the repl lag of a secondary in seconds, beyond its slaveDelay if
+    it is a delayed member, 0 for the primary or None if it cannot be told
+    yet
+    """
+    try:
+        if server.is_primary():
+            return 0
+        if not server.is_secondary():
+            return None
+
+        primary_member = cluster.get_primary_member()
+        if primary_member is None:
+            return None
+        master_status = primary_member.get_server().get_member_rs_status()
+        lag = server.get_repl_lag(master_status)
+
+        member = cluster.get_member_for(server)
+        if member is not None:
+            lag = max(lag - member.get_slave_delay(), 0)
+        return lag
+    except Exception, e:
+        log_exception(e)
+        return None
+
+###############################################################################
+def is_arbiter_up(server):
+    try:
+        member_status = server.get_member_rs_status()
+        return bool(member_status and
+                    member_status.get("stateStr") == "ARBITER")
+    except Exception, e:
+        log_exception(e)
+        return False
+
+###############################################################################
+def step_down_primary(cluster, primary_server):
+    if not primary_server.is_primary():
+        return
+
+    if not step_server_down(primary_server, force=False,
+                            step_down_secs=STEP_DOWN_SECS):
+        raise MongoctlException("Unable to step down primary server '%s'" %
+                                primary_server.id)
+
+    def new_primary_elected():
+        primary_member = cluster.get_primary_member()
+        return (primary_member is not None and
+                primary_member.get_server() is not primary_server)
+
+    if not wait_for(new_primary_elected, timeout=ELECTION_TIMEOUT,
+                    sleep_duration=1):
+        raise MongoctlException("No new primary elected for cluster '%s' "
+                                "after stepping down server '%s'" %
+                                (cluster.id, primary_server.id))
+
+###############################################################################
+# PrimaryMonitor Class
+###############################################################################
+class PrimaryMonitor(object):
+    """
+        Checks for a primary every PRIMARY_CHECK_INTERVAL in a background
+        thread and adds up the time the cluster had none.
+        Only the last known primary is asked while it stays primary, else
+        each member in turn, all from the monitor's thread: concurrent
+        probes of members being restarted would time out and leave threads
+        behind at every check.
+    """
+
+    ###########################################################################
+    def __init__(self, cluster, interval=PRIMARY_CHECK_INTERVAL):
+        self.cluster = cluster
+        self.interval = interval
+        self.unavailable_time = 0
+        self._primary_server = None
+        self._stopped = threading.Event()
+        self._thread = None
+        self._context = None
+
+    ###########################################################################
+    def start(self):
+        self._context = get_context()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    ###########################################################################
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    ###########################################################################
+    def _run(self):
+        with execution_context(self._context):
+            last_check = time.time()
+            while not self._stopped.is_set():
+                has_primary = self._find_primary() is not None
+
+                now = time.time()
+                if not has_primary:
+                    self.unavailable_time += now - last_check
+                last_check = now
+                self._stopped.wait(self.interval)
+
+    ###########################################################################
+    def _find_primary(self):
+        servers = [member.get_server() for member in
+                   self.cluster.get_members()]
+        if self._primary_server in servers:
+            servers.remove(self._primary_server)
+            servers.insert(0, self._primary_server)
+
+        for server in servers:
+            if server is None:
+                continue
+            try:
+                if server.is_primary():
+                    self._primary_server = server
+                    return server
+            except Exception, e:
+                log_exception(e)
+
+        return None
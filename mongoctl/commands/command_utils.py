@@ -2,6 +2,8 @@ __author__ = 'abdul'
 
 import os
 import re
+import json
+import threading
 
 import mongoctl.repository as repository
 from mongoctl.mongoctl_logging import *
@@ -257,16 +259,86 @@ def minor_exe_version_match(executable_name,
 ###############################################################################
 def get_exe_version_tuples(executables):
     exe_ver_tuples = []
-    for mongo_exe in executables:
-        try:
-            exe_version = mongo_exe_version(mongo_exe)
-            exe_ver_tuples.append((mongo_exe, exe_version))
-        except Exception, e:
-            log_exception(e)
-            log_verbose("Skipping executable '%s': %s" % (mongo_exe, e))
+    with __exe_version_cache_lock__:
+        cache = load_exe_version_cache()
+        cache_changed = False
+
+        for mongo_exe in executables:
+            try:
+                exe_stamp = get_exe_stamp(mongo_exe)
+                cached = cache.get(mongo_exe)
+                if cached and cached.get("stamp") == exe_stamp:
+                    exe_version = version_obj(cached["version"])
+                else:
+                    exe_version = mongo_exe_version(mongo_exe)
+                    cache[mongo_exe] = {"version": str(exe_version),
+                                        "stamp": exe_stamp}
+                    cache_changed = True
+
+                exe_ver_tuples.append((mongo_exe, exe_version))
+            except Exception, e:
+                log_exception(e)
+                log_verbose("Skipping executable '%s': %s" % (mongo_exe, e))
+
+        if cache_changed:
+            save_exe_version_cache(cache)
 
     return exe_ver_tuples
 
+###############################################################################
+# exe version cache: maps exe paths to their version and the stamp of the
+# file the version was read from so that "<exe> --version" is only run for
+# new or changed executables
+###############################################################################
+__exe_version_cache_lock__ = threading.Lock()
+
+###############################################################################
+def get_exe_stamp(mongo_exe):
+    """
+    Returns [inode, mtime, size] of the file the exe path points to
+    """
+    stat = os.stat(mongo_exe)
+    return [stat.st_ino, stat.st_mtime, stat.st_size]
+
+###############################################################################
+def load_exe_version_cache():
+    cache_file = config.get_exe_version_cache_file()
+    if not cache_file or not os.path.exists(cache_file):
+        return {}
+
+    try:
+        cache = json.load(open(cache_file))
+        if type(cache) is dict:
+            return cache
+    except Exception, e:
+        log_exception(e)
+
+    log_verbose("Ignoring invalid exe version cache '%s'" % cache_file)
+    return {}
+
+###############################################################################
+def save_exe_version_cache(cache):
+    cache_file = config.get_exe_version_cache_file()
+    if not cache_file:
+        return
+
+    # forget executables that are gone
+    cache = dict((mongo_exe, cached) for mongo_exe, cached in cache.items()
+                 if os.path.exists(mongo_exe))
+    try:
+        cache_dir = os.path.dirname(cache_file)
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        # write then rename so that readers never see a partial file
+        tmp_file = "%s.%s" % (cache_file, os.getpid())
+        with open(tmp_file, "w") as f:
+            json.dump(cache, f, indent=1)
+        os.rename(tmp_file, cache_file)
+    except Exception, e:
+        log_exception(e)
+        log_verbose("Unable to save exe version cache '%s': %s" %
+                    (cache_file, e))
+
 ###############################################################################
 def exe_version_tuples_to_strs(exe_ver_tuples):
     strs = []
@@ -364,4 +436,11 @@ def is_dbpath(value):
     value = resolve_path(value)
     return os.path.exists(value)
 
-
+###############################################################################
+def get_probe_options(parsed_options):
+    """
+    Returns the (timeout, max workers) passed with --probe-timeout and
+    --probe-concurrency. None means the default
+    """
+    return (getattr(parsed_options, "probeTimeout", None),
+            getattr(parsed_options, "probeConcurrency", None))
@@ -0,0 +1,341 @@
+__author__ = 'richardxx'
+
+import datetime
+import json
+import os
+import shutil
+import time
+
+import pymongo
+
+from bson import BSON, Timestamp
+from pymongo.cursor import _QUERY_OPTIONS
+from pymongo.errors import PyMongoError
+
+import mongoctl.repository as repository
+
+from mongoctl.mongoctl_logging import log_info, log_error
+from mongoctl.errors import MongoctlException
+from mongoctl.utils import resolve_path, ensure_dir
+from mongoctl.objects.replicaset_cluster import ReplicaSetCluster
+
+from mongoctl.commands.command_utils import is_db_address
+from mongoctl.commands.common.dump import (
+    mongo_dump_server, get_shard_dump_server, get_last_oplog_timestamp,
+    timestamp_to_document
+    )
+from mongoctl.commands.common.restore import mongo_restore_db_address
+
+###############################################################################
+# CONSTS
+###############################################################################
+
+# what a backup directory holds: the catalog of the backup, the full dump
+# and one directory with an oplog.bson per oplog segment
+BACKUP_CATALOG_FILE_NAME = "backup.json"
+FULL_DUMP_DIR = "full"
+SEGMENTS_DIR = "oplog"
+SEGMENT_FILE_NAME = "oplog.bson"
+
+# suffix of files and directories being written, renamed once complete
+PARTIAL_SUFFIX = ".part"
+
+###############################################################################
+# backup command
+###############################################################################
+def backup_command(parsed_options):
+    backup_dir = resolve_path(parsed_options.backupDir)
+    target = parsed_options.target
+    interval = parsed_options.interval
+
+    while True:
+        try:
+            # the best secondary of a replica set may change between runs
+            server = get_backup_source(target,
+                                       max_repl_lag=parsed_options.maxReplLag)
+            backup_server(server, backup_dir, source=target,
+                          username=parsed_options.username,
+                          password=parsed_options.password)
+        except (MongoctlException, PyMongoError), e:
+            if not interval:
+                raise
+            log_error("Backup of '%s' failed: %s. Trying again in %s "
+                      "second(s)" % (target, e, interval))
+
+        if not interval:
+            break
+        time.sleep(interval)
+
+###############################################################################
+def get_backup_source(target, max_repl_lag=None):
+    """
+        Returns the server of a server id, or the best secondary (or else
+        the primary) of a replica set cluster id.
+    """
+    server = repository.lookup_server(target)
+    if server:
+        return server
+
+    cluster = repository.lookup_cluster(target)
+    if cluster is None:
+        raise MongoctlException("Unknown server or cluster '%s'" % target)
+    if not isinstance(cluster, ReplicaSetCluster):
+        raise MongoctlException("Only replica set clusters can be backed up "
+                                "incrementally. '%s' is not one." % target)
+
+    return get_shard_dump_server(cluster, max_repl_lag=max_repl_lag)
+
+###############################################################################
+def backup_server(server, backup_dir, source=None, username=None,
+                  password=None):
+    """
+        Takes a full dump of the server (with --oplog) into an empty backup
+        directory, or else the oplog entries of the server since the last
+        backup as a new segment. Returns the catalog of the backup.
+    """
+    catalog = read_backup_catalog(backup_dir)
+    if catalog is None:
+        catalog = take_full_backup(server, backup_dir, source=source,
+                                   username=username, password=password)
+    else:
+        take_oplog_segment(server, backup_dir, catalog, username=username,
+                           password=password)
+
+    write_backup_catalog(backup_dir, catalog)
+    return catalog
+
+###############################################################################
+def take_full_backup(server, backup_dir, source=None, username=None,
+                     password=None):
+    """
+        Dumps the server with its oplog into <backup_dir>/full and returns a
+        new catalog whose segments start where the dump started, so that
+        nothing written during the dump is missed. The dump can only be
+        restored to a point after it ended, recorded as oplogEnd.
+    """
+    start_timestamp = get_last_oplog_timestamp(server, username=username,
+                                               password=password)
+    if start_timestamp is None:
+        raise MongoctlException("Server '%s' has no oplog. Only replica set "
+                                "members can be backed up incrementally." %
+                                server.id)
+
+    log_info("Taking full backup of server '%s' into '%s'..." %
+             (server.id, backup_dir))
+    full_dir = os.path.join(backup_dir, FULL_DUMP_DIR)
+    partial_dir = full_dir + PARTIAL_SUFFIX
+    if os.path.exists(partial_dir):
+        # left by a failed full backup
+        shutil.rmtree(partial_dir)
+
+    started_at = datetime.datetime.utcnow()
+    start_time = time.time()
+    mongo_dump_server(server, username=username, password=password,
+                      dump_options={"oplog": True, "out": partial_dir})
+    end_timestamp = get_last_oplog_timestamp(server, username=username,
+                                             password=password)
+    if end_timestamp is None:
+        raise MongoctlException("Could not read the oplog of server '%s' "
+                                "after dumping it" % server.id)
+    os.rename(partial_dir, full_dir)
+
+    return {
+        "source": source or server.id,
+        "full": {
+            "dir": FULL_DUMP_DIR,
+            "server": server.id,
+            "startedAt": started_at.isoformat(),
+            "duration": time.time() - start_time,
+            "oplogStart": timestamp_to_document(start_timestamp),
+            "oplogEnd": timestamp_to_document(end_timestamp)
+        },
+        "segments": [],
+        "lastTimestamp": timestamp_to_document(start_timestamp)
+    }
+
+###############################################################################
+def take_oplog_segment(server, backup_dir, catalog, username=None,
+                       password=None):
+    """
+        Writes the oplog entries of the server since the last timestamp of
+        the catalog, without no-ops, to a new segment and adds it to the
+        catalog. Returns the segment or None if there was nothing new.
+    """
+    last_timestamp = document_to_timestamp(catalog["lastTimestamp"])
+    oplog = server.get_db("local", username=username,
+                          password=password)["oplog.rs"]
+
+    first_entry = oplog.find_one(sort=[("$natural", pymongo.ASCENDING)])
+    if first_entry is None or first_entry["ts"] > last_timestamp:
+        raise MongoctlException("The oplog of server '%s' does not go back "
+                                "to the last backed up timestamp %s anymore."
+                                " Please take a new full backup." %
+                                (server.id, timestamp_str(last_timestamp)))
+
+    end_timestamp = oplog.find_one(
+        sort=[("$natural", pymongo.DESCENDING)])["ts"]
+    if end_timestamp <= last_timestamp:
+        log_info("No new oplog entries on server '%s' since %s" %
+                 (server.id, timestamp_str(last_timestamp)))
+        return None
+
+    segment_name = "%010d_%010d" % (end_timestamp.time, end_timestamp.inc)
+    segment_dir = os.path.join(backup_dir, SEGMENTS_DIR, segment_name)
+    partial_dir = segment_dir + PARTIAL_SUFFIX
+    # left by a backup that failed before the catalog listed the segment
+    for leftover_dir in (partial_dir, segment_dir):
+        if os.path.exists(leftover_dir):
+            shutil.rmtree(leftover_dir)
+    ensure_dir(partial_dir)
+
+    # find() of pymongo 2.x does not take oplog_replay
+    cursor = oplog.find({"ts": {"$gt": last_timestamp,
+                                "$lte": end_timestamp}})
+    cursor = cursor.add_option(_QUERY_OPTIONS["oplog_replay"])
+    cursor = cursor.sort("$natural", pymongo.ASCENDING)
+    count = 0
+    size = 0
+    segment_file = open(os.path.join(partial_dir, SEGMENT_FILE_NAME), "wb")
+    try:
+        for entry in cursor:
+            if entry.get("op") == "n":
+                continue
+            data = BSON.encode(entry)
+            segment_file.write(data)
+            count += 1
+            size += len(data)
+    finally:
+        segment_file.close()
+    os.rename(partial_dir, segment_dir)
+
+    segment = {
+        "dir": os.path.join(SEGMENTS_DIR, segment_name),
+        "server": server.id,
+        "takenAt": datetime.datetime.utcnow().isoformat(),
+        "from": timestamp_to_document(last_timestamp),
+        "to": timestamp_to_document(end_timestamp),
+        "count": count,
+        "size": size
+    }
+    catalog["segments"].append(segment)
+    catalog["lastTimestamp"] = segment["to"]
+
+    log_info("Backed up %s oplog entries (%s byte(s)) of server '%s' up to "
+             "%s" % (count, size, server.id, timestamp_str(end_timestamp)))
+    return segment
+
+###############################################################################
+# point-in-time-restore command
+###############################################################################
+def point_in_time_restore_command(parsed_options):
+    destination = parsed_options.destination
+    if not is_db_address(destination):
+        raise MongoctlException("Invalid destination value '%s'. Destination"
+                                " has to be a valid db address." %
+                                destination)
+
+    until = parsed_options.until
+    point_in_time_restore(destination,
+                          resolve_path(parsed_options.backupDir),
+                          until=parse_timestamp(until) if until else None,
+                          username=parsed_options.username,
+                          password=parsed_options.password,
+                          drop=parsed_options.drop)
+
+###############################################################################
+def point_in_time_restore(destination, backup_dir, until=None, username=None,
+                          password=None, drop=False):
+    """
+        Restores the full dump of a backup then replays its oplog segments,
+        all with --oplogReplay and, if until is specified, --oplogLimit so
+        that only the operations before until are replayed.
+    """
+    catalog = read_backup_catalog(backup_dir)
+    if catalog is None:
+        raise MongoctlException("No backup found in '%s'" % backup_dir)
+
+    # the full dump is only consistent once replayed up to where it ended
+    full_end = document_to_timestamp(catalog["full"].get("oplogEnd") or
+                                     catalog["full"]["oplogStart"])
+    if until is not None and until < full_end:
+        raise MongoctlException("Can not restore to %s which is before the "
+                                "end of the full backup (%s)" %
+                                (timestamp_str(until),
+                                 timestamp_str(full_end)))
+
+    restore_options = {"oplogReplay": True}
+    if until is not None:
+        restore_options["oplogLimit"] = timestamp_str(until)
+
+    log_info("Restoring full backup of '%s' to '%s'..." %
+             (catalog["source"], destination))
+    mongo_restore_db_address(destination,
+                             os.path.join(backup_dir,
+                                          catalog["full"]["dir"]),
+                             username=username, password=password,
+                             restore_options=dict(restore_options,
+                                                  drop=drop))
+
+    for segment in catalog["segments"]:
+        if until is not None and document_to_timestamp(
+                segment["from"]) >= until:
+            break
+        log_info("Replaying oplog up to %s..." %
+                 timestamp_str(document_to_timestamp(segment["to"])))
+        mongo_restore_db_address(destination,
+                                 os.path.join(backup_dir, segment["dir"]),
+                                 username=username, password=password,
+                                 restore_options=restore_options)
+
+    log_info("Restored '%s' to %s" %
+             (destination, timestamp_str(until) if until else
+              timestamp_str(document_to_timestamp(
+                  catalog["lastTimestamp"]))))
+
+###############################################################################
+# backup catalog
+###############################################################################
+def read_backup_catalog(backup_dir):
+    catalog_path = os.path.join(backup_dir, BACKUP_CATALOG_FILE_NAME)
+    if not os.path.exists(catalog_path):
+        return None
+
+    catalog_file = open(catalog_path)
+    try:
+        return json.load(catalog_file)
+    finally:
+        catalog_file.close()
+
+###############################################################################
+def write_backup_catalog(backup_dir, catalog):
+    ensure_dir(backup_dir)
+    catalog_path = os.path.join(backup_dir, BACKUP_CATALOG_FILE_NAME)
+    catalog_file = open(catalog_path + PARTIAL_SUFFIX, "w")
+    try:
+        json.dump(catalog, catalog_file, indent=4, sort_keys=True)
+    finally:
+        catalog_file.close()
+    os.rename(catalog_path + PARTIAL_SUFFIX, catalog_path)
+
+###############################################################################
+def document_to_timestamp(document):
+    return Timestamp(document["t"], document["i"])
+
+###############################################################################
+def parse_timestamp(value):
+    """
+        Parses <seconds>[:<ordinal>] like mongorestore's --oplogLimit
+    """
+    try:
+        parts = value.split(":")
+        if len(parts) > 2:
+            raise ValueError(value)
+        return Timestamp(int(parts[0]), int(parts[1]) if len(parts) == 2
+                         else 0)
+    except ValueError:
+        raise MongoctlException("Invalid timestamp '%s'. Expected "
+                                "<seconds>[:<ordinal>]" % value)
+
+###############################################################################
+def timestamp_str(timestamp):
+    return "%s:%s" % (timestamp.time, timestamp.inc)
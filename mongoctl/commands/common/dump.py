@@ -1,12 +1,22 @@
 __author__ = 'abdul'
 
+import datetime
+import json
+import os
+import subprocess
+import time
+
+import pymongo
 
 import mongoctl.repository as repository
 
 from mongoctl.mongo_uri_tools import is_mongo_uri, parse_mongo_uri
 
-from mongoctl.utils import resolve_path
-from mongoctl.mongoctl_logging import log_info , log_warning
+from mongoctl.utils import resolve_path, ensure_dir, wait_for
+from mongoctl.mongoctl_logging import (
+    log_info , log_warning, log_error, log_exception, log_to_stderr,
+    set_log_stream
+    )
 
 from mongoctl.commands.command_utils import (
     is_db_address, is_dbpath, extract_mongo_exe_options, get_mongo_executable,
@@ -17,7 +27,13 @@ from mongoctl.errors import MongoctlException
 
 from mongoctl.utils import call_command
 from mongoctl.objects.server import Server
+from mongoctl.objects.replicaset_cluster import ReplicaSetCluster
+from mongoctl.objects.sharded_cluster import ShardedCluster
 from mongoctl.mongo_version import version_obj, MongoctlNormalizedVersion
+from mongoctl.parallel import fan_out_graph, fan_out_first
+from mongoctl.archive import (
+    write_archive, get_compression, guess_compression, log_archive_sizes
+    )
 
 
 ###############################################################################
@@ -35,9 +51,31 @@ SUPPORTED_MONGO_DUMP_OPTIONS = [
     "forceTableScan",
     "ipv6",
     "verbose",
-    "authenticationDatabase"
+    "authenticationDatabase",
+    "archive",
+    "compression"
 ]
 
+# mongodump options that need a single mongodump of the whole target
+UNSUPPORTED_PARALLEL_DUMP_OPTIONS = ["oplog", "repair", "archive"]
+
+# databases and collections that mongodump does not dump on its own
+EXCLUDED_DUMP_DATABASES = ["local"]
+EXCLUDED_DUMP_COLLECTIONS = ["system.indexes", "system.profile"]
+
+# default output directory of mongodump
+DEFAULT_DUMP_OUT = "dump"
+
+# manifest written by parallel and sharded dumps in the output directory
+DUMP_MANIFEST_FILE_NAME = "dump-manifest.json"
+
+# where sharded dumps put the dumps of the shards and of the config servers
+SHARDS_DUMP_DIR = "shards"
+CONFIG_SERVERS_DUMP_DIR = "configServers"
+
+# seconds to wait for the balancer to finish its current round
+BALANCER_STOP_TIMEOUT = 600
+
 
 ###############################################################################
 # dump command
@@ -62,17 +100,34 @@ def dump_command(parsed_options):
         raise MongoctlException("Invalid target value '%s'. Target has to be"
                                 " a valid db address or dbpath." % target)
     dump_options = extract_mongo_dump_options(parsed_options)
-
-    if is_addr:
-        mongo_dump_db_address(target,
-                              username=parsed_options.username,
-                              password=parsed_options.password,
-                              use_best_secondary=use_best_secondary,
-                              max_repl_lag=None,
-                              dump_options=dump_options)
-    else:
-        dbpath = resolve_path(target)
-        mongo_dump_db_path(dbpath, dump_options=dump_options)
+    parallel = getattr(parsed_options, "parallel", None)
+    by_shard = getattr(parsed_options, "byShard", False)
+
+    if is_path and (parallel or by_shard):
+        raise MongoctlException("--parallel and --by-shard can only be "
+                                "used to dump a db address")
+
+    previous_log_stream = None
+    if dump_options.get("archive") == "-":
+        # keep stdout for the archive
+        previous_log_stream = log_to_stderr()
+
+    try:
+        if is_addr:
+            mongo_dump_db_address(target,
+                                  username=parsed_options.username,
+                                  password=parsed_options.password,
+                                  use_best_secondary=use_best_secondary,
+                                  max_repl_lag=None,
+                                  dump_options=dump_options,
+                                  parallel=parallel,
+                                  by_shard=by_shard)
+        else:
+            dbpath = resolve_path(target)
+            mongo_dump_db_path(dbpath, dump_options=dump_options)
+    finally:
+        if previous_log_stream is not None:
+            set_log_stream(previous_log_stream)
 
 ###############################################################################
 # mongo_dump
@@ -82,12 +137,16 @@ def mongo_dump_db_address(db_address,
                           password=None,
                           use_best_secondary=False,
                           max_repl_lag=None,
-                          dump_options=None):
+                          dump_options=None,
+                          parallel=None,
+                          by_shard=False):
 
     if is_mongo_uri(db_address):
         mongo_dump_uri(uri=db_address, username=username, password=password,
                        use_best_secondary=use_best_secondary,
-                       dump_options=dump_options)
+                       dump_options=dump_options,
+                       parallel=parallel,
+                       by_shard=by_shard)
         return
 
     # db_address is an id string
@@ -97,8 +156,12 @@ def mongo_dump_db_address(db_address,
 
     server = repository.lookup_server(id)
     if server:
+        if by_shard:
+            raise MongoctlException("--by-shard can only be used to dump a "
+                                    "sharded cluster")
         mongo_dump_server(server, database=database, username=username,
-                          password=password, dump_options=dump_options)
+                          password=password, dump_options=dump_options,
+                          parallel=parallel)
         return
     else:
         cluster = repository.lookup_cluster(id)
@@ -107,7 +170,9 @@ def mongo_dump_db_address(db_address,
                                password=password,
                                use_best_secondary=use_best_secondary,
                                max_repl_lag=max_repl_lag,
-                               dump_options=dump_options)
+                               dump_options=dump_options,
+                               parallel=parallel,
+                               by_shard=by_shard)
             return
 
             # Unknown destination
@@ -124,7 +189,9 @@ def mongo_dump_uri(uri,
                    username=None,
                    password=None,
                    use_best_secondary=False,
-                   dump_options=None):
+                   dump_options=None,
+                   parallel=None,
+                   by_shard=False):
 
     uri_wrapper = parse_mongo_uri(uri)
     database = uri_wrapper.database
@@ -134,25 +201,32 @@ def mongo_dump_uri(uri,
     server_or_cluster = repository.build_server_or_cluster_from_uri(uri)
 
     if isinstance(server_or_cluster, Server):
+        if by_shard:
+            raise MongoctlException("--by-shard can only be used to dump a "
+                                    "sharded cluster")
         mongo_dump_server(server_or_cluster,
                           database=database,
                           username=username,
                           password=password,
-                          dump_options=dump_options)
+                          dump_options=dump_options,
+                          parallel=parallel)
     else:
         mongo_dump_cluster(server_or_cluster,
                            database=database,
                            username=username,
                            password=password,
                            use_best_secondary=use_best_secondary,
-                           dump_options=dump_options)
+                           dump_options=dump_options,
+                           parallel=parallel,
+                           by_shard=by_shard)
 
 ###############################################################################
 def mongo_dump_server(server,
                       database=None,
                       username=None,
                       password=None,
-                      dump_options=None):
+                      dump_options=None,
+                      parallel=None):
     repository.validate_server(server)
 
     auth_db = database or "admin"
@@ -163,6 +237,14 @@ def mongo_dump_server(server,
         if not password:
             password = server.lookup_password("admin", username)
 
+    if parallel and parallel > 1:
+        mongo_parallel_dump_server(server,
+                                   database=database,
+                                   username=username,
+                                   password=password,
+                                   dump_options=dump_options,
+                                   parallel=parallel)
+        return
 
     do_mongo_dump(host=server.get_connection_host_address(),
                   port=server.get_port(),
@@ -179,28 +261,45 @@ def mongo_dump_cluster(cluster,
                        password=None,
                        use_best_secondary=False,
                        max_repl_lag=False,
-                       dump_options=None):
+                       dump_options=None,
+                       parallel=None,
+                       by_shard=False):
     repository.validate_cluster(cluster)
 
-    if use_best_secondary:
+    if by_shard:
+        if not isinstance(cluster, ShardedCluster):
+            raise MongoctlException("--by-shard can only be used to dump a "
+                                    "sharded cluster. '%s' is not one." %
+                                    cluster.id)
+        mongo_dump_sharded_cluster(cluster,
+                                   database=database,
+                                   username=username,
+                                   password=password,
+                                   max_repl_lag=max_repl_lag,
+                                   dump_options=dump_options,
+                                   parallel=parallel)
+    elif use_best_secondary:
         mongo_dump_cluster_best_secondary(cluster=cluster,
                                           max_repl_lag=max_repl_lag,
                                           database=database,
                                           username=username,
                                           password=password,
-                                          dump_options=dump_options)
+                                          dump_options=dump_options,
+                                          parallel=parallel)
     else:
         mongo_dump_cluster_primary(cluster=cluster,
                                    database=database,
                                    username=username,
                                    password=password,
-                                   dump_options=dump_options)
+                                   dump_options=dump_options,
+                                   parallel=parallel)
 ###############################################################################
 def mongo_dump_cluster_primary(cluster,
                                database=None,
                                username=None,
                                password=None,
-                               dump_options=None):
+                               dump_options=None,
+                               parallel=None):
     log_info("Locating default server for cluster '%s'..." % cluster.id)
     default_server = cluster.get_default_server()
     if default_server:
@@ -209,7 +308,8 @@ def mongo_dump_cluster_primary(cluster,
                           database=database,
                           username=username,
                           password=password,
-                          dump_options=dump_options)
+                          dump_options=dump_options,
+                          parallel=parallel)
     else:
         raise MongoctlException("No default server found for cluster '%s'" %
                                 cluster.id)
@@ -221,7 +321,8 @@ def mongo_dump_cluster_best_secondary(cluster,
                                       database=None,
                                       username=None,
                                       password=None,
-                                      dump_options=None):
+                                      dump_options=None,
+                                      parallel=None):
 
     #max_repl_lag = max_repl_lag or 3600
     log_info("Finding best secondary server for cluster '%s' with replication"
@@ -233,7 +334,8 @@ def mongo_dump_cluster_best_secondary(cluster,
 
         log_info("Found secondary server '%s'. Dumping..." % server.id)
         mongo_dump_server(server, database=database, username=username,
-                          password=password, dump_options=dump_options)
+                          password=password, dump_options=dump_options,
+                          parallel=parallel)
     else:
         raise MongoctlException("No secondary server found for cluster '%s'" %
                                 cluster.id)
@@ -248,6 +350,57 @@ def do_mongo_dump(host=None,
                   server_version=None,
                   dump_options=None):
 
+    dump_options = dict(dump_options or {})
+    archive = dump_options.pop("archive", None)
+    compression = dump_options.pop("compression", None)
+    if archive:
+        validate_archive_dump(server_version, dump_options)
+        # mongodump writes the archive to stdout
+        dump_options["archive"] = True
+
+    dump_cmd, cmd_display = build_mongo_dump_command(
+        host=host, port=port, dbpath=dbpath, database=database,
+        username=username, password=password, server_version=server_version,
+        dump_options=dump_options)
+
+    if not archive:
+        log_info("Executing command: \n%s" % " ".join(cmd_display))
+        call_command(dump_cmd, bubble_exit_code=True)
+        return
+
+    if compression:
+        compression = get_compression(compression)
+    else:
+        compression = guess_compression(archive)
+
+    log_info("Executing command: \n%s > %s (%s)" %
+             (" ".join(cmd_display), archive, compression.name))
+    read_size, written_size = write_archive(dump_cmd, archive, compression)
+    log_archive_sizes(archive, read_size, written_size)
+
+###############################################################################
+def validate_archive_dump(server_version, dump_options):
+    if dump_options.get("out"):
+        raise MongoctlException("--out can not be used with --archive")
+    if (server_version and
+            version_obj(server_version) < MongoctlNormalizedVersion("3.2.0")):
+        raise MongoctlException("--archive needs mongodump 3.2 or later. "
+                                "Server version is '%s'" % server_version)
+
+###############################################################################
+def build_mongo_dump_command(host=None,
+                             port=None,
+                             dbpath=None,
+                             database=None,
+                             username=None,
+                             password=None,
+                             server_version=None,
+                             dump_options=None):
+    """
+        Returns the mongodump command and the same with the user/password
+        masked, for display.
+    """
+    dump_options = dict(dump_options or {})
 
     # create dump command with host and port
     dump_cmd = [get_mongo_dump_executable(server_version)]
@@ -272,15 +425,13 @@ def do_mongo_dump(host=None,
             dump_cmd.append(password)
 
     # ignore authenticationDatabase option is server_version is less than 2.4.0
-    if (dump_options and "authenticationDatabase" in dump_options and
+    if ("authenticationDatabase" in dump_options and
             server_version and
                 version_obj(server_version) < MongoctlNormalizedVersion("2.4.0")):
         dump_options.pop("authenticationDatabase", None)
 
     # append shell options
-    if dump_options:
-        dump_cmd.extend(options_to_command_args(dump_options))
-
+    dump_cmd.extend(options_to_command_args(dump_options))
 
     cmd_display =  dump_cmd[:]
     # mask user/password
@@ -289,11 +440,441 @@ def do_mongo_dump(host=None,
         if password:
             cmd_display[cmd_display.index("-p") + 1] =  "****"
 
+    return dump_cmd, cmd_display
 
+###############################################################################
+# parallel dump
+###############################################################################
+class CollectionDump(object):
+    """
+        A collection dumped by its own mongodump and how that went.
+    """
+
+    ###########################################################################
+    def __init__(self, database, collection, size=None, count=None):
+        self.database = database
+        self.collection = collection
+        self.size = size
+        self.count = count
+        self.dumped_size = None
+        self.duration = None
+        self.error = None
+
+    ###########################################################################
+    def __str__(self):
+        return "%s.%s" % (self.database, self.collection)
+
+    ###########################################################################
+    def to_document(self):
+        return {
+            "database": self.database,
+            "collection": self.collection,
+            "size": self.size,
+            "count": self.count,
+            "dumpedSize": self.dumped_size,
+            "duration": self.duration,
+            "error": self.error
+        }
 
-    log_info("Executing command: \n%s" % " ".join(cmd_display))
-    call_command(dump_cmd, bubble_exit_code=True)
+###############################################################################
+def mongo_parallel_dump_server(server,
+                               database=None,
+                               username=None,
+                               password=None,
+                               dump_options=None,
+                               parallel=None):
+    """
+        Dumps each collection of the server (or of the given database) with
+        its own mongodump, parallel of them at a time, into the usual output
+        layout (<out>/<db>/<collection>.bson), largest collections first.
+        Then writes a manifest of the collections dumped with their sizes and
+        durations to <out>/dump-manifest.json.
+    """
+    dump_options = dict(dump_options or {})
+    for option in UNSUPPORTED_PARALLEL_DUMP_OPTIONS:
+        if dump_options.get(option):
+            raise MongoctlException("--%s can not be used with --parallel" %
+                                    option)
+    out = dump_options.pop("out", None) or DEFAULT_DUMP_OUT
+    if out == "-":
+        raise MongoctlException("--parallel can not dump to stdout")
+
+    collection_dumps = get_collection_dumps(
+        server, database=database,
+        collection=dump_options.pop("collection", None),
+        username=username, password=password)
+
+    log_info("Dumping %s collection(s) of server '%s' to '%s' with %s "
+             "concurrent mongodump(s)..." %
+             (len(collection_dumps), server.id, out, parallel))
+
+    host = server.get_connection_host_address()
+    port = server.get_port()
+    server_version = server.get_mongo_version()
+
+    def dump_collection(collection_dump):
+        options = dict(dump_options, collection=collection_dump.collection,
+                       out=out)
+        dump_cmd, cmd_display = build_mongo_dump_command(
+            host=host, port=port, database=collection_dump.database,
+            username=username, password=password,
+            server_version=server_version, dump_options=options)
+
+        log_info("Executing command: \n%s" % " ".join(cmd_display))
+        start_time = time.time()
+        try:
+            call_command(dump_cmd)
+        except subprocess.CalledProcessError, e:
+            # not e itself which shows the password
+            raise MongoctlException("mongodump failed with exit code %s" %
+                                    e.returncode)
+        finally:
+            collection_dump.duration = time.time() - start_time
+
+        collection_dump.dumped_size = get_dumped_size(
+            out, collection_dump.database, collection_dump.collection)
+
+    def on_result(result):
+        if result.error is not None:
+            result.item.error = str(result.error)
+            log_error("Failed to dump '%s': %s" % (result.item, result.error))
+
+    ensure_dir(out)
+    started_at = datetime.datetime.utcnow()
+    start_time = time.time()
+    fan_out_graph(dump_collection, collection_dumps, max_workers=parallel,
+                  on_result=on_result)
+    duration = time.time() - start_time
+
+    manifest = {
+        "server": server.id,
+        "address": "%s:%s" % (host, port),
+        "database": database,
+        "parallel": parallel,
+        "startedAt": started_at.isoformat(),
+        "duration": duration,
+        "collections": [collection_dump.to_document()
+                        for collection_dump in collection_dumps]
+    }
+    write_dump_manifest(out, manifest)
+
+    failed = [collection_dump for collection_dump in collection_dumps
+              if collection_dump.dumped_size is None]
+    if failed:
+        raise MongoctlException("Failed to dump %s collection(s) of server "
+                                "'%s': %s. See '%s'." %
+                                (len(failed), server.id,
+                                 ", ".join(map(str, failed)),
+                                 get_dump_manifest_path(out)))
+
+    log_info("Dumped %s collection(s) of server '%s' in %.1f second(s)" %
+             (len(collection_dumps), server.id, duration))
+    return manifest
 
+###############################################################################
+def get_collection_dumps(server, database=None, collection=None,
+                         username=None, password=None):
+    """
+        Returns a CollectionDump for each collection of the server (or of the
+        given database) with its size, largest first.
+    """
+    if database:
+        databases = [database]
+    else:
+        admin_db = server.get_db("admin", username=username,
+                                 password=password)
+        databases = [db_doc["name"] for db_doc in
+                     admin_db.command("listDatabases")["databases"]
+                     if db_doc["name"] not in EXCLUDED_DUMP_DATABASES]
+
+    collection_dumps = []
+    for db_name in databases:
+        db = server.get_db(db_name, username=username, password=password)
+        if collection:
+            collection_names = [collection]
+        else:
+            collection_names = [name for name in db.collection_names()
+                                if name not in EXCLUDED_DUMP_COLLECTIONS]
+
+        for collection_name in collection_names:
+            stats = db.command("collStats", collection_name)
+            collection_dumps.append(CollectionDump(db_name, collection_name,
+                                                   size=stats.get("size"),
+                                                   count=stats.get("count")))
+
+    collection_dumps.sort(key=lambda collection_dump: collection_dump.size,
+                          reverse=True)
+    return collection_dumps
+
+###############################################################################
+def get_dumped_size(out, database, collection):
+    size = 0
+    for extension in [".bson", ".metadata.json"]:
+        path = os.path.join(out, database, collection + extension)
+        if os.path.exists(path):
+            size += os.path.getsize(path)
+    return size
+
+###############################################################################
+def get_dump_manifest_path(out):
+    return os.path.join(out, DUMP_MANIFEST_FILE_NAME)
+
+###############################################################################
+def write_dump_manifest(out, manifest):
+    manifest_file = open(get_dump_manifest_path(out), "w")
+    try:
+        json.dump(manifest, manifest_file, indent=4, sort_keys=True)
+    finally:
+        manifest_file.close()
+
+###############################################################################
+# sharded dump
+###############################################################################
+class ShardDump(object):
+    """
+        The dump of one shard (or of the config servers) from one of its
+        servers and how that went.
+    """
+
+    ###########################################################################
+    def __init__(self, name, server, out, database=None):
+        self.name = name
+        self.server = server
+        self.out = out
+        self.database = database
+        self.oplog_start = None
+        self.oplog_end = None
+        self.duration = None
+        self.error = None
+
+    ###########################################################################
+    def __str__(self):
+        return self.name
+
+    ###########################################################################
+    def to_document(self):
+        return {
+            "name": self.name,
+            "server": self.server.id,
+            "address": "%s:%s" % (self.server.get_connection_host_address(),
+                                  self.server.get_port()),
+            "out": self.out,
+            "database": self.database,
+            "oplogStart": timestamp_to_document(self.oplog_start),
+            "oplogEnd": timestamp_to_document(self.oplog_end),
+            "duration": self.duration,
+            "error": self.error
+        }
+
+###############################################################################
+def mongo_dump_sharded_cluster(cluster,
+                               database=None,
+                               username=None,
+                               password=None,
+                               max_repl_lag=None,
+                               dump_options=None,
+                               parallel=None):
+    """
+        Dumps all the shards, each from its best secondary (or from itself
+        for single server shards), and the config servers' config db
+        concurrently into <out>/shards/<shard-id> and <out>/configServers,
+        with the balancer stopped meanwhile so that no chunk moves between
+        shards. Then writes a manifest of the servers dumped, the balancer
+        state and the oplog position of each server before and after its
+        dump (its consistency point) to <out>/dump-manifest.json.
+    """
+    dump_options = dict(dump_options or {})
+    out = dump_options.pop("out", None) or DEFAULT_DUMP_OUT
+    if out == "-" or dump_options.get("archive"):
+        raise MongoctlException("Can not dump a sharded cluster by shard to "
+                                "stdout or to an archive")
+
+    shard_dumps = get_shard_dumps(cluster, out, database=database,
+                                  max_repl_lag=max_repl_lag)
+
+    log_info("Dumping %s shard(s) and the config servers of cluster '%s' to"
+             " '%s'..." % (len(shard_dumps) - 1, cluster.id, out))
+
+    def dump_shard(shard_dump):
+        options = dict(dump_options, out=shard_dump.out)
+        if shard_dump.database:
+            # --oplog only goes with full dumps
+            options.pop("oplog", None)
+
+        shard_dump.oplog_start = get_last_oplog_timestamp(
+            shard_dump.server, username=username, password=password)
+        start_time = time.time()
+        try:
+            mongo_dump_server(shard_dump.server,
+                              database=shard_dump.database,
+                              username=username,
+                              password=password,
+                              dump_options=options,
+                              parallel=parallel)
+        finally:
+            shard_dump.duration = time.time() - start_time
+        shard_dump.oplog_end = get_last_oplog_timestamp(
+            shard_dump.server, username=username, password=password)
+
+    def on_result(result):
+        if result.error is not None:
+            result.item.error = str(result.error)
+            log_error("Failed to dump '%s' from server '%s': %s" %
+                      (result.item, result.item.server.id, result.error))
+        else:
+            log_info("Dumped '%s' from server '%s' in %.1f second(s)" %
+                     (result.item, result.item.server.id,
+                      result.item.duration))
+
+    mongos = cluster.get_any_online_mongos()
+    balancer_was_stopped = stop_balancer(mongos, username=username,
+                                         password=password)
+
+    ensure_dir(out)
+    started_at = datetime.datetime.utcnow()
+    start_time = time.time()
+    try:
+        fan_out_graph(dump_shard, shard_dumps, max_workers=len(shard_dumps),
+                      stop_on_error=False, on_result=on_result)
+    finally:
+        if not balancer_was_stopped:
+            start_balancer(mongos, username=username, password=password)
+    duration = time.time() - start_time
+
+    manifest = {
+        "cluster": cluster.id,
+        "database": database,
+        "oplog": bool(dump_options.get("oplog")) and not database,
+        "startedAt": started_at.isoformat(),
+        "duration": duration,
+        "balancer": {
+            "wasStopped": balancer_was_stopped,
+            "stoppedForDump": not balancer_was_stopped
+        },
+        "shards": [shard_dump.to_document() for shard_dump in shard_dumps]
+    }
+    write_dump_manifest(out, manifest)
+
+    failed = [shard_dump for shard_dump in shard_dumps
+              if shard_dump.error is not None]
+    if failed:
+        raise MongoctlException("Failed to dump %s of cluster '%s'. See "
+                                "'%s'." %
+                                (", ".join(map(str, failed)), cluster.id,
+                                 get_dump_manifest_path(out)))
+
+    log_info("Dumped cluster '%s' in %.1f second(s)" % (cluster.id, duration))
+    return manifest
+
+###############################################################################
+def get_shard_dumps(cluster, out, database=None, max_repl_lag=None):
+    """
+        Returns a ShardDump for each shard of the cluster and one for the
+        config servers, last.
+    """
+    shard_dumps = []
+    for shard_member in cluster.shards:
+        shard = shard_member.get_shard()
+        server = get_shard_dump_server(shard, max_repl_lag=max_repl_lag)
+        shard_dumps.append(ShardDump(shard.id, server,
+                                     os.path.join(out, SHARDS_DUMP_DIR,
+                                                  shard.id),
+                                     database=database))
+
+    config_shards = [member.get_shard() for member in cluster.config_members]
+    if isinstance(config_shards[0], ReplicaSetCluster):
+        config_server = get_shard_dump_server(config_shards[0],
+                                              max_repl_lag=max_repl_lag)
+    else:
+        # mirrored config servers all have the same data
+        config_server = fan_out_first(lambda server: server.is_online(),
+                                      config_shards)
+        if config_server is None:
+            raise MongoctlException("No online config server found for "
+                                    "cluster '%s'" % cluster.id)
+
+    shard_dumps.append(ShardDump(CONFIG_SERVERS_DUMP_DIR, config_server,
+                                 os.path.join(out, CONFIG_SERVERS_DUMP_DIR),
+                                 database="config"))
+    return shard_dumps
+
+###############################################################################
+def get_shard_dump_server(shard, max_repl_lag=None):
+    """
+        Returns the best secondary of a replica set shard, or its primary if
+        it has none, or the shard itself for single server shards.
+    """
+    if not isinstance(shard, ReplicaSetCluster):
+        return shard
+
+    best_secondary = shard.get_dump_best_secondary(max_repl_lag=max_repl_lag)
+    if best_secondary:
+        return best_secondary.get_server()
+
+    log_warning("No secondary server found for shard '%s'. Dumping its "
+                "primary..." % shard.id)
+    primary_member = shard.get_primary_member()
+    if primary_member is None:
+        raise MongoctlException("Unable to determine primary member for"
+                                " shard '%s'" % shard.id)
+    return primary_member.get_server()
+
+###############################################################################
+def get_last_oplog_timestamp(server, username=None, password=None):
+    """
+        Returns the timestamp of the last oplog entry of a replica set
+        member, or None if there is no oplog to read.
+    """
+    try:
+        local_db = server.get_db("local", username=username,
+                                 password=password)
+        last_entry = local_db["oplog.rs"].find_one(
+            sort=[("$natural", pymongo.DESCENDING)])
+        return last_entry and last_entry["ts"]
+    except Exception, e:
+        log_exception(e)
+        return None
+
+###############################################################################
+def timestamp_to_document(timestamp):
+    if timestamp is None:
+        return None
+    return {"t": timestamp.time, "i": timestamp.inc}
+
+###############################################################################
+def stop_balancer(mongos, username=None, password=None):
+    """
+        Stops the balancer of the cluster of the given mongos and waits for
+        its current round to finish.
+        Returns True if the balancer was already stopped.
+    """
+    config_db = mongos.get_db("config", username=username, password=password)
+    settings = config_db.settings.find_one({"_id": "balancer"}) or {}
+    if settings.get("stopped"):
+        log_info("The balancer is already stopped")
+        return True
+
+    log_info("Stopping the balancer...")
+    config_db.settings.update({"_id": "balancer"},
+                              {"$set": {"stopped": True}}, upsert=True)
+
+    def balancer_idle():
+        lock = config_db.locks.find_one({"_id": "balancer"}) or {}
+        return not lock.get("state")
+
+    if not wait_for(balancer_idle, timeout=BALANCER_STOP_TIMEOUT,
+                    sleep_duration=1):
+        start_balancer(mongos, username=username, password=password)
+        raise MongoctlException("Timed out waiting for the balancer to "
+                                "finish its current round")
+    return False
+
+###############################################################################
+def start_balancer(mongos, username=None, password=None):
+    log_info("Starting the balancer...")
+    config_db = mongos.get_db("config", username=username, password=password)
+    config_db.settings.update({"_id": "balancer"},
+                              {"$set": {"stopped": False}}, upsert=True)
 
 ###############################################################################
 def extract_mongo_dump_options(parsed_args):
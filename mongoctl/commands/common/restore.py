@@ -1,11 +1,18 @@
 __author__ = 'abdul'
 
+import os
+import subprocess
+import time
+
+from bson import json_util
+from bson.son import SON
+
 import mongoctl.repository as repository
 
 from mongoctl.mongo_uri_tools import is_mongo_uri, parse_mongo_uri
 
 from mongoctl.utils import resolve_path
-from mongoctl.mongoctl_logging import log_info , log_warning
+from mongoctl.mongoctl_logging import log_info , log_warning, log_error
 
 from mongoctl.commands.command_utils import (
     is_db_address, is_dbpath, extract_mongo_exe_options, get_mongo_executable,
@@ -17,6 +24,8 @@ from mongoctl.errors import MongoctlException
 from mongoctl.utils import call_command
 from mongoctl.objects.server import Server
 from mongoctl.mongo_version import version_obj, MongoctlNormalizedVersion
+from mongoctl.archive import read_archive, get_compression, guess_compression
+from mongoctl.parallel import fan_out_graph
 
 ###############################################################################
 # CONSTS
@@ -32,9 +41,21 @@ SUPPORTED_MONGO_RESTORE_OPTIONS = [
     "oplogReplay",
     "keepIndexVersion",
     "verbose",
-    "authenticationDatabase"
+    "authenticationDatabase",
+    "archive",
+    "compression"
 ]
 
+# mongorestore options that need a single mongorestore of the whole source
+UNSUPPORTED_PARALLEL_RESTORE_OPTIONS = ["collection", "oplogReplay",
+                                        "archive"]
+
+# collections of a dump that are not restored on their own
+EXCLUDED_RESTORE_COLLECTIONS = ["system.indexes", "system.profile"]
+
+BSON_EXTENSION = ".bson"
+METADATA_EXTENSION = ".metadata.json"
+
 
 ###############################################################################
 # restore command
@@ -60,14 +81,19 @@ def restore_command(parsed_options):
         raise MongoctlException("Invalid destination value '%s'. Destination has to be"
                                 " a valid db address or dbpath." % destination)
     restore_options = extract_mongo_restore_options(parsed_options)
+    parallel = getattr(parsed_options, "parallel", None)
 
     if is_addr:
         mongo_restore_db_address(destination,
                                  source,
                                  username=parsed_options.username,
                                  password=parsed_options.password,
-                                 restore_options=restore_options)
+                                 restore_options=restore_options,
+                                 parallel=parallel)
     else:
+        if parallel:
+            raise MongoctlException("--parallel can only be used to restore "
+                                    "to a db address")
         dbpath = resolve_path(destination)
         mongo_restore_db_path(dbpath, source, restore_options=restore_options)
 
@@ -79,11 +105,12 @@ def mongo_restore_db_address(db_address,
                              source,
                              username=None,
                              password=None,
-                             restore_options=None):
+                             restore_options=None,
+                             parallel=None):
 
     if is_mongo_uri(db_address):
         mongo_restore_uri(db_address, source, username, password,
-                          restore_options)
+                          restore_options, parallel=parallel)
         return
 
     # db_address is an id string
@@ -95,14 +122,16 @@ def mongo_restore_db_address(db_address,
     if server:
         mongo_restore_server(server, source, database=database,
                              username=username, password=password,
-                             restore_options=restore_options)
+                             restore_options=restore_options,
+                             parallel=parallel)
         return
     else:
         cluster = repository.lookup_cluster(id)
         if cluster:
             mongo_restore_cluster(cluster, source, database=database,
                                   username=username, password=password,
-                                  restore_options=restore_options)
+                                  restore_options=restore_options,
+                                  parallel=parallel)
             return
 
     raise MongoctlException("Unknown db address '%s'" % db_address)
@@ -115,7 +144,8 @@ def mongo_restore_db_path(dbpath, source, restore_options=None):
 def mongo_restore_uri(uri, source,
                       username=None,
                       password=None,
-                      restore_options=None):
+                      restore_options=None,
+                      parallel=None):
 
     uri_wrapper = parse_mongo_uri(uri)
     database = uri_wrapper.database
@@ -127,18 +157,21 @@ def mongo_restore_uri(uri, source,
     if isinstance(server_or_cluster, Server):
         mongo_restore_server(server_or_cluster, source, database=database,
                              username=username, password=password,
-                             restore_options=restore_options)
+                             restore_options=restore_options,
+                             parallel=parallel)
     else:
         mongo_restore_cluster(server_or_cluster, source, database=database,
                               username=username, password=password,
-                              restore_options=restore_options)
+                              restore_options=restore_options,
+                              parallel=parallel)
 
 ###############################################################################
 def mongo_restore_server(server, source,
                          database=None,
                          username=None,
                          password=None,
-                         restore_options=None):
+                         restore_options=None,
+                         parallel=None):
     repository.validate_server(server)
 
     # auto complete password if possible
@@ -148,6 +181,15 @@ def mongo_restore_server(server, source,
         if not password:
             password = server.lookup_password("admin", username)
 
+    if parallel and parallel > 1:
+        mongo_parallel_restore_server(server, source,
+                                      database=database,
+                                      username=username,
+                                      password=password,
+                                      restore_options=restore_options,
+                                      parallel=parallel)
+        return
+
     do_mongo_restore(source,
                      host=server.get_connection_host_address(),
                      port=server.get_port(),
@@ -162,7 +204,8 @@ def mongo_restore_cluster(cluster, source,
                           database=None,
                           username=None,
                           password=None,
-                          restore_options=None):
+                          restore_options=None,
+                          parallel=None):
     repository.validate_cluster(cluster)
     log_info("Locating default server for cluster '%s'..." % cluster.id)
     default_server = cluster.get_default_server()
@@ -172,7 +215,8 @@ def mongo_restore_cluster(cluster, source,
                              database=database,
                              username=username,
                              password=password,
-                             restore_options=restore_options)
+                             restore_options=restore_options,
+                             parallel=parallel)
     else:
         raise MongoctlException("No default server found for cluster '%s'" %
                                 cluster.id)
@@ -188,6 +232,55 @@ def do_mongo_restore(source,
                      server_version=None,
                      restore_options=None):
 
+    restore_options = dict(restore_options or {})
+    archive = restore_options.get("archive")
+    compression = restore_options.pop("compression", None)
+
+    restore_cmd, cmd_display = build_mongo_restore_command(
+        None if archive else source, host=host, port=port, dbpath=dbpath,
+        database=database, username=username, password=password,
+        server_version=server_version, restore_options=restore_options)
+
+    # execute!
+    if not archive:
+        log_info("Executing command: \n%s" % " ".join(cmd_display))
+        call_command(restore_cmd, bubble_exit_code=True)
+        return
+
+    if compression:
+        compression = get_compression(compression)
+    else:
+        compression = guess_compression(source)
+
+    log_info("Executing command: \n%s < %s (%s)" %
+             (" ".join(cmd_display), source, compression.name))
+    read_archive(restore_cmd, source, compression)
+
+###############################################################################
+def build_mongo_restore_command(source,
+                                host=None,
+                                port=None,
+                                dbpath=None,
+                                database=None,
+                                collection=None,
+                                username=None,
+                                password=None,
+                                server_version=None,
+                                restore_options=None):
+    """
+        Returns the mongorestore command and the same with the user/password
+        masked, for display. Without source, mongorestore reads stdin.
+    """
+    restore_options = dict(restore_options or {})
+    archive = restore_options.pop("archive", None)
+    if archive:
+        if (server_version and version_obj(server_version) <
+                MongoctlNormalizedVersion("3.2.0")):
+            raise MongoctlException("--archive needs mongorestore 3.2 or "
+                                    "later. Server version is '%s'" %
+                                    server_version)
+        # mongorestore reads the archive from stdin
+        restore_options["archive"] = True
 
     # create restore command with host and port
     restore_cmd = [get_mongo_restore_executable(server_version)]
@@ -205,6 +298,10 @@ def do_mongo_restore(source,
     if database:
         restore_cmd.extend(["-d", database])
 
+    # collection
+    if collection:
+        restore_cmd.extend(["-c", collection])
+
     # username and password
     if username:
         restore_cmd.extend(["-u", username, "-p"])
@@ -212,17 +309,17 @@ def do_mongo_restore(source,
             restore_cmd.append(password)
 
     # ignore authenticationDatabase option is server_version is less than 2.4.0
-    if (restore_options and "authenticationDatabase" in restore_options and
+    if ("authenticationDatabase" in restore_options and
             server_version and
                 version_obj(server_version) < MongoctlNormalizedVersion("2.4.0")):
         restore_options.pop("authenticationDatabase", None)
 
     # append shell options
-    if restore_options:
-        restore_cmd.extend(options_to_command_args(restore_options))
+    restore_cmd.extend(options_to_command_args(restore_options))
 
     # pass source arg
-    restore_cmd.append(source)
+    if source:
+        restore_cmd.append(source)
 
     cmd_display =  restore_cmd[:]
     # mask user/password
@@ -231,9 +328,247 @@ def do_mongo_restore(source,
         if password:
             cmd_display[cmd_display.index("-p") + 1] =  "****"
 
-    # execute!
-    log_info("Executing command: \n%s" % " ".join(cmd_display))
-    call_command(restore_cmd, bubble_exit_code=True)
+    return restore_cmd, cmd_display
+
+###############################################################################
+# parallel restore
+###############################################################################
+class CollectionRestore(object):
+    """
+        A collection of a dump restored by its own mongorestore, without its
+        indexes which are built once all collections are restored.
+    """
+
+    ###########################################################################
+    def __init__(self, database, collection, bson_path, metadata_path=None):
+        self.database = database
+        self.collection = collection
+        self.bson_path = bson_path
+        self.metadata_path = metadata_path
+        self.size = os.path.getsize(bson_path)
+        self.duration = None
+        self.index_count = 0
+        self.index_duration = None
+        self.error = None
+
+    ###########################################################################
+    def __str__(self):
+        return "%s.%s" % (self.database, self.collection)
+
+    ###########################################################################
+    def get_throughput(self):
+        """
+        @return: bytes restored per second
+        """
+        if not self.duration:
+            return None
+        return self.size / self.duration
+
+    ###########################################################################
+    def get_indexes(self, keep_index_version=False):
+        """
+        @return: the specs of the collection's indexes but _id's, from its
+        metadata file
+        """
+        if not self.metadata_path:
+            return []
+
+        metadata_file = open(self.metadata_path)
+        try:
+            # SON keeps the key order of compound indexes
+            metadata = json_util.loads(
+                metadata_file.read(),
+                object_pairs_hook=lambda pairs: json_util.object_hook(
+                    SON(pairs)))
+        finally:
+            metadata_file.close()
+
+        indexes = []
+        for index in metadata.get("indexes") or []:
+            if index.get("name") == "_id_":
+                continue
+            index = SON(index)
+            index.pop("ns", None)
+            if not keep_index_version:
+                index.pop("v", None)
+            indexes.append(index)
+        return indexes
+
+###############################################################################
+def mongo_parallel_restore_server(server, source,
+                                  database=None,
+                                  username=None,
+                                  password=None,
+                                  restore_options=None,
+                                  parallel=None):
+    """
+        Restores each collection of a dump directory (<db>/<collection>.bson
+        files, or <collection>.bson files when a database is given) with its
+        own mongorestore --noIndexRestore, parallel of them at a time and
+        largest first. Once all the data is loaded, builds the indexes of the
+        collections' metadata files, parallel collections at a time.
+        Logs the throughput of each collection and returns the
+        CollectionRestores.
+    """
+    restore_options = dict(restore_options or {})
+    for option in UNSUPPORTED_PARALLEL_RESTORE_OPTIONS:
+        if restore_options.get(option):
+            raise MongoctlException("--%s can not be used with --parallel" %
+                                    option)
+    keep_index_version = restore_options.get("keepIndexVersion")
+    restore_options["noIndexRestore"] = True
+    # with -d, mongorestore logs in against that database by default. Log in
+    # through admin like a restore of the whole dump does
+    auth_database = restore_options.get("authenticationDatabase") or "admin"
+    if username:
+        restore_options["authenticationDatabase"] = auth_database
+
+    collection_restores = get_collection_restores(source, database=database)
+    total_size = sum(c.size for c in collection_restores)
+    log_info("Restoring %s collection(s) (%s byte(s)) to server '%s' with %s"
+             " concurrent mongorestore(s)..." %
+             (len(collection_restores), total_size, server.id, parallel))
+
+    host = server.get_connection_host_address()
+    port = server.get_port()
+    server_version = server.get_mongo_version()
+    # createIndexes is new in 2.6
+    use_create_indexes = (not server_version or version_obj(server_version) >=
+                          MongoctlNormalizedVersion("2.6.0"))
+
+    def restore_collection(collection_restore):
+        restore_cmd, cmd_display = build_mongo_restore_command(
+            collection_restore.bson_path, host=host, port=port,
+            database=collection_restore.database,
+            collection=collection_restore.collection,
+            username=username, password=password,
+            server_version=server_version, restore_options=restore_options)
+
+        log_info("Executing command: \n%s" % " ".join(cmd_display))
+        start_time = time.time()
+        try:
+            call_command(restore_cmd)
+        except subprocess.CalledProcessError, e:
+            # not e itself which shows the password
+            raise MongoctlException("mongorestore failed with exit code %s" %
+                                    e.returncode)
+        finally:
+            collection_restore.duration = time.time() - start_time
+
+    def build_indexes(collection_restore):
+        indexes = collection_restore.get_indexes(
+            keep_index_version=keep_index_version)
+        if not indexes:
+            return
+        auth_db = server.get_db(auth_database, username=username,
+                                password=password)
+        db = auth_db.connection[collection_restore.database]
+        start_time = time.time()
+        try:
+            if use_create_indexes:
+                db.command("createIndexes", collection_restore.collection,
+                           indexes=indexes)
+            else:
+                for index in indexes:
+                    index = SON(index)
+                    key = index.pop("key")
+                    db[collection_restore.collection].create_index(
+                        key.items(), **index)
+        finally:
+            collection_restore.index_duration = time.time() - start_time
+        collection_restore.index_count = len(indexes)
+
+    def on_restore_result(result):
+        collection_restore = result.item
+        if result.error is not None:
+            collection_restore.error = str(result.error)
+            log_error("Failed to restore '%s': %s" %
+                      (collection_restore, result.error))
+        else:
+            log_info("Restored '%s': %s byte(s) in %.1f second(s) (%s)" %
+                     (collection_restore, collection_restore.size,
+                      collection_restore.duration,
+                      throughput_str(collection_restore.get_throughput())))
+
+    def on_index_result(result):
+        collection_restore = result.item
+        if result.error is not None:
+            collection_restore.error = str(result.error)
+            log_error("Failed to build the indexes of '%s': %s" %
+                      (collection_restore, result.error))
+        elif collection_restore.index_count:
+            log_info("Built %s index(es) of '%s' in %.1f second(s)" %
+                     (collection_restore.index_count, collection_restore,
+                      collection_restore.index_duration))
+
+    start_time = time.time()
+    fan_out_graph(restore_collection, collection_restores,
+                  max_workers=parallel, stop_on_error=False,
+                  on_result=on_restore_result)
+    load_duration = time.time() - start_time
+
+    # indexes of the collections restored
+    restored = [c for c in collection_restores if c.error is None]
+    log_info("Data loaded in %.1f second(s) (%s). Building indexes..." %
+             (load_duration, throughput_str(total_size / load_duration
+                                            if load_duration else None)))
+    fan_out_graph(build_indexes, restored, max_workers=parallel,
+                  stop_on_error=False, on_result=on_index_result)
+    duration = time.time() - start_time
+
+    failed = [c for c in collection_restores if c.error is not None]
+    if failed:
+        raise MongoctlException("Failed to restore %s collection(s) to server"
+                                " '%s': %s" % (len(failed), server.id,
+                                               ", ".join(map(str, failed))))
+
+    log_info("Restored %s collection(s) to server '%s' in %.1f second(s): "
+             "data %.1f second(s), indexes %.1f second(s)" %
+             (len(collection_restores), server.id, duration, load_duration,
+              duration - load_duration))
+    return collection_restores
+
+###############################################################################
+def get_collection_restores(source, database=None):
+    """
+        Returns a CollectionRestore for each collection of the dump
+        directory, largest first.
+    """
+    if not os.path.isdir(source):
+        raise MongoctlException("--parallel needs a dump directory. '%s' is"
+                                " not one." % source)
+
+    if database:
+        db_dirs = [(database, source)]
+    else:
+        db_dirs = [(name, os.path.join(source, name))
+                   for name in sorted(os.listdir(source))
+                   if os.path.isdir(os.path.join(source, name))]
+
+    collection_restores = []
+    for db_name, db_dir in db_dirs:
+        for file_name in sorted(os.listdir(db_dir)):
+            if not file_name.endswith(BSON_EXTENSION):
+                continue
+            collection = file_name[:-len(BSON_EXTENSION)]
+            if collection in EXCLUDED_RESTORE_COLLECTIONS:
+                continue
+            metadata_path = os.path.join(db_dir,
+                                         collection + METADATA_EXTENSION)
+            if not os.path.exists(metadata_path):
+                metadata_path = None
+            collection_restores.append(CollectionRestore(
+                db_name, collection, os.path.join(db_dir, file_name),
+                metadata_path=metadata_path))
+
+    collection_restores.sort(key=lambda c: c.size, reverse=True)
+    return collection_restores
+
+###############################################################################
+def throughput_str(throughput):
+    if throughput is None:
+        return "n/a"
+    return "%.1f MB/s" % (throughput / (1024 * 1024))
 
 
 ###############################################################################
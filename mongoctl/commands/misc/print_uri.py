@@ -1,8 +1,17 @@
 __author__ = 'abdul'
 
+import time
+import threading
+
 import mongoctl.repository as repository
+import mongoctl.config as config
 from mongoctl.errors import MongoctlException
-import mongoctl
+
+###############################################################################
+# CONSTS
+###############################################################################
+# seconds a uri stays cached, unless the repository changes in the meantime
+DEFAULT_URI_CACHE_TTL = 60
 
 ###############################################################################
 # print uri command
@@ -10,29 +19,94 @@ import mongoctl
 def print_uri_command(parsed_options):
     id = parsed_options.id
     db = parsed_options.db
-    # check if the id is a server id
 
-    print "in print_uri_command:"
-    print "\t " + str(id)
+    uri = get_uri(id, db=db)
 
-    uri = ""
-    server = repository.lookup_server(id)
-
-    if server:
-        print "\t As a server"
-        uri = server.get_mongo_uri_template(db=db)
-        print "\t " + str(uri)
-    else:
-        print "\t As a cluster"
-        cluster = repository.lookup_cluster(id)
-        if cluster:
-            uri = cluster.get_mongo_uri_template(db=db)
-        else:
-            print "\t Raise an error?"
-            raise MongoctlException("Cannot find a server or a cluster with"
-                                    " id '%s'" % id)
-
-    if mongoctl.is_service() is False:
+    # import here, mongoctl.mongoctl imports all commands
+    import mongoctl.mongoctl as mongoctl_main
+    if mongoctl_main.is_service() is False:
         print uri
 
     return uri
+
+###############################################################################
+def get_uri(id, db=None):
+    """
+        Returns the uri template of the server or cluster with the specified
+        id. Results are cached until the repository changes or the cache ttl
+        passes.
+    """
+    generation = repository.get_repository_generation()
+    uri = get_cached_uri(id, db=db, generation=generation)
+
+    if uri is None:
+        uri = lookup_uri(id, db=db)
+        cache_uri(id, uri, db=db, generation=generation)
+
+    return uri
+
+###############################################################################
+def lookup_uri(id, db=None):
+    # check if the id is a server id
+    server = repository.lookup_server(id)
+    if server:
+        return server.get_mongo_uri_template(db=db)
+
+    cluster = repository.lookup_cluster(id)
+    if cluster:
+        return cluster.get_mongo_uri_template(db=db)
+
+    raise MongoctlException("Cannot find a server or a cluster with"
+                            " id '%s'" % id)
+
+###############################################################################
+# URI cache
+###############################################################################
+# Global variable: (config root, id, db) -> (generation, expires at, uri)
+__uri_cache__ = {}
+__uri_cache_lock__ = threading.Lock()
+
+###############################################################################
+def get_uri_cache_ttl():
+    return config.get_mongoctl_config_val("uriCacheTTL",
+                                          DEFAULT_URI_CACHE_TTL)
+
+###############################################################################
+def get_cached_uri(id, db=None, generation=None):
+    """
+        Returns the cached uri or None if it is missing, has expired or was
+        cached for a different repository generation.
+    """
+    key = _uri_cache_key(id, db)
+    with __uri_cache_lock__:
+        entry = __uri_cache__.get(key)
+        if entry is None:
+            return None
+
+        (cached_generation, expires_at, uri) = entry
+        if cached_generation != generation or expires_at <= time.time():
+            del __uri_cache__[key]
+            return None
+
+        return uri
+
+###############################################################################
+def cache_uri(id, uri, db=None, generation=None):
+    ttl = get_uri_cache_ttl()
+    # when the generation is unknown (None) only the ttl bounds staleness
+    if not ttl or ttl <= 0:
+        return
+
+    with __uri_cache_lock__:
+        __uri_cache__[_uri_cache_key(id, db)] = (generation,
+                                                 time.time() + ttl,
+                                                 uri)
+
+###############################################################################
+def clear_uri_cache():
+    with __uri_cache_lock__:
+        __uri_cache__.clear()
+
+###############################################################################
+def _uri_cache_key(id, db):
+    return config.get_config_root(), id, db
@@ -1,29 +1,57 @@
 __author__ = 'abdul'
 
+import itertools
+import sys
+
 import mongoctl.repository as repository
 from mongoctl.mongoctl_logging import log_info
 from mongoctl.utils import to_string
+from mongoctl.parallel import fan_out_iter
+from mongoctl.commands.command_utils import get_probe_options
+
 ###############################################################################
 # list servers command
 ###############################################################################
 def list_servers_command(parsed_options):
-    servers = repository.lookup_all_servers()
-    if not servers or len(servers) < 1:
+    # views sorted by id, streamed from the repository: servers are only
+    # looked up when probed
+    servers = repository.iter_server_views()
+    first_server = next(servers, None)
+    if first_server is None:
         log_info("No servers have been configured.")
         return
 
-    servers = sorted(servers, key=lambda s: s.id)
+    servers = itertools.chain([first_server], servers)
+    probe = not getattr(parsed_options, "noProbe", False)
+
     bar = "-"*105
     print bar
-    formatter = "%-25s %-60s %-10s %s"
-    print formatter % ("_ID", "DESCRIPTION", "ONLINE", "CONNECT TO")
+    if probe:
+        formatter = "%-25s %-60s %-10s %s"
+        print formatter % ("_ID", "DESCRIPTION", "ONLINE", "CONNECT TO")
+    else:
+        formatter = "%-25s %-60s %s"
+        print formatter % ("_ID", "DESCRIPTION", "CONNECT TO")
     print bar
 
-    for server in servers:
+    if not probe:
+        for server in servers:
+            print formatter % (server.id,
+                               to_string(server.get_description()),
+                               to_string(server.get_address_display()))
+        print "\n"
+        return
+
+    # servers are checked concurrently and each row is printed as soon as it
+    # and all rows before it are known
+    timeout, max_workers = get_probe_options(parsed_options)
+    for result in fan_out_iter(lambda server: server.is_online(), servers,
+                               timeout=timeout, max_workers=max_workers):
+        server = result.item
+        online_str = str(result.value) if result.done else "Timed out"
         print formatter % (server.id,
                            to_string(server.get_description()),
-                           str(server.is_online()),
+                           online_str,
                            to_string(server.get_address_display()))
+        sys.stdout.flush()
     print "\n"
-
-
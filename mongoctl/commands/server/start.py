@@ -20,9 +20,11 @@ from mongoctl.processes import(
     communicate_to_child_process, create_subprocess, get_child_processes
     )
 from mongoctl.prompt import prompt_execute_task
+from mongoctl.context import get_context
 from mongoctl.utils import (
-    ensure_dir, which, wait_for, dir_exists, is_pid_alive
+    ensure_dir, which, dir_exists, is_pid_alive
 )
+from mongoctl.readiness import new_server_log_watcher, wait_for_server_ready
 from tail_log import tail_server_log, stop_tailing
 from mongoctl.commands.command_utils import (
     get_mongo_executable, VERSION_PREF_EXACT
@@ -97,18 +99,17 @@ def dry_run_start_server_cmd(server, options_override=None):
 ###############################################################################
 # start server
 ###############################################################################
-def start_server(server, options_override=None, rs_add=False, no_init=False):
+def start_server(server, options_override=None, rs_add=False, no_init=False,
+                 configure_rs=True):
     do_start_server(server,
                     options_override=options_override,
                     rs_add=rs_add,
-                    no_init=no_init)
+                    no_init=no_init,
+                    configure_rs=configure_rs)
 
 ###############################################################################
-__mongod_pid__ = None
-__current_server__ = None
-
-###############################################################################
-def do_start_server(server, options_override=None, rs_add=False, no_init=False):
+def do_start_server(server, options_override=None, rs_add=False, no_init=False,
+                    configure_rs=True):
     # ensure that the start was issued locally. Fail otherwise
     server.validate_local_op("start")
 
@@ -142,7 +143,8 @@ def do_start_server(server, options_override=None, rs_add=False, no_init=False):
 
     server_pid = start_server_process(server, options_override)
 
-    _post_server_start(server, server_pid, rs_add=rs_add, no_init=no_init)
+    _post_server_start(server, server_pid, rs_add=rs_add, no_init=no_init,
+                       configure_rs=configure_rs)
 
     # Note: The following block has to be the last block
     # because server_process.communicate() will not return unless you
@@ -201,8 +203,10 @@ def _post_mongod_server_start(server, server_pid, **kwargs):
     try:
         # prepare the server
         prepare_mongod_server(server)
-        maybe_config_server_repl_set(server, rs_add=kwargs.get("rs_add"),
-                                     no_init=kwargs.get("no_init"))
+        # cluster starts configure the replica set once all members are up
+        if kwargs.get("configure_rs", True):
+            maybe_config_server_repl_set(server, rs_add=kwargs.get("rs_add"),
+                                         no_init=kwargs.get("no_init"))
     except Exception, e:
         log_exception(e)
         log_error("Unable to fully prepare server '%s'. Cause: %s \n"
@@ -325,8 +329,7 @@ def _start_server_process_4real(server, options_override=None):
     if server.is_fork():
         child_process_out = subprocess.PIPE
 
-    global __mongod_pid__
-    global __current_server__
+    context = get_context()
 
     #DETACHED_PROCESS = 0x00000008
     parent_mongod = create_subprocess(start_cmd,
@@ -337,12 +340,13 @@ def _start_server_process_4real(server, options_override=None):
 
 
     if server.is_fork():
-        __mongod_pid__ = get_forked_mongod_pid(parent_mongod)
+        mongod_pid = get_forked_mongod_pid(parent_mongod)
     else:
-        __mongod_pid__ = parent_mongod.pid
+        mongod_pid = parent_mongod.pid
 
-    __current_server__ = server
-    return __mongod_pid__
+    # cluster members may be started concurrently in the same context
+    context.mongod_pids[server.id] = mongod_pid
+    return mongod_pid
 
 ###############################################################################
 def get_forked_mongod_pid(parent_mongod):
@@ -356,6 +360,8 @@ def get_forked_mongod_pid(parent_mongod):
 ###############################################################################
 def start_server_process(server,options_override=None):
 
+    # watch the log from before the server writes to it
+    log_watcher = new_server_log_watcher(server)
     mongod_pid = _start_server_process_4real(server, options_override)
 
     log_info("Will now wait for server '%s' to start up."
@@ -370,8 +376,8 @@ def start_server_process(server,options_override=None):
     log_tailer = tail_server_log(server)
     # wait until the server starts
     try:
-        is_online = wait_for(server_started_predicate(server, mongod_pid),
-                             timeout=300)
+        is_online = wait_for_server_ready(server, mongod_pid, timeout=300,
+                                          log_watcher=log_watcher)
     finally:
         # stop tailing
         stop_tailing(log_tailer)
@@ -487,18 +493,6 @@ def server_stopped_predicate(server, pid):
 
     return server_stopped
 
-###############################################################################
-def server_started_predicate(server, mongod_pid):
-    def server_started():
-        # check if the command failed
-        if not is_pid_alive(mongod_pid):
-            raise MongoctlException("Could not start the server. Please check"
-                                    " the log file.")
-
-        return server.is_online()
-
-    return server_started
-
 ###############################################################################
 # NUMA Related functions
 ###############################################################################
@@ -587,10 +581,9 @@ def get_mongos_executable(server):
 ###############################################################################
 #TODO Remove this ugly signal handler and use something more elegant
 def mongoctl_signal_handler(signal_val, frame):
-    global __mongod_pid__
-
-    # otherwise prompt to kill server
-    global __current_server__
+    # signals are handled by the main thread, i.e. in the context of the
+    # execution it is running
+    context = get_context()
 
     def kill_child(child_process):
         try:
@@ -608,10 +601,12 @@ def mongoctl_signal_handler(signal_val, frame):
         exit(0)
 
         # if there is no mongod server yet then exit
-    if __mongod_pid__ is None:
+    if not context.mongod_pids:
         exit_mongoctl()
     else:
-        prompt_execute_task("Kill server '%s'?" % __current_server__.id,
+        prompt_execute_task("Kill server(s) %s?" %
+                            ", ".join("'%s'" % server_id for server_id in
+                                      sorted(context.mongod_pids)),
                             exit_mongoctl)
 
 ###############################################################################
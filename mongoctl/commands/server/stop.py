@@ -198,11 +198,15 @@ def prompt_or_force_stop_server(server, pid,
 
 
 ###############################################################################
-def step_server_down(server, force=False):
+def step_server_down(server, force=False, step_down_secs=10):
+    """
+    Steps the primary server down for step_down_secs seconds during which it
+    does not seek to become primary again.
+    """
     log_info("Stepping down server '%s'..." % server.id)
 
     try:
-        cmd = SON([('replSetStepDown', 10), ('force', force)])
+        cmd = SON([('replSetStepDown', step_down_secs), ('force', force)])
         server.disconnecting_db_command(cmd, "admin")
         log_info("Server '%s' stepped down successfully!" % server.id)
         return True
@@ -2,12 +2,14 @@ __author__ = 'abdul'
 
 import json
 import urllib
+import threading
 import mongoctl_globals
 
 from utils import *
 
 from minify_json import minify_json
 from errors import MongoctlException
+from context import get_context
 
 from bson import json_util
 
@@ -16,18 +18,25 @@ from bson import json_util
 ###############################################################################
 MONGOCTL_CONF_FILE_NAME = "mongoctl.config"
 
+# where versions of mongo executables found are remembered
+DEFAULT_EXE_VERSION_CACHE_FILE = "~/.mongoctl/exe_versions.json"
+
 
 ###############################################################################
 # Config root / files stuff
 ###############################################################################
+# Global variable: the default config root. --config-root overrides it for
+# the current execution only
 __config_root__ = mongoctl_globals.DEFAULT_CONF_ROOT
 
 def _set_config_root(root_path):
     if not is_url(root_path) and not dir_exists(root_path):
         raise MongoctlException("Invalid config-root value: %s does not"
                                 " exist or is not a directory" % root_path)
-    global __config_root__
-    __config_root__ = root_path
+    get_context().config_root = root_path
+
+def get_config_root():
+    return get_context().config_root or __config_root__
 
 
 ###############################################################################
@@ -60,6 +69,17 @@ def get_mongodb_installs_dir():
 def set_mongodb_installs_dir(installs_dir):
     set_mongoctl_config_val('mongoDBInstallationsDirectory', installs_dir)
 
+###############################################################################
+def get_exe_version_cache_file():
+    """
+    Returns the path of the exe version cache or None if it is disabled
+    (by setting exeVersionCacheFile to null)
+    """
+    cache_file = get_mongoctl_config_val('exeVersionCacheFile',
+                                         DEFAULT_EXE_VERSION_CACHE_FILE)
+    if cache_file:
+        return resolve_path(cache_file)
+
 ###############################################################################
 
 def get_default_users():
@@ -72,8 +92,7 @@ def get_cluster_member_alt_address_mapping():
 
 ###############################################################################
 def to_full_config_path(path_or_url):
-    global __config_root__
-
+    config_root = get_config_root()
 
     # handle abs paths and abs URLS
     if os.path.isabs(path_or_url):
@@ -81,25 +100,28 @@ def to_full_config_path(path_or_url):
     elif is_url(path_or_url):
         return path_or_url
     else:
-        result =  os.path.join(__config_root__, path_or_url)
-        if not is_url(__config_root__):
+        result =  os.path.join(config_root, path_or_url)
+        if not is_url(config_root):
             result = resolve_path(result)
 
         return result
 
 ###############################################################################
-## Global variable CONFIG: a dictionary of configurations read from config file
-__mongo_config__ = None
+## Global variable CONFIG: config root -> dictionary of configurations read
+## from the config file
+__mongo_configs__ = {}
+__mongo_configs_lock__ = threading.Lock()
 
 def get_mongoctl_config():
 
-    global __mongo_config__
+    config_root = get_config_root()
 
-    if __mongo_config__ is None:
-        __mongo_config__ = read_config_json("mongoctl",
-                                            MONGOCTL_CONF_FILE_NAME)
+    with __mongo_configs_lock__:
+        if config_root not in __mongo_configs__:
+            __mongo_configs__[config_root] = read_config_json(
+                "mongoctl", MONGOCTL_CONF_FILE_NAME)
 
-    return __mongo_config__
+        return __mongo_configs__[config_root]
 
 
 ###############################################################################
@@ -0,0 +1,227 @@
+__author__ = 'richardxx'
+
+import threading
+import time
+
+from collections import OrderedDict
+
+import config
+from errors import MongoctlException
+from mongoctl_logging import log_verbose, log_exception
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+# max number of clients kept in the pool
+DEFAULT_MAX_SIZE = 1000
+
+# seconds a client can stay unused before it gets closed
+DEFAULT_IDLE_TIMEOUT = 300
+
+# clients unused for more than that many seconds are checked before reuse
+DEFAULT_HEALTH_CHECK_INTERVAL = 1
+
+###############################################################################
+# PooledConnection Class
+###############################################################################
+class PooledConnection(object):
+
+    ###########################################################################
+    def __init__(self, key, client):
+        self.key = key
+        self.client = client
+        self.last_used = time.time()
+
+###############################################################################
+# ConnectionPool Class
+###############################################################################
+class ConnectionPool(object):
+    """
+        Keeps one client per (address, credentials) so that all servers and
+        executions talking to the same address as the same user share it.
+        Clients are checked before being reused after some idle time, closed
+        after idle_timeout and the least recently used ones are closed once
+        there are more than max_size of them.
+    """
+
+    ###########################################################################
+    def __init__(self, connect, max_size=DEFAULT_MAX_SIZE,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 health_check_interval=DEFAULT_HEALTH_CHECK_INTERVAL):
+        self._connect = connect
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        # key -> PooledConnection, least recently used first
+        self._connections = OrderedDict()
+        self._lock = threading.Lock()
+
+    ###########################################################################
+    def get_connection(self, address, credentials=None):
+        """
+            Returns a healthy client for the given address and credentials,
+            creating one if needed. Raises if the address cannot be reached.
+        """
+        key = (address, credentials)
+        now = time.time()
+
+        with self._lock:
+            pooled = self._connections.pop(key, None)
+            if pooled is not None:
+                self._connections[key] = pooled
+            expired = self._pop_idle_connections(now)
+
+        close_connections(expired)
+
+        if pooled is not None:
+            if (now - pooled.last_used < self.health_check_interval or
+                    is_healthy(pooled.client)):
+                pooled.last_used = now
+                return pooled.client
+
+            log_verbose("Discarding unhealthy connection to '%s'" % address)
+            self.discard(address, credentials, client=pooled.client)
+
+        client = self._connect(address)
+
+        with self._lock:
+            pooled = self._connections.pop(key, None)
+            if pooled is None:
+                pooled = PooledConnection(key, client)
+                client = None
+            pooled.last_used = time.time()
+            self._connections[key] = pooled
+            evicted = self._pop_lru_connections()
+
+        # another thread has connected in the meantime
+        if client is not None:
+            evicted.append(PooledConnection(key, client))
+
+        close_connections(evicted)
+        return pooled.client
+
+    ###########################################################################
+    def discard(self, address, credentials=None, client=None):
+        """
+            Closes the client of the given address and credentials (only if
+            it is the given client, when specified).
+        """
+        key = (address, credentials)
+        with self._lock:
+            pooled = self._connections.get(key)
+            if pooled is None or (client is not None and
+                                  pooled.client is not client):
+                return
+            del self._connections[key]
+
+        close_connections([pooled])
+
+    ###########################################################################
+    def discard_address(self, address):
+        """
+            Closes all clients of the given address.
+        """
+        with self._lock:
+            discarded = [pooled for key, pooled in self._connections.items()
+                         if key[0] == address]
+            for pooled in discarded:
+                del self._connections[pooled.key]
+
+        close_connections(discarded)
+
+    ###########################################################################
+    def release(self, address, credentials=None):
+        """
+            Removes the client of the given address and credentials from the
+            pool without closing it, since other servers and executions may
+            still be using it. The next get_connection() creates a new one.
+        """
+        with self._lock:
+            self._connections.pop((address, credentials), None)
+
+    ###########################################################################
+    def release_address(self, address):
+        """
+            Like release() for all clients of the given address.
+        """
+        with self._lock:
+            for key in [key for key in self._connections
+                        if key[0] == address]:
+                del self._connections[key]
+
+    ###########################################################################
+    def clear(self):
+        with self._lock:
+            discarded = self._connections.values()
+            self._connections.clear()
+
+        close_connections(discarded)
+
+    ###########################################################################
+    def size(self):
+        return len(self._connections)
+
+    ###########################################################################
+    def _pop_idle_connections(self, now):
+        idle = [pooled for pooled in self._connections.values()
+                if now - pooled.last_used > self.idle_timeout]
+        for pooled in idle:
+            del self._connections[pooled.key]
+        return idle
+
+    ###########################################################################
+    def _pop_lru_connections(self):
+        evicted = []
+        while len(self._connections) > self.max_size:
+            evicted.append(self._connections.popitem(last=False)[1])
+        return evicted
+
+###############################################################################
+def is_healthy(client):
+    try:
+        return client.alive()
+    except Exception, e:
+        log_exception(e)
+        return False
+
+###############################################################################
+def close_connections(connections):
+    for pooled in connections:
+        try:
+            pooled.client.close()
+        except Exception, e:
+            log_exception(e)
+
+###############################################################################
+# Global variables: the process wide pool, created on first use with the
+# "connectionPool" settings of mongoctl.config
+__connection_pool__ = None
+__connection_pool_lock__ = threading.Lock()
+
+###############################################################################
+def get_connection_pool():
+    global __connection_pool__
+
+    with __connection_pool_lock__:
+        if __connection_pool__ is None:
+            __connection_pool__ = _new_connection_pool()
+        return __connection_pool__
+
+###############################################################################
+def _new_connection_pool():
+    # import here to avoid circular imports
+    from objects.server import make_db_connection
+
+    try:
+        settings = config.get_mongoctl_config_val("connectionPool") or {}
+    except MongoctlException, e:
+        log_exception(e)
+        settings = {}
+
+    return ConnectionPool(
+        make_db_connection,
+        max_size=settings.get("maxSize", DEFAULT_MAX_SIZE),
+        idle_timeout=settings.get("idleTimeout", DEFAULT_IDLE_TIMEOUT),
+        health_check_interval=settings.get("healthCheckInterval",
+                                           DEFAULT_HEALTH_CHECK_INTERVAL))
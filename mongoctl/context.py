@@ -0,0 +1,102 @@
+__author__ = 'richardxx'
+
+import threading
+
+###############################################################################
+# Execution Context Class
+###############################################################################
+class ExecutionContext(object):
+    """
+        Holds the state of a single command execution: prompt flags, the
+        login user passed on the command line, assumed local servers, the
+        servers started and the server/cluster objects looked up so far.
+        Every mongoctl.execute() call runs with its own context so that
+        commands can be executed by several threads at once.
+    """
+
+    ###########################################################################
+    # Constructor
+    ###########################################################################
+    def __init__(self):
+        # prompt flags
+        self.interactive_mode = True
+        self.say_yes_to_everything = False
+        self.say_no_to_everything = False
+
+        # login user passed with -u/-p
+        self.global_login_user = {
+            "serverId": None,
+            "database": "admin",
+            "username": None,
+            "password": None
+        }
+
+        # ids of servers passed with --assume-local
+        self.assumed_local_servers = []
+
+        # server id -> pid of the mongod processes started by this execution
+        self.mongod_pids = {}
+
+        # config root passed with --config-root. None means the default
+        self.config_root = None
+
+        # config root -> the snapshot of the servers/clusters config files
+        # used by this execution, the current one when it was first needed
+        self.configured_documents = {}
+
+        # config root -> the server/cluster objects (ConfiguredObjects) of
+        # the snapshot, each built the first time it is looked up
+        self.configured_servers = {}
+        self.configured_clusters = {}
+
+        # id -> server/cluster fetched from the db repository (None if it is
+        # not there) so that each is fetched and instantiated only once
+        self.db_servers = {}
+        self.db_clusters = {}
+
+###############################################################################
+# Global variables: the context used outside of execute() (e.g. by the main
+# thread of a service) and the context of the execution of each thread
+__default_context__ = ExecutionContext()
+__thread_local__ = threading.local()
+
+###############################################################################
+def get_context():
+    """
+        Returns the context of the execution running in the current thread or
+        the default context if there is none.
+    """
+    context = getattr(__thread_local__, "context", None)
+    if context is None:
+        return __default_context__
+    return context
+
+###############################################################################
+def get_default_context():
+    return __default_context__
+
+###############################################################################
+class execution_context(object):
+    """
+        Runs a block with the given (or a new) context as the context of the
+        current thread, e.g.
+
+            with execution_context() as context:
+                ...
+    """
+
+    ###########################################################################
+    def __init__(self, context=None):
+        self._context = context or ExecutionContext()
+        self._previous_context = None
+
+    ###########################################################################
+    def __enter__(self):
+        self._previous_context = getattr(__thread_local__, "context", None)
+        __thread_local__.context = self._context
+        return self._context
+
+    ###########################################################################
+    def __exit__(self, exc_type, exc_value, traceback):
+        __thread_local__.context = self._previous_context
+        return False
@@ -30,8 +30,13 @@ def json_minify(json,strip_space=True):
         from_index = match.end()
         
         if match.group() == '"' and not in_multiline_comment and not in_singleline_comment:
-            escaped = re.search('(\\\\)*$',json[:match.start()])
-            if not in_string or escaped is None or len(escaped.group()) % 2 == 0:
+            # count the backslashes right before the " character. Searching
+            # json[:match.start()] instead is quadratic in the json length
+            escapes = 0
+            while (match.start() - escapes > 0 and
+                   json[match.start() - escapes - 1] == '\\'):
+                escapes += 1
+            if not in_string or escapes % 2 == 0:
                 # start of string with ", or unescaped " character found to end string
                 in_string = not in_string
             from_index -= 1 # include " character in next catch
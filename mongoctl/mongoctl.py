@@ -31,11 +31,12 @@ __author__ = 'abdul, richardxx'
 
 import sys
 import traceback
+import threading
+import importlib
 
 import os
 
 import config
-import objects.server
 
 from dargparse import dargparse
 from mongoctl_logging import (
@@ -50,6 +51,7 @@ from prompt import (
 )
 
 from utils import namespace_get_property
+from context import execution_context
 from users import parse_global_login_user_arg
 
 ###############################################################################
@@ -61,6 +63,9 @@ SERVER_ID_PARAM = "server"
 
 
 parser = None
+# dargparse keeps track of the sub parser being parsed, so parsing is
+# serialized between threads
+parser_lock = threading.Lock()
 run_as_service = False
 
 
@@ -68,13 +73,58 @@ def setup(run_service=False):
     """
     This function should be called before doing anything else.
     """
-    global parser
     global run_as_service
 
-    parser = dargparse.build_parser(MONGOCTL_PARSER_DEF)
+    get_parser()
     run_as_service = run_service
 
 
+def get_parser():
+    """
+    Returns the parser, built the first time it is needed. Command modules
+    are only imported when their command runs.
+    """
+    global parser
+
+    with parser_lock:
+        if parser is None:
+            parser = dargparse.build_parser(
+                lazy_parser_def(MONGOCTL_PARSER_DEF))
+        return parser
+
+
+def lazy_parser_def(parser_def):
+    """
+    Returns a copy of the parser definition where command function names
+    are replaced with LazyCommandFunctions.
+    """
+    parser_def = dict(parser_def)
+    if isinstance(parser_def.get("function"), basestring):
+        parser_def["function"] = LazyCommandFunction(parser_def["function"])
+    if parser_def.get("children"):
+        parser_def["children"] = map(lazy_parser_def,
+                                     parser_def["children"])
+    return parser_def
+
+
+class LazyCommandFunction(object):
+    """
+    Stands in for a command function given by its fully qualified name and
+    imports the module of the function the first time it is called.
+    """
+
+    def __init__(self, function_name):
+        self.function_name = function_name
+        self._function = None
+
+    def __call__(self, *args, **kwargs):
+        if self._function is None:
+            module_name, name = self.function_name.rsplit(".", 1)
+            self._function = getattr(importlib.import_module(module_name),
+                                     name)
+        return self._function(*args, **kwargs)
+
+
 def is_service():
     global run_as_service
 
@@ -84,17 +134,20 @@ def is_service():
 def execute(args):
     """
         The real entry for processing requests.
+        Every call runs in its own execution context, so execute() can be
+        called by several threads at once.
     """
     ret_str = "Error"
-    try:
-        ret_str = __do_execute(args)
-        if isinstance(ret_str, basestring) is False:
-            ret_str = str(ret_str)
-    except MongoctlException, e:
-        log_error(e)
-        log_exception(e)
-    except Exception, e:
-        log_exception(e)
+    with execution_context():
+        try:
+            ret_str = __do_execute(args)
+            if isinstance(ret_str, basestring) is False:
+                ret_str = str(ret_str)
+        except MongoctlException, e:
+            log_error(e)
+            log_exception(e)
+        except Exception, e:
+            log_exception(e)
 
     return ret_str
 
@@ -109,7 +162,7 @@ def __do_execute(args):
                 /___/ 
 -------------------------------------------------------------------------------------------
    """
-    global parser
+    parser = get_parser()
 
     if len(args) < 1:
         print(header)
@@ -117,7 +170,8 @@ def __do_execute(args):
         return
 
     # Parse the arguments and call the function of the selected cmd
-    parsed_args = parser.parse_args(args)
+    with parser_lock:
+        parsed_args = parser.parse_args(args)
 
     # turn on verbose if specified
     if namespace_get_property(parsed_args, "mongoctlVerbose"):
@@ -163,7 +217,9 @@ def __do_execute(args):
         # check if assumeLocal was specified
         assume_local = namespace_get_property(parsed_args, "assumeLocal")
         if assume_local:
-            objects.server.assume_local_server(server_id)
+            # import here, the server module is only needed for this
+            from objects.server import assume_local_server
+            assume_local_server(server_id)
 
     # execute command
     log_info("")
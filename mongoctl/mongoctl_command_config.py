@@ -793,7 +793,40 @@ MONGOCTL_PARSER_DEF = {
             "group": "serverCommands",
             "shortDescription" : "show list of configured servers",
             "description" : "Show list of configured servers.",
-            "function": "mongoctl.commands.server.list_servers.list_servers_command"
+            "function": "mongoctl.commands.server.list_servers.list_servers_command",
+            "args": [
+                    {
+                    "name": "noProbe",
+                    "type" : "optional",
+                    "cmd_arg":  ["--no-probe"],
+                    "nargs": 0,
+                    "help": "do not check which servers are online",
+                    "default": False
+                },
+                    {
+                    "name": "probeTimeout",
+                    "type" : "optional",
+                    "displayName": "SECONDS",
+                    "cmd_arg":  ["--probe-timeout"],
+                    "nargs": 1,
+                    "valueType": float,
+                    "help": "seconds to wait for each server before showing "
+                            "it as timed out (default: memberTimeout config "
+                            "value or 5)",
+                    "default": None
+                },
+                    {
+                    "name": "probeConcurrency",
+                    "type" : "optional",
+                    "displayName": "N",
+                    "cmd_arg":  ["--probe-concurrency"],
+                    "nargs": 1,
+                    "valueType": int,
+                    "help": "max number of servers checked at once (default: "
+                            "memberConcurrency config value or 32)",
+                    "default": None
+                }
+            ]
         },
         #### show-server ####
             {
@@ -982,6 +1015,53 @@ MONGOCTL_PARSER_DEF = {
                         "--use-best-secondary"
                     ],
                     "nargs": 0
+                },
+                    {
+                    "name": "parallel",
+                    "type" : "optional",
+                    "displayName": "N",
+                    "cmd_arg":  ["--parallel"],
+                    "nargs": 1,
+                    "valueType": int,
+                    "help": "Only for db addresses. Dump each collection "
+                            "with its own mongodump, N at a time, and write "
+                            "a dump-manifest.json to the output directory",
+                    "default": None
+                },
+                    {
+                    "name": "byShard",
+                    "type" : "optional",
+                    "help": "Only for sharded clusters. Dump all shards, each "
+                            "from its best secondary, and the config servers "
+                            "concurrently with the balancer stopped",
+                    "cmd_arg": [
+                        "--by-shard"
+                    ],
+                    "nargs": 0
+                },
+                    {
+                    "name": "archive",
+                    "type" : "optional",
+                    "displayName": "FILE",
+                    "help": "write the dump to a single compressed archive "
+                            "FILE or '-' for stdout, compressed as it comes "
+                            "out of mongodump (needs mongodump 3.2+)",
+                    "cmd_arg": [
+                        "--archive"
+                    ],
+                    "nargs": 1
+                },
+                    {
+                    "name": "compression",
+                    "type" : "optional",
+                    "displayName": "NAME",
+                    "help": "compression of the archive: gzip, bz2, zstd "
+                            "(if installed) or none (default: told from "
+                            "FILE's extension, else gzip)",
+                    "cmd_arg": [
+                        "--compression"
+                    ],
+                    "nargs": 1
                 },
                 #   {
                 #    "name": "maxReplLag",
@@ -1156,6 +1236,42 @@ MONGOCTL_PARSER_DEF = {
                     "type" : "positional",
                     "nargs": 1,
                     "help": "directory or filename to restore from"
+                },
+                    {
+                    "name": "parallel",
+                    "type" : "optional",
+                    "displayName": "N",
+                    "cmd_arg":  ["--parallel"],
+                    "nargs": 1,
+                    "valueType": int,
+                    "help": "Only for db addresses. Restore each collection "
+                            "of the SOURCE directory with its own "
+                            "mongorestore, N at a time, then build the "
+                            "indexes once all the data is loaded",
+                    "default": None
+                },
+                    {
+                    "name": "archive",
+                    "type" : "optional",
+                    "help": "SOURCE is an archive written by dump --archive "
+                            "or '-' for stdin, decompressed as it goes into "
+                            "mongorestore (needs mongorestore 3.2+)",
+                    "cmd_arg": [
+                        "--archive"
+                    ],
+                    "nargs": 0
+                },
+                    {
+                    "name": "compression",
+                    "type" : "optional",
+                    "displayName": "NAME",
+                    "help": "compression of the archive: gzip, bz2, zstd "
+                            "(if installed) or none (default: told from "
+                            "SOURCE's extension, else gzip)",
+                    "cmd_arg": [
+                        "--compression"
+                    ],
+                    "nargs": 1
                 },
                     {
                     "name": "username",
@@ -1287,6 +1403,141 @@ MONGOCTL_PARSER_DEF = {
 
             ]
         },
+        #### backup ####
+            {
+            "prog": "backup",
+            "group": "clientCommands",
+            "shortDescription" : "incremental backup of a server or replica set",
+            "description" : "Takes a full dump (with --oplog) of a server or "
+                            "of the best secondary \nof a replica set "
+                            "cluster into an empty BACKUP_DIR, or else \n"
+                            "backs up the oplog entries written since the "
+                            "last backup \nas a new oplog segment. Restore "
+                            "with point-in-time-restore.",
+            "function": "mongoctl.commands.common.backup.backup_command",
+            "args": [
+                    {
+                    "name": "target",
+                    "displayName": "TARGET",
+                    "type" : "positional",
+                    "nargs": 1,
+                    "help": "A valid server id or replica set cluster id"
+                },
+                    {
+                    "name": "backupDir",
+                    "displayName": "BACKUP_DIR",
+                    "type" : "positional",
+                    "nargs": 1,
+                    "help": "directory of the backup"
+                },
+                    {
+                    "name": "interval",
+                    "type" : "optional",
+                    "displayName": "SECONDS",
+                    "cmd_arg":  ["--interval"],
+                    "nargs": 1,
+                    "valueType": int,
+                    "help": "keep backing up the oplog every SECONDS",
+                    "default": None
+                },
+                    {
+                    "name": "maxReplLag",
+                    "type" : "optional",
+                    "displayName": "SECONDS",
+                    "cmd_arg":  ["--max-repl-lag"],
+                    "nargs": 1,
+                    "valueType": int,
+                    "help": "Only for clusters. Back up from a secondary "
+                            "whose repl lag is less than SECONDS",
+                    "default": None
+                },
+                    {
+                    "name": "username",
+                    "type" : "optional",
+                    "help": "username",
+                    "cmd_arg": [
+                        "-u"
+                    ],
+                    "nargs": 1
+                },
+                    {
+                    "name": "password",
+                    "type" : "optional",
+                    "help": "password",
+                    "cmd_arg": [
+                        "-p"
+                    ],
+                    "nargs": "?"
+                }
+            ]
+        },
+
+        #### point-in-time-restore ####
+            {
+            "prog": "point-in-time-restore",
+            "group": "clientCommands",
+            "shortDescription" : "restore a backup up to a point in time",
+            "description" : "Restores the full dump of a backup taken with "
+                            "the backup command \nto a database address, "
+                            "then replays its oplog segments \n(using "
+                            "mongorestore --oplogReplay), up to TIMESTAMP if "
+                            "specified.",
+            "function": "mongoctl.commands.common.backup.point_in_time_restore_command",
+            "args": [
+                    {
+                    "name": "destination",
+                    "displayName": "DESTINATION",
+                    "type" : "positional",
+                    "nargs": 1,
+                    "help": "database address. Check docs for more details."
+                },
+                    {
+                    "name": "backupDir",
+                    "displayName": "BACKUP_DIR",
+                    "type" : "positional",
+                    "nargs": 1,
+                    "help": "directory of the backup"
+                },
+                    {
+                    "name": "until",
+                    "type" : "optional",
+                    "displayName": "TIMESTAMP",
+                    "cmd_arg":  ["--until"],
+                    "nargs": 1,
+                    "help": "replay the operations before TIMESTAMP "
+                            "(<seconds>[:<ordinal>]) only",
+                    "default": None
+                },
+                    {
+                    "name": "drop",
+                    "type" : "optional",
+                    "help": "drop each collection before restoring it",
+                    "cmd_arg": [
+                        "--drop"
+                    ],
+                    "nargs": 0
+                },
+                    {
+                    "name": "username",
+                    "type" : "optional",
+                    "help": "username",
+                    "cmd_arg": [
+                        "-u"
+                    ],
+                    "nargs": 1
+                },
+                    {
+                    "name": "password",
+                    "type" : "optional",
+                    "help": "password",
+                    "cmd_arg": [
+                        "-p"
+                    ],
+                    "nargs": "?"
+                }
+            ]
+        },
+
         #### resync-secondary ####
             {
             "prog": "resync-secondary",
@@ -1386,6 +1637,73 @@ MONGOCTL_PARSER_DEF = {
             ]
         },
 
+        #### rolling-restart ####
+            {
+            "prog": "rolling-restart",
+            "group": "clusterCommands",
+            "shortDescription" : "restart a replica set member by member",
+            "description" : "Restarts the secondaries of a replica set "
+                            "cluster, several at a \ntime while a majority "
+                            "stays up, waiting for them to catch \nup, then "
+                            "steps the primary down and restarts it. \n"
+                            "Reports how long the cluster had no primary.",
+            "function": "mongoctl.commands.cluster.rolling_restart.rolling_restart_command",
+            "args": [
+                    {
+                    "name": "ClusterId",
+                    "type" : "positional",
+                    "nargs": 1,
+                    "displayName": "CLUSTER_ID",
+                    "help": "A valid cluster id"
+                },
+
+                    {
+                    "name": "parallelFraction",
+                    "type" : "optional",
+                    "displayName": "FRACTION",
+                    "cmd_arg":  ["--parallel-fraction"],
+                    "nargs": 1,
+                    "valueType": float,
+                    "help": "fraction of the members restarted at once, "
+                            "never more than what keeps a majority up "
+                            "(default: rollingRestartFraction config value "
+                            "or 0.5)",
+                    "default": None
+                },
+
+                    {
+                    "name": "maxReplLag",
+                    "type" : "optional",
+                    "displayName": "SECONDS",
+                    "cmd_arg":  ["--max-repl-lag"],
+                    "nargs": 1,
+                    "valueType": int,
+                    "help": "repl lag under which a restarted member has "
+                            "caught up (default: 10)",
+                    "default": None
+                },
+
+                    {
+                    "name": "username",
+                    "type" : "optional",
+                    "help": "admin username",
+                    "cmd_arg": [
+                        "-u"
+                    ],
+                    "nargs": 1
+                },
+                    {
+                    "name": "password",
+                    "type" : "optional",
+                    "help": "admin password",
+                    "cmd_arg": [
+                        "-p"
+                    ],
+                    "nargs": "?"
+                }
+            ]
+        },
+
         #### configure-cluster ####
             {
             "prog": "configure-cluster",
@@ -1452,7 +1770,41 @@ MONGOCTL_PARSER_DEF = {
             "group": "clusterCommands",
             "shortDescription" : "show list of configured clusters",
             "description" : "Show list of configured servers",
-            "function": "mongoctl.commands.cluster.list_clusters.list_clusters_command"
+            "function": "mongoctl.commands.cluster.list_clusters.list_clusters_command",
+            "args": [
+                    {
+                    "name": "status",
+                    "type" : "optional",
+                    "cmd_arg":  ["--status"],
+                    "nargs": 0,
+                    "help": "show how many members of each cluster are "
+                            "online (members are checked concurrently)",
+                    "default": False
+                },
+                    {
+                    "name": "probeTimeout",
+                    "type" : "optional",
+                    "displayName": "SECONDS",
+                    "cmd_arg":  ["--probe-timeout"],
+                    "nargs": 1,
+                    "valueType": float,
+                    "help": "seconds to wait for each server before showing "
+                            "it as timed out (default: memberTimeout config "
+                            "value or 5)",
+                    "default": None
+                },
+                    {
+                    "name": "probeConcurrency",
+                    "type" : "optional",
+                    "displayName": "N",
+                    "cmd_arg":  ["--probe-concurrency"],
+                    "nargs": 1,
+                    "valueType": int,
+                    "help": "max number of servers checked at once (default: "
+                            "memberConcurrency config value or 32)",
+                    "default": None
+                }
+            ]
         },
 
         #### show-cluster ####
@@ -18,6 +18,7 @@ logger = None
 
 # logger settings
 _log_to_stdout = True
+_log_stream = sys.stdout
 _logging_level = logging.INFO
 
 VERBOSE = 5
@@ -49,7 +50,7 @@ def get_logger():
 
     global _log_to_stdout
     if _log_to_stdout:
-        sh = logging.StreamHandler(sys.stdout)
+        sh = logging.StreamHandler(_log_stream)
         std_formatter = logging.Formatter("%(message)s")
         sh.setFormatter(std_formatter)
         sh.setLevel(_logging_level)
@@ -64,6 +65,31 @@ def setup_logging(log_level=logging.INFO, log_to_stdout=True):
     _log_to_stdout = log_to_stdout
     _logging_level = log_level
 
+###############################################################################
+def log_to_stderr():
+    """
+    Moves messages logged to stdout to stderr, for commands that write their
+    output to stdout. Returns the previous stream for set_log_stream().
+    """
+    return set_log_stream(sys.stderr)
+
+###############################################################################
+def set_log_stream(stream):
+    """
+    Sends messages logged to the current stream to the given stream instead.
+    Returns the previous stream.
+    """
+    global _log_stream
+
+    previous_stream = _log_stream
+    _log_stream = stream
+    for handler in logging.getLogger().handlers:
+        if (isinstance(handler, logging.StreamHandler) and
+                getattr(handler, "stream", None) is previous_stream):
+            handler.stream = stream
+
+    return previous_stream
+
 ###############################################################################
 def turn_logging_verbose_on():
     global _logging_level
@@ -3,7 +3,10 @@ __author__ = 'abdul'
 
 
 import server
+import threading
+import time
 
+from mongoctl import config
 from mongoctl.utils import resolve_path
 from mongoctl.mongoctl_logging import log_verbose, log_debug, log_exception
 
@@ -18,6 +21,15 @@ from sharded_cluster import ShardedCluster
 
 LOCK_FILE_NAME = "mongod.lock"
 
+# seconds isMaster/replSetGetStatus results are reused for
+DEFAULT_TOPOLOGY_SNAPSHOT_TTL = 0.5
+
+# commands that may change what isMaster and replSetGetStatus say
+TOPOLOGY_CHANGING_COMMANDS = ["replSetInitiate", "replSetReconfig",
+                              "replSetStepDown", "replSetFreeze",
+                              "replSetMaintenance", "replSetSyncFrom",
+                              "shutdown"]
+
 ###############################################################################
 # MongodServer Class
 ###############################################################################
@@ -29,6 +41,8 @@ class MongodServer(server.Server):
     ###########################################################################
     def __init__(self, server_doc):
         super(MongodServer, self).__init__(server_doc)
+        self._topology_snapshot = None
+        self._topology_snapshot_lock = threading.Lock()
 
     ###########################################################################
     # Properties
@@ -241,6 +255,10 @@ class MongodServer(server.Server):
 
     ###########################################################################
     def get_rs_status(self):
+        return self.get_topology_snapshot().get_rs_status()
+
+    ###########################################################################
+    def fetch_rs_status(self):
         try:
             rs_status_cmd = SON([('replSetGetStatus', 1)])
             rs_status =  self.db_command(rs_status_cmd, 'admin')
@@ -282,6 +300,10 @@ class MongodServer(server.Server):
 
     ###########################################################################
     def is_master_command(self):
+        return self.get_topology_snapshot().get_is_master()
+
+    ###########################################################################
+    def fetch_is_master(self):
         try:
             if self.is_online():
                 result = self.db_command({"isMaster" : 1}, "admin")
@@ -291,6 +313,33 @@ class MongodServer(server.Server):
             log_verbose("isMaster command failed on server '%s'. Cause %s" %
                         (self.id, e))
 
+    ###########################################################################
+    def get_topology_snapshot(self):
+        with self._topology_snapshot_lock:
+            snapshot = self._topology_snapshot
+            if snapshot is None or snapshot.is_expired():
+                snapshot = TopologySnapshot(self, get_topology_snapshot_ttl())
+                self._topology_snapshot = snapshot
+            return snapshot
+
+    ###########################################################################
+    def invalidate_topology_snapshot(self):
+        with self._topology_snapshot_lock:
+            self._topology_snapshot = None
+
+    ###########################################################################
+    def db_command(self, cmd, dbname, **kwargs):
+        try:
+            return super(MongodServer, self).db_command(cmd, dbname, **kwargs)
+        finally:
+            if any(name in cmd for name in TOPOLOGY_CHANGING_COMMANDS):
+                self.invalidate_topology_snapshot()
+
+    ###########################################################################
+    def close_db_connection(self, credentials=None):
+        super(MongodServer, self).close_db_connection(credentials=credentials)
+        self.invalidate_topology_snapshot()
+
     ###########################################################################
     def read_replicaset_name(self):
         master_result = self.is_master_command()
@@ -312,4 +361,49 @@ class MongodServer(server.Server):
 
         return get_member_repl_lag(member_status, master_status)
 
+###############################################################################
+# TopologySnapshot Class
+###############################################################################
+class TopologySnapshot(object):
+    """
+        The isMaster and replSetGetStatus results of a server, each fetched
+        the first time it is needed and reused by all of the server's
+        predicates (is_primary(), is_secondary(), read_replicaset_name(),
+        get_member_rs_status()...) until the snapshot expires.
+    """
+
+    ###########################################################################
+    def __init__(self, server, ttl):
+        self._server = server
+        self._expires = time.time() + ttl
+        self._is_master = None
+        self._has_is_master = False
+        self._rs_status = None
+        self._has_rs_status = False
+        # threads sharing the snapshot wait for the same fetch
+        self._lock = threading.RLock()
+
+    ###########################################################################
+    def is_expired(self):
+        return time.time() >= self._expires
 
+    ###########################################################################
+    def get_is_master(self):
+        with self._lock:
+            if not self._has_is_master:
+                self._is_master = self._server.fetch_is_master()
+                self._has_is_master = True
+            return self._is_master
+
+    ###########################################################################
+    def get_rs_status(self):
+        with self._lock:
+            if not self._has_rs_status:
+                self._rs_status = self._server.fetch_rs_status()
+                self._has_rs_status = True
+            return self._rs_status
+
+###############################################################################
+def get_topology_snapshot_ttl():
+    return config.get_mongoctl_config_val("topologySnapshotTTL",
+                                          DEFAULT_TOPOLOGY_SNAPSHOT_TTL)
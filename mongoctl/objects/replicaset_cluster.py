@@ -12,6 +12,7 @@ from mongoctl.config import get_cluster_member_alt_address_mapping
 from mongoctl.mongoctl_logging import log_verbose, log_error, log_db_command
 
 from mongoctl.prompt import prompt_confirm
+from mongoctl.parallel import fan_out, fan_out_first, get_result_status
 
 ###############################################################################
 # ReplicaSet Cluster Member Class
@@ -62,6 +63,10 @@ class ReplicaSetClusterMember(DocumentWrapper):
     def get_priority(self):
         return self.get_property("priority")
 
+    ###########################################################################
+    def get_slave_delay(self):
+        return self.get_property("slaveDelay") or 0
+
     ###########################################################################
     # Interface Methods
     ###########################################################################
@@ -309,11 +314,9 @@ class ReplicaSetCluster(Cluster):
 
     ###########################################################################
     def get_primary_member(self):
-        for member in self.get_members():
-            if member.get_server().is_primary():
-                return member
-
-        return None
+        # ask all members at once instead of waiting on offline ones in turn
+        return fan_out_first(lambda member: member.get_server().is_primary(),
+                             self.get_members())
 
     ###########################################################################
     def suggest_primary_member(self):
@@ -325,7 +328,16 @@ class ReplicaSetCluster(Cluster):
 
     ###########################################################################
     def get_status(self):
-        primary_server = self.get_primary_member().get_server()
+        primary_member = self.get_primary_member()
+        if primary_member is None:
+            # no primary to ask about the others so report what each member
+            # says about itself
+            return {
+                "primary": None,
+                "members": self.get_members_status()
+            }
+
+        primary_server = primary_member.get_server()
         master_status = primary_server.get_member_rs_status()
         primary_server_address = master_status['name']
 
@@ -372,6 +384,23 @@ class ReplicaSetCluster(Cluster):
             "otherMembers": other_members
         }
 
+    ###########################################################################
+    def get_members_status(self):
+        """
+        Returns the status of each member, collected concurrently. Members
+        that do not answer in time are reported as timed out.
+        """
+        results = fan_out(lambda member: member.get_server().get_status(),
+                          self.get_members())
+        members_status = []
+        for result in results:
+            server = result.item.get_server()
+            status = get_result_status(result)
+            status["server"] = server.id
+            members_status.append(status)
+
+        return members_status
+
     ###########################################################################
     def get_dump_best_secondary(self, max_repl_lag=None):
         """
@@ -408,13 +437,13 @@ class ReplicaSetCluster(Cluster):
             y_mem, y_lag = y
             if x_mem.is_passive():
                 if y_mem.is_passive():
-                    return x_lag - y_lag
+                    return cmp(x_lag, y_lag)
                 else:
                     return -1
             elif y_mem.is_passive():
                 return 1
             else:
-                return x_lag - y_lag
+                return cmp(x_lag, y_lag)
 
         if secondary_lag_tuples:
             secondary_lag_tuples.sort(best_secondary_comp)
@@ -423,15 +452,14 @@ class ReplicaSetCluster(Cluster):
     ###########################################################################
     def is_replicaset_initialized(self):
         """
-        iterate on all members you get a member with a non-null
+        ask all members concurrently until one returns a non-null
         read_replicaset_name()
         """
+        member = fan_out_first(
+            lambda member: member.get_server().read_replicaset_name(),
+            self.get_members())
 
-        for member in self.get_members():
-            if member.get_server().read_replicaset_name():
-                return True
-
-        return False
+        return member is not None
 
     ###########################################################################
     def initialize_replicaset(self, suggested_primary_server=None):
@@ -6,7 +6,7 @@ import mongoctl.repository as repository
 
 from base import DocumentWrapper
 from mongoctl.utils import resolve_path, document_pretty_string, is_host_local
-from pymongo.errors import AutoReconnect
+from pymongo.errors import AutoReconnect, OperationFailure
 from mongoctl.mongoctl_logging import (
     log_verbose, log_error, log_warning, log_exception, log_debug
     )
@@ -24,6 +24,8 @@ import datetime
 
 from mongoctl import config
 from mongoctl import users
+from mongoctl.context import get_context
+from mongoctl.connection_pool import get_connection_pool
 
 import traceback
 
@@ -59,11 +61,12 @@ class Server(DocumentWrapper):
     ###########################################################################
     def __init__(self, server_doc):
         DocumentWrapper.__init__(self, server_doc)
-        self.__db_connection__ = None
         self.__seed_users__ = None
         self.__login_users__ = {}
         self.__mongo_version__ = None
         self._connection_address = None
+        # dbname -> whether the db needs auth, as learned from the server
+        self._auth_states = {}
 
     ###########################################################################
     # Properties
@@ -347,7 +350,7 @@ class Server(DocumentWrapper):
             log_verbose("This is an expected exception that happens after "
                         "disconnecting db commands: %s" % e)
         finally:
-            self.__db_connection__ = None
+            self.close_db_connection()
 
     ###########################################################################
     def timeout_maybe_db_command(self, cmd, dbname):
@@ -363,7 +366,7 @@ class Server(DocumentWrapper):
             else:
                 raise
         finally:
-            self.__db_connection__ = None
+            self.close_db_connection()
 
     ###########################################################################
     def db_command(self, cmd, dbname, **kwargs):
@@ -371,15 +374,26 @@ class Server(DocumentWrapper):
         need_auth = self.command_needs_auth(dbname, cmd)
         db = self.get_db(dbname, no_auth=not need_auth)
 
-        if cmd.has_key("addShard"):
-            shard_given_name = kwargs.get("name", "")
-            return db.command("addShard", cmd.get('addShard'), name=shard_given_name)
+        try:
+            return run_db_command(db, cmd, **kwargs)
+        except OperationFailure, e:
+            if need_auth or not is_auth_error(e):
+                raise
 
-        return db.command(cmd, **kwargs)
+        # the db turned out to need auth
+        log_verbose("Server '%s' needs auth on db '%s'" % (self.id, dbname))
+        self._auth_states[dbname] = True
+        db = self.get_db(dbname)
+        return run_db_command(db, cmd, **kwargs)
 
     ###########################################################################
     def command_needs_auth(self, dbname, cmd):
-        return self.needs_to_auth(dbname)
+        """
+        Returns what was learned about the db so far. If nothing was then the
+        command runs without auth first and db_command() learns it from the
+        command's failure instead of checking beforehand.
+        """
+        return self._auth_states.get(dbname, False)
 
     ###########################################################################
     def get_db(self, dbname, no_auth=False, username=None, password=None,
@@ -413,25 +427,27 @@ class Server(DocumentWrapper):
             admin_db = self.get_db("admin", retry=retry)
             return admin_db.connection[dbname]
 
-        auth_success = self.authenticate_db(db, dbname, retry=retry)
+        auth_db = self.authenticate_db(dbname, retry=retry)
 
         # If auth failed then give it a try by auth into admin db unless it
         # was specified not to
         if (not never_auth_with_admin and
-                not auth_success
+                auth_db is None
             and dbname != "admin"):
             admin_db = self.get_db("admin", retry=retry)
             return admin_db.connection[dbname]
 
-        if auth_success:
-            return db
+        if auth_db is not None:
+            return auth_db
         else:
             raise MongoctlException("Failed to authenticate to %s db" % dbname)
 
     ###########################################################################
-    def authenticate_db(self, db, dbname, retry=True):
+    def authenticate_db(self, dbname, retry=True):
         """
-        Returns True if we manage to auth to the given db, else False.
+        Returns the given db authenticated to if we manage to auth, else None.
+        Each login gets its own pooled connection since pymongo keeps the
+        credentials on the connection.
         """
         login_user = self.get_login_user(dbname)
         username = None
@@ -457,7 +473,17 @@ class Server(DocumentWrapper):
                                              (dbname, username))
 
             # if auth success then exit loop and memoize login
-            auth_success = db.authenticate(username, password)
+            credentials = (dbname, username, password)
+            connection = self.get_db_connection(credentials=credentials)
+            if connection is None:
+                raise MongoctlException("Cannot authenticate to server '%s':"
+                                        " server is unreachable" % self.id)
+            db = connection[dbname]
+            try:
+                auth_success = db.authenticate(username, password)
+            finally:
+                if not auth_success:
+                    self.close_db_connection(credentials=credentials)
             if auth_success or not retry:
                 break
             else:
@@ -469,8 +495,11 @@ class Server(DocumentWrapper):
 
         if auth_success:
             self.set_login_user(dbname, username, password)
+            return db
 
-        return auth_success
+        # check again next time
+        self._auth_states.pop(dbname, None)
+        return None
 
     ###########################################################################
     def get_working_login(self, database, username=None, password=None):
@@ -495,7 +524,10 @@ class Server(DocumentWrapper):
     ###########################################################################
     def is_online(self):
         try:
-            if self.get_db_connection() is not None:
+            connection = self.get_db_connection()
+            if connection is not None:
+                # asked every time: a pooled client may outlive the server
+                connection.admin.command("ping")
                 return True
         except Exception, e:
             log_exception(e)
@@ -538,9 +570,13 @@ class Server(DocumentWrapper):
     def needs_to_auth(self, dbname):
         """
         Determines if the server needs to authenticate to the database.
+        The answer is remembered until the connection is closed.
         NOTE: we stopped depending on is_auth() since its only a configuration
         and may not be accurate
         """
+        if dbname in self._auth_states:
+            return self._auth_states[dbname]
+
         log_debug("Checking if server '%s' needs to auth on  db '%s'...." %
                   (self.id, dbname))
         try:
@@ -548,9 +584,12 @@ class Server(DocumentWrapper):
             db = conn[dbname]
             db.collection_names()
             result = False
+            self._auth_states[dbname] = result
         except (RuntimeError, Exception), e:
             log_exception(e)
-            result = "authorized" in str(e)
+            result = is_auth_error(e)
+            if result:
+                self._auth_states[dbname] = result
 
         log_debug("needs_to_auth check for server '%s'  on db '%s' : %s" %
                   (self.id, dbname, result))
@@ -592,31 +631,36 @@ class Server(DocumentWrapper):
         return server_summary
 
     ###########################################################################
-    def get_db_connection(self):
+    def get_db_connection(self, credentials=None):
         """
+        Returns the pooled connection to the server for the given credentials
+        (dbname, username, password) or for no credentials.
         @return: May return None, please verify
         """
-        if self.__db_connection__ is None:
-            self.__db_connection__ = self.new_db_connection()
-        return self.__db_connection__
-
-    ###########################################################################
-    def close_db_connection(self):
-        if self.__db_connection__ is not None:
-            self.__db_connection__.close()
-        self.__db_connection__ = None
+        address = self.get_connection_address()
+        if address is None:
+            return None
+        return get_connection_pool().get_connection(address, credentials)
 
     ###########################################################################
-    def new_db_connection(self):
+    def close_db_connection(self, credentials=None):
         """
-            Create a new connection to the server.
-            For internal use only.
-            @return:
+        Releases the pooled connection for the given credentials or, by
+        default, all pooled connections to the server e.g. after shutting it
+        down, so that new ones are made next time. The clients are not closed:
+        other servers and executions may be using them.
         """
-        address = self.get_connection_address()
-        if address is not None:
-            return self.__db_connection__
-        return None
+        address = self._connection_address
+        if address is None:
+            return
+
+        if credentials is None:
+            get_connection_pool().release_address(address)
+            # recheck connectivity and auth next time
+            self._connection_address = None
+            self._auth_states = {}
+        else:
+            get_connection_pool().release(address, credentials)
 
     ###########################################################################
     def get_connection_address(self):
@@ -646,7 +690,8 @@ class Server(DocumentWrapper):
             try:
                 log_verbose("Checking if server '%s' is accessible on "
                             "address '%s'" % (self.id, address))
-                make_db_connection(address)
+                # the connection stays in the pool for get_db_connection()
+                get_connection_pool().get_connection(address)
                 return True
             except Exception, e:
                 log_exception(e)
@@ -751,6 +796,20 @@ class Server(DocumentWrapper):
         return None
 
 
+###############################################################################
+def run_db_command(db, cmd, **kwargs):
+    if cmd.has_key("addShard"):
+        shard_given_name = kwargs.get("name", "")
+        return db.command("addShard", cmd.get('addShard'),
+                          name=shard_given_name)
+
+    return db.command(cmd, **kwargs)
+
+###############################################################################
+def is_auth_error(error):
+    return "authorized" in str(error)
+
+###############################################################################
 def make_db_connection(address):
     """
         Connect to a given database
@@ -760,7 +819,7 @@ def make_db_connection(address):
     if address is None:
         traceback.print_stack()
 
-    print "db connection address: %s" % address
+    log_verbose("db connection address: %s" % address)
     try:
         tokens = address.split(":")
         host = tokens[0]
@@ -781,15 +840,11 @@ def is_logging_activity():
             config.get_mongoctl_config_val("logServerActivity", False))
 
 ###############################################################################
-__assumed_local_servers__ = []
-
-
 def assume_local_server(server_id):
-    global __assumed_local_servers__
-    if server_id not in __assumed_local_servers__:
-        __assumed_local_servers__.append(server_id)
+    assumed_local_servers = get_context().assumed_local_servers
+    if server_id not in assumed_local_servers:
+        assumed_local_servers.append(server_id)
 
 ###############################################################################
 def is_assumed_local_server(server_id):
-    global __assumed_local_servers__
-    return server_id in __assumed_local_servers__
+    return server_id in get_context().assumed_local_servers
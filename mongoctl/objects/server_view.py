@@ -0,0 +1,62 @@
+__author__ = 'richardxx'
+
+import mongoctl.repository as repository
+
+from server import DEFAULT_PORT
+
+###############################################################################
+# ServerView Class
+###############################################################################
+class ServerView(object):
+    """
+        The few fields of a server document needed to list it (the
+        repository's SERVER_VIEW_FIELDS), for scanning lots of servers
+        without instantiating them. The full Server is looked up the first
+        time it is needed.
+    """
+
+    __slots__ = ("id", "description", "address", "port", "_server")
+
+    ###########################################################################
+    def __init__(self, server_doc):
+        self.id = server_doc["_id"]
+        self.description = server_doc.get("description")
+        self.address = server_doc.get("address")
+        self.port = (server_doc.get("cmdOptions") or {}).get("port")
+        self._server = None
+
+    ###########################################################################
+    def get_description(self):
+        return self.description
+
+    ###########################################################################
+    def get_port(self):
+        if self.port is None:
+            return DEFAULT_PORT
+        return self.port
+
+    ###########################################################################
+    def get_address_display(self):
+        """
+        @return: same as Server.get_address_display()
+        """
+        if self.address is None:
+            return "localhost:%s" % self.get_port()
+        elif self.address.find(":") > 0:
+            return self.address
+        else:
+            return "%s:%s" % (self.address, self.get_port())
+
+    ###########################################################################
+    def get_server(self):
+        """
+        @return: the Server of the view, or None if it is gone
+        """
+        if self._server is None:
+            self._server = repository.lookup_server(self.id)
+        return self._server
+
+    ###########################################################################
+    def is_online(self):
+        server = self.get_server()
+        return server is not None and server.is_online()
@@ -10,6 +10,7 @@ from bson import DBRef
 
 from mongoctl.mongoctl_logging import log_info, log_error
 from mongoctl.utils import document_pretty_string
+from mongoctl.parallel import fan_out, fan_out_first, get_result_status
 
 import time
 ###############################################################################
@@ -264,12 +265,44 @@ class ShardedCluster(Cluster):
 
     ###########################################################################
     def get_any_online_mongos(self):
-        for member in self.get_members():
-            if member.get_server().is_online():
-                return member.get_server()
+        member = fan_out_first(lambda member: member.get_server().is_online(),
+                               self.get_members())
+        if member is not None:
+            return member.get_server()
 
         raise Exception("Unable to connect to a mongos")
 
+    ###########################################################################
+    def get_status(self):
+        """
+        Returns the status of all mongos, config servers and shards, collected
+        concurrently. Members that do not answer in time are reported as
+        timed out.
+        """
+        def member_status(member):
+            shard = member.get_shard()
+            if isinstance(shard, Server):
+                return shard.get_status(admin=True)
+            else:
+                return shard.get_status()
+
+        members = self.mongos_members + self.config_members + self.shards
+        results = fan_out(member_status, members)
+
+        statuses = []
+        for result in results:
+            status = get_result_status(result)
+            statuses.append({"id": result.item.get_shard_id(),
+                             "status": status})
+
+        num_mongos = len(self.mongos_members)
+        num_config = len(self.config_members)
+        return {
+            "mongos": statuses[:num_mongos],
+            "configServers": statuses[num_mongos:num_mongos + num_config],
+            "shards": statuses[num_mongos + num_config:]
+        }
+
 
     ###########################################################################
     def move_dbs_primary(self, db_names, dest_shard):
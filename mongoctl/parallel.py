@@ -0,0 +1,372 @@
+__author__ = 'richardxx'
+
+import threading
+import time
+
+from collections import deque
+
+import config
+from context import get_context, execution_context
+from mongoctl_logging import log_verbose, log_exception
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+# seconds to wait for a single member before reporting it as timed out
+DEFAULT_MEMBER_TIMEOUT = 5
+
+# max number of members contacted at once
+DEFAULT_MAX_WORKERS = 32
+
+# max number of items fan_out_iter() takes ahead, per worker
+PENDING_ITEMS_PER_WORKER = 10
+
+###############################################################################
+# FanOutResult Class
+###############################################################################
+class FanOutResult(object):
+    """
+        The outcome of calling a function on one item: its value, the error
+        it raised, or neither if it timed out or was never called.
+    """
+
+    ###########################################################################
+    def __init__(self, item):
+        self.item = item
+        self.value = None
+        self.error = None
+        self.done = False
+        self.timed_out = False
+
+###############################################################################
+def fan_out(function, items, timeout=None, max_workers=None,
+            stop_when=None, on_result=None):
+    """
+        Calls function on each item in daemon threads that run in the
+        current execution context, at most max_workers at a time (default is
+        the "memberConcurrency" config value), and returns a FanOutResult per
+        item (in the order of items).
+        Each call gets timeout seconds (default is the "memberTimeout" config
+        value) after which it is marked as timed out and left behind. Calls
+        left behind keep their worker until they return; if they hold every
+        worker for another timeout seconds, the items not called yet are
+        marked as timed out too.
+        on_result(result) is called in the calling thread as each call
+        finishes or times out.
+        Returns as soon as stop_when(result) is True for a finished call;
+        the results of calls not done by then are left as they are.
+    """
+    if timeout is None:
+        timeout = get_member_timeout()
+    if max_workers is None:
+        max_workers = get_max_workers()
+
+    results = [FanOutResult(item) for item in items]
+    pending = list(results)
+    running = {}
+    # timed out calls whose threads still run
+    abandoned = set()
+    blocked_since = None
+    condition = threading.Condition()
+    context = get_context()
+
+    def run(result):
+        value = None
+        error = None
+        with execution_context(context):
+            try:
+                value = function(result.item)
+            except (Exception, SystemExit), e:
+                # SystemExit e.g. from a failed server start
+                log_exception(e)
+                error = e
+
+        with condition:
+            if not result.timed_out:
+                result.value = value
+                result.error = error
+                result.done = True
+            abandoned.discard(result)
+            condition.notify()
+
+    with condition:
+        while True:
+            now = time.time()
+            stop = False
+            for result, deadline in running.items():
+                if result.done:
+                    del running[result]
+                    stop = stop or (stop_when is not None and
+                                    stop_when(result))
+                elif deadline is not None and now >= deadline:
+                    log_verbose("Timed out after %s second(s) waiting for "
+                                "'%s'" % (timeout, result.item))
+                    result.timed_out = True
+                    del running[result]
+                    abandoned.add(result)
+                else:
+                    continue
+
+                if on_result is not None:
+                    on_result(result)
+
+            if stop:
+                break
+
+            blocked_since = get_blocked_since(
+                blocked_since, now, pending and not running,
+                len(abandoned) >= max_workers)
+            give_up = (blocked_since is not None and
+                       now - blocked_since >= timeout)
+
+            while pending and (len(running) + len(abandoned) < max_workers or
+                               give_up):
+                result = pending.pop(0)
+                if len(running) + len(abandoned) < max_workers:
+                    running[result] = now + timeout if timeout else None
+                    thread = threading.Thread(target=run, args=(result,))
+                    thread.daemon = True
+                    thread.start()
+                else:
+                    log_verbose("Not calling for '%s': all workers are held"
+                                " by timed out calls" % result.item)
+                    result.timed_out = True
+                    if on_result is not None:
+                        on_result(result)
+
+            if running:
+                deadlines = [d for d in running.values() if d is not None]
+                condition.wait(max(min(deadlines) - now, 0) if deadlines
+                               else None)
+            elif pending:
+                condition.wait(blocked_since + timeout - now)
+            else:
+                break
+
+    return results
+
+###############################################################################
+def fan_out_iter(function, items, timeout=None, max_workers=None,
+                 max_pending=None):
+    """
+        Like fan_out() but takes items from an iterable as calls can be
+        started, and yields the FanOutResult of each item in the order of
+        items as soon as it is done or timed out.
+        At most max_pending items (default is PENDING_ITEMS_PER_WORKER times
+        max_workers) are taken ahead of the first one not yielded yet, so
+        that memory does not grow with the number of items.
+        Like in fan_out(), calls left behind keep their worker until they
+        return, and items are not called if they hold every worker for too
+        long.
+    """
+    if timeout is None:
+        timeout = get_member_timeout()
+    if max_workers is None:
+        max_workers = get_max_workers()
+    if max_pending is None:
+        max_pending = max_workers * PENDING_ITEMS_PER_WORKER
+
+    items = iter(items)
+    exhausted = False
+    # results not yielded yet, in the order of items
+    window = deque()
+    running = {}
+    # timed out calls whose threads still run
+    abandoned = set()
+    blocked_since = None
+    condition = threading.Condition()
+    context = get_context()
+
+    def run(result):
+        value = None
+        error = None
+        with execution_context(context):
+            try:
+                value = function(result.item)
+            except (Exception, SystemExit), e:
+                # SystemExit e.g. from a failed server start
+                log_exception(e)
+                error = e
+
+        with condition:
+            if not result.timed_out:
+                result.value = value
+                result.error = error
+                result.done = True
+            abandoned.discard(result)
+            condition.notify()
+
+    while window or not exhausted:
+        ready = []
+        with condition:
+            now = time.time()
+            for result, deadline in running.items():
+                if result.done:
+                    del running[result]
+                elif deadline is not None and now >= deadline:
+                    log_verbose("Timed out after %s second(s) waiting for "
+                                "'%s'" % (timeout, result.item))
+                    result.timed_out = True
+                    del running[result]
+                    abandoned.add(result)
+
+            blocked_since = get_blocked_since(
+                blocked_since, now, not exhausted and not running,
+                len(abandoned) >= max_workers)
+            give_up = (blocked_since is not None and
+                       now - blocked_since >= timeout)
+
+            while (not exhausted and len(window) < max_pending and
+                   (len(running) + len(abandoned) < max_workers or give_up)):
+                try:
+                    result = FanOutResult(items.next())
+                except StopIteration:
+                    exhausted = True
+                    break
+                window.append(result)
+                if len(running) + len(abandoned) < max_workers:
+                    running[result] = now + timeout if timeout else None
+                    thread = threading.Thread(target=run, args=(result,))
+                    thread.daemon = True
+                    thread.start()
+                else:
+                    log_verbose("Not calling for '%s': all workers are held"
+                                " by timed out calls" % result.item)
+                    result.timed_out = True
+
+            while window and (window[0].done or window[0].timed_out):
+                ready.append(window.popleft())
+
+            if not ready and window:
+                deadlines = [d for d in running.values() if d is not None]
+                condition.wait(max(min(deadlines) - now, 0) if deadlines
+                               else None)
+            elif not ready and blocked_since is not None and not give_up:
+                condition.wait(blocked_since + timeout - now)
+
+        for result in ready:
+            yield result
+
+###############################################################################
+def get_blocked_since(blocked_since, now, waiting, all_abandoned):
+    """
+        Returns since when calls are waiting for a worker while every worker
+        is held by a timed out call, or None if they are not.
+    """
+    if not (waiting and all_abandoned):
+        return None
+    return blocked_since if blocked_since is not None else now
+
+###############################################################################
+def fan_out_graph(function, items, dependencies=None, max_workers=None,
+                  stop_on_error=True, on_result=None):
+    """
+        Calls function on each item like fan_out() (without timeout) but only
+        once the items it depends on are done without error. dependencies
+        maps an item to the list of items it depends on.
+        Items whose dependencies failed or were not called are not called,
+        nor are items not started yet after a call failed if stop_on_error.
+        Returns once all the calls started are done.
+    """
+    if max_workers is None:
+        max_workers = get_max_workers()
+    dependencies = dependencies or {}
+
+    results = [FanOutResult(item) for item in items]
+    result_of = dict((result.item, result) for result in results)
+    pending = list(results)
+    running = set()
+    condition = threading.Condition()
+    context = get_context()
+
+    def run(result):
+        value = None
+        error = None
+        with execution_context(context):
+            try:
+                value = function(result.item)
+            except (Exception, SystemExit), e:
+                # SystemExit e.g. from a failed server start
+                log_exception(e)
+                error = e
+
+        with condition:
+            result.value = value
+            result.error = error
+            result.done = True
+            condition.notify()
+
+    def is_blocked(dependency):
+        return ((dependency.done and dependency.error is not None) or
+                (not dependency.done and dependency not in running and
+                 dependency not in pending))
+
+    failed = False
+    with condition:
+        while True:
+            for result in [r for r in running if r.done]:
+                running.remove(result)
+                failed = failed or result.error is not None
+                if on_result is not None:
+                    on_result(result)
+
+            for result in list(pending):
+                needed = [result_of[item]
+                          for item in dependencies.get(result.item, [])]
+                if (failed and stop_on_error) or any(map(is_blocked, needed)):
+                    log_verbose("Not calling for '%s'" % result.item)
+                    pending.remove(result)
+                elif (len(running) < max_workers and
+                          all(dependency.done for dependency in needed)):
+                    pending.remove(result)
+                    running.add(result)
+                    thread = threading.Thread(target=run, args=(result,))
+                    thread.daemon = True
+                    thread.start()
+
+            if not running:
+                break
+
+            condition.wait()
+
+    return results
+
+###############################################################################
+def fan_out_first(function, items, timeout=None, max_workers=None):
+    """
+        Calls function on items concurrently and returns an item for which
+        it returns a true value as soon as there is one, or None.
+    """
+    results = fan_out(function, items, timeout=timeout,
+                      max_workers=max_workers,
+                      stop_when=lambda result: result.value)
+
+    for result in results:
+        if result.done and result.value:
+            return result.item
+
+    return None
+
+###############################################################################
+def get_result_status(result):
+    """
+        Returns the status reported by a fan_out() call of get_status(), or a
+        status saying why there is none.
+    """
+    if result.done and result.error is None:
+        return result.value
+    elif result.done:
+        return {"connection": False, "error": "%s" % result.error}
+    else:
+        return {"connection": False, "timedOut": True}
+
+###############################################################################
+def get_member_timeout():
+    return config.get_mongoctl_config_val("memberTimeout",
+                                          DEFAULT_MEMBER_TIMEOUT)
+
+###############################################################################
+def get_max_workers():
+    return config.get_mongoctl_config_val("memberConcurrency",
+                                          DEFAULT_MAX_WORKERS)
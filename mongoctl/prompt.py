@@ -4,48 +4,32 @@ import sys
 import getpass
 
 from errors import MongoctlException
+from context import get_context
 ###############################################################################
-# Global flags and their functions
+# Execution flags and their functions
 ###############################################################################
-__interactive_mode__ = True
-
 def set_interactive_mode(value):
-    global __interactive_mode__
-    __interactive_mode__ = value
+    get_context().interactive_mode = value
 
 ###############################################################################
 def is_interactive_mode():
-    global __interactive_mode__
-    return __interactive_mode__
-
-###############################################################################
-__say_yes_to_everything__ = False
-__say_no_to_everything__ = False
+    return get_context().interactive_mode
 
 ###############################################################################
 def say_yes_to_everything():
-    global __say_yes_to_everything__
-    __say_yes_to_everything__ = True
+    get_context().say_yes_to_everything = True
 
 ###############################################################################
 def is_say_yes_to_everything():
-    global __say_yes_to_everything__
-    return __say_yes_to_everything__
+    return get_context().say_yes_to_everything
 
 ###############################################################################
 def say_no_to_everything():
-    global __say_no_to_everything__
-    __say_no_to_everything__ = True
+    get_context().say_no_to_everything = True
 
 ###############################################################################
 def is_say_no_to_everything():
-    global __say_no_to_everything__
-    return __say_no_to_everything__
-
-###############################################################################
-def is_interactive_mode():
-    global __interactive_mode__
-    return __interactive_mode__
+    return get_context().say_no_to_everything
 
 ###############################################################################
 def read_input(message):
@@ -0,0 +1,168 @@
+__author__ = 'richardxx'
+
+import os
+import socket
+import time
+
+from utils import is_pid_alive
+from errors import MongoctlException
+from mongoctl_logging import log_info, log_verbose, log_exception
+
+###############################################################################
+# CONSTANTS
+###############################################################################
+
+# what mongod/mongos log once they accept connections
+READY_LOG_LINE = "waiting for connections"
+
+# seconds between checks of the log file, the port and the process
+WATCH_INTERVAL = 0.1
+
+# seconds before the first full connection probe and max seconds between them
+FIRST_PROBE_DELAY = 0.25
+MAX_PROBE_DELAY = 4
+
+# seconds a single port check may take
+PORT_CHECK_TIMEOUT = 0.05
+
+# seconds between "waiting" messages
+WAITING_MESSAGE_INTERVAL = 2
+
+###############################################################################
+# LogWatcher Class
+###############################################################################
+class LogWatcher(object):
+    """
+        Reads what gets appended to a log file from the moment the watcher is
+        created (or from the start of the file if it gets replaced, e.g. when
+        mongod rotates the old log on startup) and tells whether a line
+        was seen.
+    """
+
+    ###########################################################################
+    def __init__(self, path, line):
+        self.path = path
+        self.line = line
+        self._inode, self._offset = self._get_file_position()
+        self._tail = ""
+        self.seen = False
+
+    ###########################################################################
+    def check(self):
+        if self.seen:
+            return True
+
+        inode, size = self._get_file_position()
+        if inode is None:
+            return False
+
+        if inode != self._inode or size < self._offset:
+            # a new log file
+            self._inode = inode
+            self._offset = 0
+            self._tail = ""
+
+        if size > self._offset:
+            try:
+                log_file = open(self.path)
+                try:
+                    log_file.seek(self._offset)
+                    data = log_file.read(size - self._offset)
+                finally:
+                    log_file.close()
+            except IOError, e:
+                log_exception(e)
+                return False
+
+            self._offset += len(data)
+            # keep the end of what was read in case the line is split
+            text = self._tail + data
+            self.seen = self.line in text
+            self._tail = text[-len(self.line):]
+
+        return self.seen
+
+    ###########################################################################
+    def _get_file_position(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_ino, stat.st_size
+        except OSError:
+            return None, 0
+
+###############################################################################
+def is_port_listening(host, port, timeout=PORT_CHECK_TIMEOUT):
+    """
+        Returns True if something accepts connections on host:port, without
+        waiting more than timeout seconds.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        return sock.connect_ex((host, int(port))) == 0
+    except (socket.error, socket.timeout):
+        return False
+    finally:
+        sock.close()
+
+###############################################################################
+def new_server_log_watcher(server):
+    """
+        Returns a watcher of the server's log for the line mongod/mongos
+        write once they are ready. Create it before starting the server.
+    """
+    return LogWatcher(server.get_log_file_path(), READY_LOG_LINE)
+
+###############################################################################
+def wait_for_server_ready(server, pid, timeout=None, log_watcher=None):
+    """
+        Waits until the local server started with the given pid accepts
+        connections. That is told by the log watcher seeing the server's
+        "waiting for connections" line or by the server's port accepting
+        connections, both checked every WATCH_INTERVAL, and confirmed by
+        connecting to the server. Connection probes are also made with an
+        exponential backoff in case neither of the former works (e.g. the
+        server logs to syslog or listens on another interface).
+        Returns False if the server is not ready after timeout seconds and
+        raises if the process dies.
+    """
+    if log_watcher is None:
+        log_watcher = new_server_log_watcher(server)
+
+    start_time = time.time()
+    port = server.get_port()
+    probe_delay = FIRST_PROBE_DELAY
+    next_probe = start_time + probe_delay
+    next_message = start_time + WAITING_MESSAGE_INTERVAL
+    signaled = False
+
+    while True:
+        if pid is not None and not is_pid_alive(pid):
+            raise MongoctlException("Could not start the server. Please check"
+                                    " the log file.")
+
+        now = time.time()
+        if not signaled and (log_watcher.check() or
+                             is_port_listening("localhost", port)):
+            log_verbose("Server '%s' looks ready after %.2f second(s)" %
+                        (server.id, now - start_time))
+            signaled = True
+            probe_delay = FIRST_PROBE_DELAY
+            next_probe = now
+
+        if now >= next_probe:
+            if server.is_online():
+                return True
+            probe_delay = min(probe_delay * 2, MAX_PROBE_DELAY)
+            next_probe = now + probe_delay
+
+        elapsed = now - start_time
+        if timeout and elapsed >= timeout:
+            return False
+
+        if now >= next_message:
+            left = "[-%d sec] " % (timeout - elapsed) if timeout else ""
+            log_info("-- waiting %s--" % left)
+            next_message = now + WAITING_MESSAGE_INTERVAL
+
+        time.sleep(WATCH_INTERVAL)
@@ -2,16 +2,23 @@
 
 __author__ = 'abdul'
 
+import os
+import copy
+import threading
+import time
 import pymongo
 import config
 
 from bson import DBRef
+from UserDict import DictMixin
 
 from errors import MongoctlException
+from context import get_context, get_default_context, execution_context
 from mongoctl_logging import log_warning, log_verbose, log_info, log_exception
 from mongo_uri_tools import parse_mongo_uri
 from utils import (
-    resolve_class, document_pretty_string, is_valid_member_address, listify
+    resolve_class, document_pretty_string, is_valid_member_address, listify,
+    is_url
     )
 
 from mongo_version import is_supported_mongo_version, is_valid_version
@@ -29,6 +36,16 @@ DEFAULT_CLUSTERS_COLLECTION = "clusters"
 
 DEFAULT_ACTIVITY_COLLECTION = "logs.server-activity"
 
+# number of cluster documents instantiated at once when streaming clusters
+CLUSTER_BATCH_SIZE = 100
+
+# fields of server documents that server views are made of
+SERVER_VIEW_FIELDS = ["_id", "description", "address", "cmdOptions.port"]
+
+# seconds the hash of the db repository is reused by
+# get_repository_generation() before it is computed again
+DEFAULT_DB_REPOSITORY_HASH_TTL = 1
+
 
 LOOKUP_TYPE_REPLICA_MEMBER = "replicaMembers"
 LOOKUP_TYPE_CONFIG_SVR = "configServers"
@@ -37,8 +54,9 @@ LOOKUP_TYPE_ANY = [LOOKUP_TYPE_CONFIG_SVR, LOOKUP_TYPE_REPLICA_MEMBER,
                    LOOKUP_TYPE_SHARDS]
 
 ###############################################################################
-# Global variable: mongoctl's mongodb object
-__mongoctl_db__ = None
+# Global variable: database uri -> mongoctl's mongodb object
+__mongoctl_dbs__ = {}
+__mongoctl_dbs_lock__ = threading.Lock()
 
 ###############################################################################
 def get_mongoctl_database():
@@ -47,21 +65,24 @@ def get_mongoctl_database():
     if not has_db_repository():
         return
 
-    global __mongoctl_db__
+    db_uri = config.get_database_repository_conf()["databaseURI"]
+
+    with __mongoctl_dbs_lock__:
+        if db_uri not in __mongoctl_dbs__:
+            __mongoctl_dbs__[db_uri] = _connect_mongoctl_database()
 
-    if __mongoctl_db__ is not None:
-        return __mongoctl_db__
+        return __mongoctl_dbs__[db_uri]
 
+###############################################################################
+def _connect_mongoctl_database():
     log_verbose("Connecting to mongoctl db...")
     try:
 
         (conn, dbname) = _db_repo_connect()
-        __mongoctl_db__ = conn[dbname]
-        return __mongoctl_db__
+        return conn[dbname]
 
     except ConnectionFailure, e:
         log_exception(e)
-        __mongoctl_db__ = "OFFLINE"
         log_verbose("\n*************\n"
                     "Will not be using database repository for configurations"
                     " at this time!"
@@ -69,6 +90,7 @@ def get_mongoctl_database():
                     " connection to mongoctl's database repository."
                     "\nCAUSE: %s."
                     "\n*************" % e)
+        return "OFFLINE"
 
 ###############################################################################
 def has_db_repository():
@@ -113,7 +135,6 @@ def lookup_server(server_id):
     server = None
     # lookup server from the db repo first
     if consulting_db_repository():
-        print "\tYes, we can consult db repo."
         server = db_lookup_server(server_id)
 
     # if server is not found then try from file repo
@@ -139,13 +160,18 @@ def lookup_and_validate_server(server_id):
 
 ###############################################################################
 def db_lookup_server(server_id):
-    server_collection = get_mongoctl_server_db_collection()
-    server_doc = server_collection.find_one({"_id": server_id})
+    db_servers = get_context().db_servers
 
-    if server_doc:
-        return new_server(server_doc)
-    else:
-        return None
+    if server_id not in db_servers:
+        server_collection = get_mongoctl_server_db_collection()
+        server_doc = server_collection.find_one({"_id": server_id})
+
+        if server_doc:
+            _db_register_server(server_doc)
+        else:
+            db_servers[server_id] = None
+
+    return db_servers[server_id]
 
 ###############################################################################
 ## Looks up the server from config file
@@ -160,12 +186,11 @@ def lookup_all_servers():
 
     all_servers = {}
 
-    if consulting_db_repository():
-        all_servers = db_lookup_all_servers()
-
     if has_file_repository():
-        file_repo_servers = get_configured_servers()
-        all_servers = dict(file_repo_servers.items() + all_servers.items())
+        all_servers.update(get_configured_servers())
+
+    if consulting_db_repository():
+        all_servers.update(db_lookup_all_servers())
 
     return all_servers.values()
 
@@ -173,7 +198,73 @@ def lookup_all_servers():
 # returns servers saved in the db collection of servers
 def db_lookup_all_servers():
     servers = get_mongoctl_server_db_collection()
-    return new_servers_dict(servers.find())
+    return dict((server.id, server) for server in
+                map(_db_register_server, servers.find()))
+
+###############################################################################
+def lookup_all_server_views():
+    """
+        Returns a ServerView of each server configured in both DB and config
+        file, sorted by id, without instantiating the servers.
+    """
+    return list(iter_server_views())
+
+###############################################################################
+def iter_server_views():
+    """
+        Yields a ServerView of each server configured in both DB and config
+        file, sorted by id. DB servers are streamed from a cursor sorted by
+        the DB so that only one batch of them is in memory at a time.
+    """
+    validate_repositories()
+
+    file_views = []
+    db_views = []
+
+    if has_file_repository():
+        file_views = sorted(config_lookup_all_server_views(),
+                            key=lambda view: view.id)
+
+    if consulting_db_repository():
+        db_views = db_iter_server_views()
+
+    return _merge_by_id(file_views, db_views)
+
+###############################################################################
+def db_iter_server_views():
+    servers = get_mongoctl_server_db_collection()
+    fields = dict((field, 1) for field in SERVER_VIEW_FIELDS)
+    view_type = server_view_type()
+    for server_doc in servers.find({}, fields).sort("_id", pymongo.ASCENDING):
+        yield view_type(server_doc)
+
+###############################################################################
+def config_lookup_all_server_views():
+    # views only read the documents so they do not need copies
+    documents = get_configured_documents().get_server_documents()
+    return map(server_view_type(), documents)
+
+###############################################################################
+def _merge_by_id(file_objects, db_objects):
+    """
+        Merges two iterables of objects sorted by id into one. DB objects
+        replace the file objects with the same id.
+    """
+    file_objects = iter(file_objects)
+    db_objects = iter(db_objects)
+    file_object = next(file_objects, None)
+    db_object = next(db_objects, None)
+
+    while file_object is not None or db_object is not None:
+        if db_object is None or (file_object is not None and
+                                 file_object.id < db_object.id):
+            yield file_object
+            file_object = next(file_objects, None)
+        else:
+            if file_object is not None and file_object.id == db_object.id:
+                file_object = next(file_objects, None)
+            yield db_object
+            db_object = next(db_objects, None)
 
 ###############################################################################
 # Cluster lookup functions
@@ -212,13 +303,18 @@ def config_lookup_cluster(cluster_id):
 
 ###############################################################################
 def db_lookup_cluster(cluster_id):
-    cluster_collection = get_mongoctl_cluster_db_collection()
-    cluster_doc = cluster_collection.find_one({"_id": cluster_id})
+    db_clusters = get_context().db_clusters
 
-    if cluster_doc is not None:
-        return new_cluster(cluster_doc)
-    else:
-        return None
+    if cluster_id not in db_clusters:
+        cluster_collection = get_mongoctl_cluster_db_collection()
+        cluster_doc = cluster_collection.find_one({"_id": cluster_id})
+
+        if cluster_doc is not None:
+            _db_register_clusters([cluster_doc])
+        else:
+            db_clusters[cluster_id] = None
+
+    return db_clusters[cluster_id]
 
 ###############################################################################
 # returns all clusters configured in both DB and config file
@@ -226,12 +322,11 @@ def lookup_all_clusters():
     validate_repositories()
     all_clusters = {}
 
-    if consulting_db_repository():
-        all_clusters = db_lookup_all_clusters()
-
     if has_file_repository():
-        all_clusters = dict(get_configured_clusters().items() +
-                            all_clusters.items())
+        all_clusters.update(get_configured_clusters())
+
+    if consulting_db_repository():
+        all_clusters.update(db_lookup_all_clusters())
 
     return all_clusters.values()
 
@@ -239,7 +334,46 @@ def lookup_all_clusters():
 # returns a dictionary of (cluster_id, cluster) looked up from DB
 def db_lookup_all_clusters():
     clusters = get_mongoctl_cluster_db_collection()
-    return new_replicaset_clusters_dict(clusters.find())
+    return dict((cluster.id, cluster) for cluster in
+                _db_register_clusters(list(clusters.find())))
+
+###############################################################################
+def iter_clusters():
+    """
+        Yields the clusters configured in both DB and config file, sorted by
+        id. DB clusters are streamed from a cursor sorted by the DB and
+        instantiated, with the servers and shard clusters they reference,
+        CLUSTER_BATCH_SIZE at a time.
+    """
+    validate_repositories()
+
+    file_clusters = []
+    db_clusters = []
+
+    if has_file_repository():
+        file_clusters = sorted(get_configured_clusters().values(),
+                               key=lambda cluster: cluster.id)
+
+    if consulting_db_repository():
+        db_clusters = db_iter_clusters()
+
+    return _merge_by_id(file_clusters, db_clusters)
+
+###############################################################################
+def db_iter_clusters():
+    clusters = get_mongoctl_cluster_db_collection()
+    cursor = clusters.find().sort("_id", pymongo.ASCENDING)
+
+    batch = []
+    for cluster_doc in cursor:
+        batch.append(cluster_doc)
+        if len(batch) == CLUSTER_BATCH_SIZE:
+            for cluster in _db_register_clusters(batch):
+                yield cluster
+            batch = []
+
+    for cluster in _db_register_clusters(batch):
+        yield cluster
 
 ###############################################################################
 # Lookup by server id
@@ -258,7 +392,7 @@ def db_lookup_cluster_by_server(server, lookup_type=LOOKUP_TYPE_ANY):
     cluster_doc = cluster_collection.find_one(query)
 
     if cluster_doc is not None:
-        return new_cluster(cluster_doc)
+        return _db_register_clusters([cluster_doc])[0]
     else:
         return None
 
@@ -275,38 +409,116 @@ def db_lookup_cluster_by_shard(shard):
     cluster_doc = cluster_collection.find_one(query)
 
     if cluster_doc is not None:
-        return new_cluster(cluster_doc)
+        return _db_register_clusters([cluster_doc])[0]
     else:
         return None
 
+###############################################################################
+# DB repository identity map
+###############################################################################
+def _db_register_server(server_doc):
+    """
+        Returns the server of the current execution for the given document,
+        instantiating it the first time.
+    """
+    db_servers = get_context().db_servers
+    server = db_servers.get(server_doc["_id"])
+    if server is None:
+        server = new_server(server_doc)
+        db_servers[server.id] = server
+    return server
+
+###############################################################################
+def _db_register_clusters(cluster_docs):
+    """
+        Returns the clusters of the current execution for the given
+        documents, instantiating them the first time. The servers and shard
+        clusters they reference are prefetched.
+    """
+    db_clusters = get_context().db_clusters
+    clusters = []
+    for cluster_doc in cluster_docs:
+        cluster = db_clusters.get(cluster_doc["_id"])
+        if cluster is None:
+            cluster = new_cluster(cluster_doc)
+            db_clusters[cluster.id] = cluster
+        clusters.append(cluster)
+
+    db_prefetch_cluster_references(cluster_docs)
+    return clusters
+
+###############################################################################
+def db_prefetch_cluster_references(cluster_docs):
+    """
+        Fetches all servers and shard clusters referenced by the given
+        cluster documents that have not been fetched yet, with a single $in
+        query for the shard clusters and one for all the servers.
+    """
+    context = get_context()
+
+    shard_cluster_ids = [cluster_id for cluster_id in
+                         _referenced_ids(cluster_docs, "cluster")
+                         if cluster_id not in context.db_clusters]
+    if shard_cluster_ids:
+        cluster_collection = get_mongoctl_cluster_db_collection()
+        shard_cluster_docs = list(cluster_collection.find(
+            {"_id": {"$in": shard_cluster_ids}}))
+
+        for cluster_doc in shard_cluster_docs:
+            if cluster_doc["_id"] not in context.db_clusters:
+                context.db_clusters[cluster_doc["_id"]] = \
+                    new_cluster(cluster_doc)
+        for cluster_id in shard_cluster_ids:
+            context.db_clusters.setdefault(cluster_id, None)
+
+        # fetch the servers of the shard clusters along with the others
+        cluster_docs = list(cluster_docs) + shard_cluster_docs
+
+    server_ids = [server_id for server_id in
+                  _referenced_ids(cluster_docs, "server")
+                  if server_id not in context.db_servers]
+    if server_ids:
+        server_collection = get_mongoctl_server_db_collection()
+        for server_doc in server_collection.find({"_id": {"$in": server_ids}}):
+            _db_register_server(server_doc)
+        for server_id in server_ids:
+            context.db_servers.setdefault(server_id, None)
+
+###############################################################################
+def _referenced_ids(cluster_docs, ref_property):
+    ids = []
+    for cluster_doc in cluster_docs:
+        for member_list in ["members", "configServers", "shards"]:
+            for member_doc in cluster_doc.get(member_list) or []:
+                ref = member_doc.get(ref_property)
+                if isinstance(ref, DBRef) and ref.id not in ids:
+                    ids.append(ref.id)
+    return ids
+
 
 
 ###############################################################################
 def config_lookup_cluster_by_server(server, lookup_type=LOOKUP_TYPE_ANY):
-    clusters = get_configured_clusters()
+    cluster_index = get_configured_cluster_index()
     lookup_type = listify(lookup_type)
 
     for t in lookup_type:
-        result = None
-        if t == LOOKUP_TYPE_REPLICA_MEMBER:
-            result = filter(lambda c: c.has_member_server(server),
-                            clusters.values())
-        elif t == LOOKUP_TYPE_CONFIG_SVR:
-            result = filter(lambda c: cluster_has_config_server(c, server),
-                            clusters.values())
-        elif t == LOOKUP_TYPE_SHARDS:
-            result = filter(lambda c: cluster_has_shard(c, server),
-                            clusters.values())
-        if result:
-            return result[0]
+        cluster_ids = cluster_index.get(t, {}).get(server.id)
+        if cluster_ids:
+            return get_configured_clusters().get(cluster_ids[0])
 
 ###############################################################################
 def config_lookup_cluster_by_shard(shard):
-    clusters = get_configured_clusters()
+    from objects.server import Server
+    cluster_index = get_configured_cluster_index()
+
+    if isinstance(shard, Server):
+        cluster_ids = cluster_index[LOOKUP_TYPE_SHARDS].get(shard.id)
+    else:
+        cluster_ids = cluster_index[_INDEX_SHARD_CLUSTERS].get(shard.id)
 
-    result = filter(lambda c: cluster_has_shard(c, shard), clusters.values())
-    if result:
-        return result[0]
+    if cluster_ids:
+        return get_configured_clusters().get(cluster_ids[0])
 
 ###############################################################################
 def cluster_has_config_server(cluster, server):
@@ -331,59 +543,517 @@ def cluster_has_shard(cluster, shard):
                 return cluster
 
 ###############################################################################
-# Global variable: lazy loaded map that holds servers read from config file
-__configured_servers__ = None
+# ConfiguredFile Class
+###############################################################################
+class ConfiguredFile(object):
+    """
+        The documents read from a servers/clusters config file and the
+        inode/mtime/size of the file when it was read. A file that could not
+        be read keeps the error, raised when its documents are needed.
+    """
+
+    ###########################################################################
+    def __init__(self, name, stat, documents=None, error=None,
+                 changed_ids=None):
+        self.name = name
+        self.stat = stat
+        self.documents = documents or []
+        self.by_id = dict((document.get("_id"), document)
+                          for document in self.documents)
+        self.error = error
+        # ids of the documents added, changed or removed since the previous
+        # read of the file (None for the first read)
+        self.changed_ids = changed_ids
+
+    ###########################################################################
+    def get_documents(self):
+        if self.error is not None:
+            raise self.error
+        return self.documents
+
+###############################################################################
+# ConfiguredDocuments Class
+###############################################################################
+class ConfiguredDocuments(object):
+    """
+        A snapshot of the servers and clusters config files of a config root.
+        Snapshots are not modified: a reload makes a new one, sharing the
+        files and documents that did not change, and it replaces the current
+        one at once.
+    """
+
+    ###########################################################################
+    def __init__(self, servers_file, clusters_file, version=1,
+                 cluster_index=None):
+        self.servers_file = servers_file
+        self.clusters_file = clusters_file
+        self.version = version
+        self._cluster_index = cluster_index
+        self._lock = threading.Lock()
+
+    ###########################################################################
+    def get_server_documents(self):
+        return self.servers_file.get_documents()
+
+    ###########################################################################
+    def get_cluster_documents(self):
+        return self.clusters_file.get_documents()
+
+    ###########################################################################
+    def get_cluster_index(self):
+        with self._lock:
+            if self._cluster_index is None:
+                self._cluster_index = _build_cluster_index(
+                    self.get_cluster_documents())
+            return self._cluster_index
+
+###############################################################################
+# ConfiguredObjects Class
+###############################################################################
+class ConfiguredObjects(DictMixin):
+    """
+        The server or cluster objects of an execution by id, for the
+        documents of the first of the given config files read. Each object
+        is built from a copy of its document the first time it is looked up
+        so that executions only pay for the objects they use.
+    """
+
+    ###########################################################################
+    def __init__(self, configured_files, new_object, is_unchanged,
+                 previous=None):
+        self.configured_files = configured_files
+        self._configured_file = configured_files[0]
+        self._new_object = new_object
+        self._is_unchanged = is_unchanged
+        self._objects = {}
+        self._lock = threading.RLock()
+
+        # objects built by the execution from previous reads of the files
+        if previous is not None:
+            self._previous_files = previous.configured_files
+            self._previous_objects = dict(previous._objects)
+        else:
+            self._previous_files = None
+            self._previous_objects = {}
+
+    ###########################################################################
+    def __getitem__(self, object_id):
+        obj = self.get(object_id)
+        if obj is None:
+            raise KeyError(object_id)
+        return obj
+
+    ###########################################################################
+    def __contains__(self, object_id):
+        self._configured_file.get_documents()
+        return object_id in self._configured_file.by_id
+
+    ###########################################################################
+    def __iter__(self):
+        return iter(self.keys())
+
+    ###########################################################################
+    def keys(self):
+        return [document.get("_id")
+                for document in self._configured_file.get_documents()]
+
+    ###########################################################################
+    def get(self, object_id, default=None):
+        if object_id not in self:
+            return default
+
+        with self._lock:
+            obj = self._objects.get(object_id)
+            if obj is None:
+                obj = self._previous_objects.get(object_id)
+                if obj is None or not self._is_unchanged(
+                        object_id, self._previous_files,
+                        self.configured_files):
+                    document = self._configured_file.by_id[object_id]
+                    obj = self._new_object(copy.deepcopy(document))
+                self._objects[object_id] = obj
+
+        return obj
+
+###############################################################################
+# Global variables: config root -> the current snapshot of the servers/clusters
+# config files, loaded the first time they are needed and replaced by
+# reload_configured_documents(). Every execution context builds its own
+# server/cluster objects from copies of the documents, as they are looked up
+__configured_documents__ = {}
+__configured_docs_lock__ = threading.Lock()
 
 ###############################################################################
 def get_configured_servers():
+    documents = get_configured_documents()
+    return _get_configured_objects(get_context().configured_servers,
+                                   (documents.servers_file,),
+                                   new_server, _is_server_unchanged)
 
-    global __configured_servers__
+###############################################################################
+def get_configured_clusters():
+    # clusters hold on to the objects of their servers and shard clusters
+    # so they also depend on the servers config file
+    documents = get_configured_documents()
+    return _get_configured_objects(get_context().configured_clusters,
+                                   (documents.clusters_file,
+                                    documents.servers_file),
+                                   new_cluster, _is_cluster_unchanged)
 
-    if __configured_servers__ is None:
-        __configured_servers__ = {}
+###############################################################################
+def _get_configured_objects(context_objects, configured_files, new_object,
+                            is_unchanged):
+    """
+        Returns the ConfiguredObjects of the current execution for the
+        documents of the first of the given config files read. Objects built
+        from previous reads of the files are reused for the documents that
+        is_unchanged(id, previous files, files) tells did not change.
+    """
+    config_root = config.get_config_root()
+
+    objects = context_objects.get(config_root)
+    if objects is None or objects.configured_files != configured_files:
+        objects = ConfiguredObjects(configured_files, new_object,
+                                    is_unchanged, previous=objects)
+        context_objects[config_root] = objects
+
+    return objects
 
-        file_repo_conf = config.get_file_repository_conf()
-        servers_path_or_url = file_repo_conf.get("servers",
-                                                 DEFAULT_SERVERS_FILE)
+###############################################################################
+def _is_server_unchanged(server_id, previous_files, configured_files):
+    # unchanged documents are shared by the reads
+    document = configured_files[0].by_id.get(server_id)
+    return (document is not None and
+            previous_files[0].by_id.get(server_id) is document)
 
-        server_documents = config.read_config_json("servers",
-                                                   servers_path_or_url)
-        if not isinstance(server_documents, list):
-            raise MongoctlException("Server list in '%s' must be an array" %
-                                    servers_path_or_url)
-        for document in server_documents:
-            server = new_server(document)
-            __configured_servers__[server.id] = server
+###############################################################################
+def _is_cluster_unchanged(cluster_id, previous_files, configured_files,
+                          visited=None):
+    """
+        Tells if neither the document of the cluster nor the documents of the
+        servers and shard clusters it references changed.
+    """
+    visited = visited or set()
+    if cluster_id in visited:
+        return True
+    visited.add(cluster_id)
+
+    previous_clusters_file, previous_servers_file = previous_files
+    clusters_file, servers_file = configured_files
+    document = clusters_file.by_id.get(cluster_id)
+    if (document is None or
+            previous_clusters_file.by_id.get(cluster_id) is not document):
+        return False
+
+    for server_id in _referenced_ids([document], "server"):
+        if (previous_servers_file.by_id.get(server_id) is not
+                servers_file.by_id.get(server_id)):
+            return False
+
+    for shard_cluster_id in _referenced_ids([document], "cluster"):
+        if not _is_cluster_unchanged(shard_cluster_id, previous_files,
+                                     configured_files, visited=visited):
+            return False
+
+    return True
 
-    return __configured_servers__
+###############################################################################
+def get_configured_documents():
+    """
+        Returns the snapshot of the config files of the current execution:
+        the one that was current when the execution first needed it, so that
+        it does not see a reload half way. Outside of executions (the default
+        context) it is always the current one.
+    """
+    config_root = config.get_config_root()
+    context = get_context()
+
+    documents = context.configured_documents.get(config_root)
+    if documents is None or context is get_default_context():
+        documents = _get_current_configured_documents(config_root)
+        context.configured_documents[config_root] = documents
+
+    return documents
 
+###############################################################################
+def _get_current_configured_documents(config_root):
+    with __configured_docs_lock__:
+        documents = __configured_documents__.get(config_root)
+        if documents is None:
+            documents = ConfiguredDocuments(
+                _read_configured_file("servers", DEFAULT_SERVERS_FILE,
+                                      "Server"),
+                _read_configured_file("clusters", DEFAULT_CLUSTERS_FILE,
+                                      "Cluster"))
+            __configured_documents__[config_root] = documents
+
+        return documents
 
 ###############################################################################
-# Global variable: lazy loaded map that holds clusters read from config file
-__configured_clusters__ = None
+def reload_configured_documents():
+    """
+        Reads again the servers/clusters config files of the current config
+        root that changed since they were last read (as told by their inode,
+        mtime and size) and makes a new current snapshot of them. The
+        documents that did not change are shared with the previous snapshot
+        so that only the objects of the changed ones get rebuilt.
+        Executions started before keep their snapshot.
+        Returns the current snapshot, None if none was loaded yet.
+    """
+    config_root = config.get_config_root()
+
+    with __configured_docs_lock__:
+        current = __configured_documents__.get(config_root)
+        if current is None:
+            return None
+
+        servers_file = _read_configured_file("servers", DEFAULT_SERVERS_FILE,
+                                             "Server",
+                                             previous=current.servers_file)
+        clusters_file = _read_configured_file("clusters",
+                                              DEFAULT_CLUSTERS_FILE,
+                                              "Cluster",
+                                              previous=current.clusters_file)
+
+        if (servers_file is current.servers_file and
+                clusters_file is current.clusters_file):
+            return current
+
+        cluster_index = None
+        if clusters_file is current.clusters_file:
+            cluster_index = current._cluster_index
+
+        reloaded = ConfiguredDocuments(servers_file, clusters_file,
+                                       version=current.version + 1,
+                                       cluster_index=cluster_index)
+        __configured_documents__[config_root] = reloaded
+
+    for configured_file in [servers_file, clusters_file]:
+        if configured_file.changed_ids is not None:
+            log_verbose("Reloaded %s configuration: %s document(s) changed" %
+                        (configured_file.name,
+                         len(configured_file.changed_ids)))
+
+    return reloaded
 
 ###############################################################################
-def get_configured_clusters():
+def reload_all_configured_documents():
+    """
+        Calls reload_configured_documents() for every config root loaded so
+        far, e.g. periodically from a long running service.
+    """
+    with __configured_docs_lock__:
+        config_roots = __configured_documents__.keys()
+
+    for config_root in config_roots:
+        with execution_context() as context:
+            context.config_root = config_root
+            try:
+                reload_configured_documents()
+            except Exception, e:
+                log_exception(e)
 
-    global __configured_clusters__
+###############################################################################
+def _read_configured_file(name, default_file, type_name, previous=None):
+    """
+        Reads a servers/clusters config file, unless it did not change since
+        the previous read (then previous is returned). Documents equal to
+        those of the previous read are replaced by them.
+    """
+    file_repo_conf = config.get_file_repository_conf()
+    path_or_url = file_repo_conf.get(name, default_file)
+    stat = _get_config_file_stat(path_or_url)
+
+    if previous is not None and (stat is None or stat == previous.stat):
+        # unchanged, or served by URL and changes cannot be told
+        return previous
 
-    if __configured_clusters__ is None:
-        __configured_clusters__ = {}
+    try:
+        documents = config.read_config_json(name, path_or_url)
+        if not isinstance(documents, list):
+            raise MongoctlException("%s list in '%s' must be an array" %
+                                    (type_name, path_or_url))
+    except MongoctlException, e:
+        return ConfiguredFile(name, stat, error=e)
+
+    if previous is None:
+        return ConfiguredFile(name, stat, documents)
+
+    changed_ids = set()
+    for i, document in enumerate(documents):
+        previous_document = previous.by_id.get(document.get("_id"))
+        if previous_document == document:
+            documents[i] = previous_document
+        else:
+            changed_ids.add(document.get("_id"))
+
+    new_ids = set(document.get("_id") for document in documents)
+    changed_ids.update(doc_id for doc_id in previous.by_id
+                       if doc_id not in new_ids)
+
+    return ConfiguredFile(name, stat, documents, changed_ids=changed_ids)
 
-        file_repo_conf = config.get_file_repository_conf()
-        clusters_path_or_url = file_repo_conf.get("clusters",
-                                                  DEFAULT_CLUSTERS_FILE)
+###############################################################################
+def _get_config_file_stat(path_or_url):
+    """
+        Returns (inode, mtime, size) of the config file, None if it is
+        served by URL and (None, None, None) if it is missing.
+    """
+    path = config.to_full_config_path(path_or_url)
+    if is_url(path):
+        return None
+    try:
+        stat = os.stat(path)
+        return stat.st_ino, stat.st_mtime, stat.st_size
+    except OSError:
+        return None, None, None
 
-        cluster_documents = config.read_config_json("clusters",
-                                                    clusters_path_or_url)
-        if not isinstance(cluster_documents, list):
-            raise MongoctlException("Cluster list in '%s' must be an array" %
-                                    clusters_path_or_url)
-        for document in cluster_documents:
-            cluster = new_cluster(document)
-            __configured_clusters__[cluster.id] = cluster
+###############################################################################
+def get_configured_cluster_index():
+    """
+        Returns reverse indexes of the configured clusters, built once per
+        read of the clusters config file:
+        lookup type -> server id -> ids of the clusters having the server in
+        that role, and shard cluster id -> ids of the sharded clusters having
+        it as a shard.
+    """
+    return get_configured_documents().get_cluster_index()
 
-    return __configured_clusters__
+###############################################################################
+# index key of sharded clusters by the id of their shard clusters
+_INDEX_SHARD_CLUSTERS = "shardClusters"
+
+###############################################################################
+def _build_cluster_index(cluster_documents):
+    cluster_index = {
+        LOOKUP_TYPE_REPLICA_MEMBER: {},
+        LOOKUP_TYPE_CONFIG_SVR: {},
+        LOOKUP_TYPE_SHARDS: {},
+        _INDEX_SHARD_CLUSTERS: {}
+    }
+
+    def add_to_index(index_key, ref_id, cluster_id):
+        cluster_ids = cluster_index[index_key].setdefault(ref_id, [])
+        if cluster_id not in cluster_ids:
+            cluster_ids.append(cluster_id)
+
+    for document in cluster_documents:
+        cluster_id = document.get("_id")
+
+        # members are referenced by server or built from their host address
+        for member_doc in document.get("members") or []:
+            server_ref = member_doc.get("server")
+            if isinstance(server_ref, DBRef):
+                add_to_index(LOOKUP_TYPE_REPLICA_MEMBER, server_ref.id,
+                             cluster_id)
+            elif server_ref is None and member_doc.get("host"):
+                add_to_index(LOOKUP_TYPE_REPLICA_MEMBER, member_doc["host"],
+                             cluster_id)
+
+        for member_doc in document.get("configServers") or []:
+            server_ref = member_doc.get("server")
+            if isinstance(server_ref, DBRef):
+                add_to_index(LOOKUP_TYPE_CONFIG_SVR, server_ref.id,
+                             cluster_id)
+
+        for shard_doc in document.get("shards") or []:
+            server_ref = shard_doc.get("server")
+            if isinstance(server_ref, DBRef):
+                add_to_index(LOOKUP_TYPE_SHARDS, server_ref.id, cluster_id)
+            cluster_ref = shard_doc.get("cluster")
+            if isinstance(cluster_ref, DBRef):
+                add_to_index(_INDEX_SHARD_CLUSTERS, cluster_ref.id,
+                             cluster_id)
+
+    return cluster_index
+
+###############################################################################
+def _clear_configured_documents(config_root):
+    with __configured_docs_lock__:
+        __configured_documents__.pop(config_root, None)
+
+    context = get_context()
+    context.configured_documents.pop(config_root, None)
+    context.configured_servers.pop(config_root, None)
+    context.configured_clusters.pop(config_root, None)
+    context.db_servers.clear()
+    context.db_clusters.clear()
+
+###############################################################################
+def refresh_repository():
+    """
+        Reloads the servers/clusters config files that changed and moves the
+        current execution over to them, dropping the servers/clusters it
+        fetched from the db repository.
+    """
+    config_root = config.get_config_root()
+    reload_configured_documents()
+    context = get_context()
+    context.configured_documents.pop(config_root, None)
+    context.db_servers.clear()
+    context.db_clusters.clear()
+
+###############################################################################
+# Global variable: database uri -> (time hashed, hash of the servers and
+# clusters collections)
+__db_repository_hashes__ = {}
+__db_repository_hashes_lock__ = threading.Lock()
+
+###############################################################################
+def get_repository_generation():
+    """
+        Returns a token that changes whenever the server or cluster documents
+        seen by the current execution change: the version of its snapshot of
+        the config files and the hash of the servers and clusters
+        collections of the db repository, computed at most once per
+        "dbRepositoryHashTTL" seconds.
+        Returns None if changes cannot be detected.
+        Nothing is reloaded: the config watcher of a service or
+        refresh_repository() do that.
+    """
+    generation = []
+
+    if has_file_repository():
+        generation.append(get_configured_documents().version)
+
+    if consulting_db_repository():
+        db_hash = get_db_repository_hash()
+        if db_hash is None:
+            return None
+        generation.append(db_hash)
+
+    return tuple(generation)
+
+###############################################################################
+def get_db_repository_hash():
+    """
+        Returns the hash of the servers and clusters collections of the db
+        repository (dbHash reads them all) or None if it cannot be computed.
+        A hash computed less than "dbRepositoryHashTTL" seconds ago is
+        reused.
+    """
+    db_uri = config.get_database_repository_conf()["databaseURI"]
+    ttl = config.get_mongoctl_config_val("dbRepositoryHashTTL",
+                                         DEFAULT_DB_REPOSITORY_HASH_TTL)
+
+    # one dbHash at a time, the others wait for it
+    with __db_repository_hashes_lock__:
+        hashed_at, db_hash = __db_repository_hashes__.get(db_uri,
+                                                          (None, None))
+        if hashed_at is not None and time.time() - hashed_at < ttl:
+            return db_hash
+
+        try:
+            result = get_mongoctl_database().command(
+                "dbHash",
+                collections=[get_mongoctl_server_db_collection().name,
+                             get_mongoctl_cluster_db_collection().name])
+        except Exception, e:
+            log_verbose("Unable to hash mongoctl db repository: %s" % e)
+            return None
+
+        __db_repository_hashes__[db_uri] = (time.time(), result["md5"])
+        return result["md5"]
 
 ###############################################################################
 def validate_cluster(cluster):
@@ -520,6 +1190,10 @@ def new_server(server_doc):
     clazz = resolve_class(server_type)
     return clazz(server_doc)
 
+###############################################################################
+def new_server_view(server_doc):
+    return server_view_type()(server_doc)
+
 ###############################################################################
 def build_server_from_address(address):
     if not is_valid_member_address(address):
@@ -631,5 +1305,9 @@ def replicaset_cluster_type():
     return resolve_class("mongoctl.objects.replicaset_cluster."
                          "ReplicaSetCluster")
 
+def server_view_type():
+    return resolve_class("mongoctl.objects.server_view.ServerView")
+
+###############################################################################
 def sharded_cluster_type():
     return resolve_class("mongoctl.objects.sharded_cluster.ShardedCluster")
\ No newline at end of file
@@ -0,0 +1,215 @@
+# The MIT License
+
+# Copyright (c) 2012 ObjectLabs Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+
+__author__ = 'richardxx'
+
+import unittest
+import bz2
+import gzip
+import logging
+import os
+import shutil
+import stat
+import sys
+import tempfile
+
+from argparse import Namespace
+
+from mongoctl import archive, mongoctl_logging
+from mongoctl.commands.common import dump, restore
+from mongoctl.errors import MongoctlException
+
+###############################################################################
+# Constants
+###############################################################################
+# bytes the stand-in mongodump writes
+DUMP_SIZE = 4 * 1024 * 1024
+
+# a mongodump that writes DUMP_SIZE bytes of an archive to stdout, or fails
+# when dumping database "broken"
+STANDIN_MONGODUMP = """#!%s
+import sys
+if "broken" in sys.argv:
+    sys.stdout.write("partial")
+    sys.exit(3)
+assert "--archive" in sys.argv
+line = "".join(chr(ord("a") + i %% 26) for i in range(1023)) + "\\n"
+for i in range(%s / 1024):
+    sys.stdout.write(line)
+"""
+
+# a mongorestore that copies what it reads from stdin to <its dir>/restored
+STANDIN_MONGORESTORE = """#!%s
+import os, shutil, sys
+assert "--archive" in sys.argv
+restored = open(os.path.join(os.path.dirname(sys.argv[0]), "restored"), "wb")
+shutil.copyfileobj(sys.stdin, restored)
+restored.close()
+"""
+
+###############################################################################
+# Archive tests
+###############################################################################
+class ArchiveTest(unittest.TestCase):
+
+    ###########################################################################
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.bin_dir = os.path.join(self.temp_dir, "bin")
+        os.mkdir(self.bin_dir)
+        mongodump = self.write_script("mongodump", STANDIN_MONGODUMP %
+                                      (sys.executable, DUMP_SIZE))
+        mongorestore = self.write_script("mongorestore",
+                                         STANDIN_MONGORESTORE %
+                                         sys.executable)
+
+        self._saved_functions = (dump.get_mongo_dump_executable,
+                                 restore.get_mongo_restore_executable)
+        dump.get_mongo_dump_executable = lambda version: mongodump
+        restore.get_mongo_restore_executable = lambda version: mongorestore
+
+    ###########################################################################
+    def tearDown(self):
+        (dump.get_mongo_dump_executable,
+         restore.get_mongo_restore_executable) = self._saved_functions
+        shutil.rmtree(self.temp_dir)
+
+    ###########################################################################
+    def write_script(self, name, content):
+        path = os.path.join(self.bin_dir, name)
+        script = open(path, "w")
+        script.write(content)
+        script.close()
+        os.chmod(path, stat.S_IRWXU)
+        return path
+
+    ###########################################################################
+    def dump_archive(self, name, database=None, **options):
+        path = os.path.join(self.temp_dir, name)
+        options["archive"] = path
+        dump.do_mongo_dump(host="localhost", port=27017, database=database,
+                           server_version="3.2.0", dump_options=options)
+        return path
+
+    ###########################################################################
+    def restore_archive(self, path, **options):
+        options["archive"] = True
+        restore.do_mongo_restore(path, host="localhost", port=27017,
+                                 server_version="3.2.0",
+                                 restore_options=options)
+        restored = open(os.path.join(self.bin_dir, "restored"), "rb")
+        try:
+            return restored.read()
+        finally:
+            restored.close()
+
+    ###########################################################################
+    def test_gzip_archive(self):
+        path = self.dump_archive("dump.archive.gz")
+
+        # only the compressed archive was written
+        self.assertEquals(sorted(os.listdir(self.temp_dir)),
+                          ["bin", "dump.archive.gz"])
+        self.assertTrue(os.path.getsize(path) < DUMP_SIZE / 10)
+        data = gzip.open(path).read()
+        self.assertEquals(len(data), DUMP_SIZE)
+
+        self.assertEquals(self.restore_archive(path), data)
+
+    ###########################################################################
+    def test_compressions(self):
+        path = self.dump_archive("dump.archive", compression="bz2")
+        data = bz2.BZ2File(path).read()
+        self.assertEquals(len(data), DUMP_SIZE)
+        self.assertEquals(self.restore_archive(path, compression="bz2"),
+                          data)
+
+        path = self.dump_archive("dump.bz2")
+        self.assertEquals(bz2.BZ2File(path).read(), data)
+        self.assertEquals(self.restore_archive(path), data)
+
+        path = self.dump_archive("dump.raw", compression="none")
+        self.assertEquals(os.path.getsize(path), DUMP_SIZE)
+        self.assertEquals(self.restore_archive(path, compression="none"),
+                          data)
+
+        self.assertRaises(MongoctlException, self.dump_archive, "dump.lz",
+                          compression="lz")
+
+    ###########################################################################
+    def test_failed_dump(self):
+        self.assertRaises(MongoctlException, self.dump_archive,
+                          "broken.archive.gz", database="broken")
+        # no partial archive is left behind
+        self.assertEquals(os.listdir(self.temp_dir), ["bin"])
+
+    ###########################################################################
+    def test_unsupported(self):
+        path = os.path.join(self.temp_dir, "dump.archive.gz")
+        self.assertRaises(MongoctlException, dump.do_mongo_dump,
+                          host="localhost", server_version="3.0.0",
+                          dump_options={"archive": path})
+        self.assertRaises(MongoctlException, dump.do_mongo_dump,
+                          host="localhost", server_version="3.2.0",
+                          dump_options={"archive": path, "out": "dump"})
+        self.assertRaises(MongoctlException, dump.mongo_parallel_dump_server,
+                          None, dump_options={"archive": path}, parallel=2)
+
+    ###########################################################################
+    def test_guess_compression(self):
+        self.assertEquals(archive.guess_compression("a.gz").name, "gzip")
+        self.assertEquals(archive.guess_compression("a.bz2").name, "bz2")
+        self.assertEquals(archive.guess_compression("a").name,
+                          archive.DEFAULT_COMPRESSION)
+
+    ###########################################################################
+    def test_stdout_archive_logs_to_stderr(self):
+        handler = logging.StreamHandler(sys.stdout)
+        logging.getLogger().addHandler(handler)
+        saved_dump_db_address = dump.mongo_dump_db_address
+        log_streams = []
+
+        def failing_dump_db_address(*args, **kwargs):
+            log_streams.append((mongoctl_logging._log_stream, handler.stream))
+            raise MongoctlException("dump failed")
+
+        options = Namespace(target="mongodb://localhost:27017/test",
+                            archive="-", username=None, password=None,
+                            useBestSecondary=False)
+        dump.mongo_dump_db_address = failing_dump_db_address
+        try:
+            self.assertRaises(MongoctlException, dump.dump_command, options)
+        finally:
+            dump.mongo_dump_db_address = saved_dump_db_address
+            logging.getLogger().removeHandler(handler)
+
+        # logs go to stderr during the dump only
+        self.assertEquals(log_streams, [(sys.stderr, sys.stderr)])
+        self.assertTrue(mongoctl_logging._log_stream is sys.stdout)
+        self.assertTrue(handler.stream is sys.stdout)
+
+# booty
+if __name__ == '__main__':
+    unittest.main()
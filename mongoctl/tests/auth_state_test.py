@@ -0,0 +1,187 @@
+# The MIT License
+
+# Copyright (c) 2012 ObjectLabs Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+__author__ = 'richardxx'
+
+import unittest
+
+from pymongo.errors import OperationFailure
+
+from mongoctl import connection_pool
+from mongoctl.connection_pool import ConnectionPool
+from mongoctl.errors import MongoctlException
+from mongoctl.objects.server import Server
+
+###############################################################################
+# Constants
+###############################################################################
+NUM_SERVERS = 100
+
+###############################################################################
+class StandInDatabase(object):
+
+    ###########################################################################
+    def __init__(self, client, name):
+        self.connection = client
+        self.name = name
+
+    ###########################################################################
+    def command(self, cmd, **kwargs):
+        self.connection.wire_commands.append(cmd.keys()[0])
+        self.connection.check_auth(self.name, cmd.keys()[0])
+        return {"host": self.connection.address, "connections": {},
+                "version": "2.4.6", "ok": 1}
+
+    ###########################################################################
+    def collection_names(self):
+        self.connection.wire_commands.append("listCollections")
+        self.connection.check_auth(self.name, "listCollections")
+        return []
+
+    ###########################################################################
+    def authenticate(self, username, password):
+        # like pymongo, credentials already cached on the client are not sent
+        # again
+        if self.connection.authenticated:
+            return True
+        self.connection.wire_commands.append("authenticate")
+        if (username, password) != ("admin", "secret"):
+            raise OperationFailure("auth failed")
+        self.connection.authenticated = True
+        return True
+
+###############################################################################
+class StandInClient(object):
+    """
+        Stands in for a MongoClient and records the commands it sends.
+    """
+
+    ###########################################################################
+    def __init__(self, address, wire_commands):
+        if address.startswith("down"):
+            raise IOError("connection refused")
+        self.address = address
+        self.auth = address.startswith("auth")
+        self.authenticated = False
+        self.wire_commands = wire_commands
+
+    ###########################################################################
+    def __getitem__(self, name):
+        return StandInDatabase(self, name)
+
+    ###########################################################################
+    def check_auth(self, dbname, command):
+        if self.auth and not self.authenticated:
+            raise OperationFailure("not authorized on %s to execute command "
+                                   "{ %s: 1 }" % (dbname, command))
+
+    ###########################################################################
+    def alive(self):
+        return True
+
+    ###########################################################################
+    def close(self):
+        pass
+
+###############################################################################
+# Auth state tests
+###############################################################################
+class AuthStateTest(unittest.TestCase):
+
+    ###########################################################################
+    def setUp(self):
+        self.wire_commands = []
+        self._saved_pool = connection_pool.__connection_pool__
+        connection_pool.__connection_pool__ = ConnectionPool(
+            lambda address: StandInClient(address, self.wire_commands),
+            health_check_interval=3600)
+
+    ###########################################################################
+    def tearDown(self):
+        connection_pool.__connection_pool__ = self._saved_pool
+
+    ###########################################################################
+    def new_servers(self, host_prefix):
+        servers = []
+        for i in range(NUM_SERVERS):
+            server = Server({"_id": "%s%d" % (host_prefix, i),
+                             "address": "%s%d:27017" % (host_prefix, i)})
+            server.set_login_user("admin", "admin", "secret")
+            servers.append(server)
+        return servers
+
+    ###########################################################################
+    def status_sweep(self, servers):
+        del self.wire_commands[:]
+        for server in servers:
+            status = server.get_status(admin=True)
+            self.assertTrue("serverStatusSummary" in status)
+        return list(self.wire_commands)
+
+    ###########################################################################
+    def test_no_auth_sweep(self):
+        servers = self.new_servers("host")
+        for i in range(2):
+            self.assertEquals(self.status_sweep(servers),
+                              ["serverStatus"] * NUM_SERVERS)
+
+    ###########################################################################
+    def test_auth_sweep(self):
+        servers = self.new_servers("auth")
+
+        # the first command of each server teaches it that auth is needed
+        self.assertEquals(self.status_sweep(servers),
+                          ["serverStatus", "authenticate", "serverStatus"] *
+                          NUM_SERVERS)
+
+        # then it is one wire command per logical command
+        self.assertEquals(self.status_sweep(servers),
+                          ["serverStatus"] * NUM_SERVERS)
+        self.assertTrue(servers[0].needs_to_auth("admin"))
+        self.assertEquals(self.wire_commands, ["serverStatus"] * NUM_SERVERS)
+
+    ###########################################################################
+    def test_needs_to_auth_probed_once(self):
+        server = self.new_servers("auth")[0]
+        self.assertTrue(server.needs_to_auth("test"))
+        self.assertTrue(server.needs_to_auth("test"))
+        self.assertEquals(self.wire_commands, ["listCollections"])
+
+    ###########################################################################
+    def test_reconnect_invalidates(self):
+        server = self.new_servers("auth")[0]
+        server.get_status(admin=True)
+        server.close_db_connection()
+
+        self.assertEquals(self.status_sweep([server]),
+                          ["serverStatus", "authenticate", "serverStatus"])
+
+    ###########################################################################
+    def test_authenticate_unreachable(self):
+        server = self.new_servers("down")[0]
+        self.assertRaises(MongoctlException, server.authenticate_db, "admin")
+
+# booty
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,364 @@
+# The MIT License
+
+# Copyright (c) 2012 ObjectLabs Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+
+__author__ = 'richardxx'
+
+import argparse
+import unittest
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+
+import bson
+from bson import Timestamp
+
+from mongoctl.commands.common import backup, dump
+from mongoctl.errors import MongoctlException
+
+###############################################################################
+# Constants
+###############################################################################
+# a mongodump that writes <out>/db/coll.bson and <out>/oplog.bson
+STANDIN_MONGODUMP = """#!%s
+import os, sys
+args = sys.argv[1:]
+assert "--oplog" in args
+out = args[args.index("--out") + 1]
+os.makedirs(os.path.join(out, "db"))
+open(os.path.join(out, "db", "coll.bson"), "w").close()
+open(os.path.join(out, "oplog.bson"), "w").close()
+"""
+
+###############################################################################
+class StandInCursor(list):
+
+    ###########################################################################
+    def __init__(self, entries):
+        list.__init__(self, entries)
+        self.options = 0
+
+    ###########################################################################
+    def add_option(self, mask):
+        self.options |= mask
+        return self
+
+    ###########################################################################
+    def sort(self, key, direction):
+        return self
+
+###############################################################################
+class StandInOplog(object):
+    """
+        local.oplog.rs as a list of entries in ts order
+    """
+
+    ###########################################################################
+    def __init__(self):
+        self.entries = []
+        self.cursors = []
+
+    ###########################################################################
+    def add(self, time, op="i"):
+        self.entries.append({"ts": Timestamp(time, 1), "op": op,
+                             "ns": "db.coll", "o": {"_id": time}})
+
+    ###########################################################################
+    def find_one(self, sort=None):
+        if not self.entries:
+            return None
+        return self.entries[0 if sort[0][1] > 0 else -1]
+
+    ###########################################################################
+    def find(self, spec):
+        cursor = StandInCursor(entry for entry in self.entries
+                               if spec["ts"]["$gt"] < entry["ts"] <=
+                               spec["ts"]["$lte"])
+        self.cursors.append(cursor)
+        return cursor
+
+###############################################################################
+class StandInServer(object):
+
+    ###########################################################################
+    def __init__(self):
+        self.id = "standin"
+        self.oplog = StandInOplog()
+
+    ###########################################################################
+    def get_db(self, dbname, username=None, password=None):
+        assert dbname == "local"
+        return {"oplog.rs": self.oplog}
+
+    ###########################################################################
+    def get_connection_host_address(self):
+        return "localhost"
+
+    ###########################################################################
+    def get_port(self):
+        return 27017
+
+    ###########################################################################
+    def get_mongo_version(self):
+        return "2.6.0"
+
+###############################################################################
+class StandInTime(object):
+    """
+        The time module with a sleep() of its own.
+    """
+
+    ###########################################################################
+    def __init__(self, sleep):
+        self.sleep = sleep
+
+    ###########################################################################
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+###############################################################################
+# Backup tests
+###############################################################################
+class BackupTest(unittest.TestCase):
+
+    ###########################################################################
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.backup_dir = os.path.join(self.temp_dir, "backup")
+        mongodump = os.path.join(self.temp_dir, "mongodump")
+        script = open(mongodump, "w")
+        script.write(STANDIN_MONGODUMP % sys.executable)
+        script.close()
+        os.chmod(mongodump, stat.S_IRWXU)
+
+        self._saved_functions = (dump.get_mongo_dump_executable,
+                                 backup.mongo_restore_db_address,
+                                 backup.mongo_dump_server)
+        dump.get_mongo_dump_executable = lambda version: mongodump
+        self.restores = []
+
+        def mongo_restore_db_address(destination, source, username=None,
+                                     password=None, restore_options=None):
+            self.restores.append((os.path.relpath(source, self.backup_dir),
+                                  restore_options))
+        backup.mongo_restore_db_address = mongo_restore_db_address
+
+        self.server = StandInServer()
+        for time in range(100, 110):
+            self.server.oplog.add(time)
+
+    ###########################################################################
+    def tearDown(self):
+        (dump.get_mongo_dump_executable,
+         backup.mongo_restore_db_address,
+         backup.mongo_dump_server) = self._saved_functions[:3]
+        if len(self._saved_functions) > 3:
+            (backup.get_backup_source,
+             backup.time) = self._saved_functions[3:]
+        shutil.rmtree(self.temp_dir)
+
+    ###########################################################################
+    def read_segment(self, segment):
+        segment_file = open(os.path.join(self.backup_dir, segment["dir"],
+                                         backup.SEGMENT_FILE_NAME), "rb")
+        try:
+            return list(bson.decode_file_iter(segment_file))
+        finally:
+            segment_file.close()
+
+    ###########################################################################
+    def take_backups(self):
+        """
+            A full backup at 109 then segments up to 119 and 129
+        """
+        backup.backup_server(self.server, self.backup_dir)
+        for time in range(110, 120):
+            self.server.oplog.add(time, op="n" if time == 115 else "i")
+        backup.backup_server(self.server, self.backup_dir)
+        for time in range(120, 130):
+            self.server.oplog.add(time)
+        return backup.backup_server(self.server, self.backup_dir)
+
+    ###########################################################################
+    def test_incremental_backup(self):
+        catalog = backup.backup_server(self.server, self.backup_dir)
+        self.assertTrue(os.path.exists(os.path.join(
+            self.backup_dir, "full", "oplog.bson")))
+        self.assertEquals(catalog["full"]["oplogStart"], {"t": 109, "i": 1})
+        self.assertEquals(catalog["full"]["oplogEnd"], {"t": 109, "i": 1})
+        self.assertEquals(catalog["segments"], [])
+
+        # nothing new
+        catalog = backup.backup_server(self.server, self.backup_dir)
+        self.assertEquals(catalog["segments"], [])
+
+        catalog = self.take_backups()
+        segments = catalog["segments"]
+        self.assertEquals(len(segments), 2)
+        self.assertEquals(segments[0]["from"], {"t": 109, "i": 1})
+        self.assertEquals(segments[0]["to"], {"t": 119, "i": 1})
+        self.assertEquals(segments[1]["to"], {"t": 129, "i": 1})
+        self.assertEquals(catalog["lastTimestamp"], {"t": 129, "i": 1})
+
+        # each segment has the entries since the last one, without no-ops
+        entries = self.read_segment(segments[0])
+        self.assertEquals([entry["o"]["_id"] for entry in entries],
+                          [t for t in range(110, 120) if t != 115])
+        self.assertEquals(segments[0]["count"], 9)
+        # read with the OplogReplay flag
+        self.assertEquals(
+            [cursor.options for cursor in self.server.oplog.cursors], [8, 8])
+        self.assertEquals(len(self.read_segment(segments[1])), 10)
+        self.assertEquals(backup.read_backup_catalog(self.backup_dir),
+                          catalog)
+
+    ###########################################################################
+    def test_writes_during_full_backup(self):
+        mongo_dump_server = backup.mongo_dump_server
+
+        def writing_mongo_dump_server(server, **kwargs):
+            mongo_dump_server(server, **kwargs)
+            for time in range(110, 113):
+                self.server.oplog.add(time)
+        backup.mongo_dump_server = writing_mongo_dump_server
+
+        catalog = backup.backup_server(self.server, self.backup_dir)
+        self.assertEquals(catalog["full"]["oplogStart"], {"t": 109, "i": 1})
+        self.assertEquals(catalog["full"]["oplogEnd"], {"t": 112, "i": 1})
+
+        # the dump is not consistent before it ended
+        self.assertRaises(MongoctlException, backup.point_in_time_restore,
+                          "server", self.backup_dir,
+                          until=Timestamp(111, 0))
+        backup.point_in_time_restore("server", self.backup_dir,
+                                     until=Timestamp(112, 2))
+        self.assertEquals(self.restores, [
+            ("full", {"oplogReplay": True, "oplogLimit": "112:2",
+                      "drop": False})])
+
+    ###########################################################################
+    def test_leftover_segment(self):
+        backup.backup_server(self.server, self.backup_dir)
+        for time in range(110, 120):
+            self.server.oplog.add(time)
+
+        # a backup died after writing its segment but before the catalog
+        leftover_dir = os.path.join(self.backup_dir, backup.SEGMENTS_DIR,
+                                    "0000000119_0000000001")
+        os.makedirs(leftover_dir)
+        open(os.path.join(leftover_dir, "stale"), "w").close()
+
+        catalog = backup.backup_server(self.server, self.backup_dir)
+        self.assertEquals(len(catalog["segments"]), 1)
+        self.assertEquals(sorted(os.listdir(leftover_dir)),
+                          [backup.SEGMENT_FILE_NAME])
+        self.assertEquals(len(self.read_segment(catalog["segments"][0])), 10)
+
+    ###########################################################################
+    def test_continuous_backup(self):
+        other_server = StandInServer()
+        other_server.id = "other"
+        other_server.oplog = self.server.oplog
+        # a run fails on an unreachable secondary, the next picks another
+        sources = [self.server, None, other_server]
+        picked = []
+
+        def get_backup_source(target, max_repl_lag=None):
+            picked.append(target)
+            server = sources.pop(0)
+            if server is None:
+                raise MongoctlException("Server is down")
+            return server
+
+        class Stop(Exception):
+            pass
+
+        def sleep(seconds):
+            self.server.oplog.add(110 + len(picked))
+            if not sources:
+                raise Stop()
+
+        self._saved_functions += (backup.get_backup_source, backup.time)
+        backup.get_backup_source = get_backup_source
+        backup.time = StandInTime(sleep)
+        options = argparse.Namespace(backupDir=self.backup_dir, target="rs",
+                                     maxReplLag=None, username=None,
+                                     password=None, interval=10)
+        self.assertRaises(Stop, backup.backup_command, options)
+
+        self.assertEquals(picked, ["rs", "rs", "rs"])
+        catalog = backup.read_backup_catalog(self.backup_dir)
+        self.assertEquals(catalog["full"]["server"], "standin")
+        self.assertEquals([segment["server"] for segment in
+                           catalog["segments"]], ["other"])
+        self.assertEquals(catalog["lastTimestamp"], {"t": 112, "i": 1})
+
+    ###########################################################################
+    def test_oplog_gap(self):
+        backup.backup_server(self.server, self.backup_dir)
+        # the oplog rolled over since the last backup
+        del self.server.oplog.entries[:]
+        for time in range(200, 210):
+            self.server.oplog.add(time)
+        self.assertRaises(MongoctlException, backup.backup_server,
+                          self.server, self.backup_dir)
+
+    ###########################################################################
+    def test_point_in_time_restore(self):
+        self.take_backups()
+
+        backup.point_in_time_restore("server", self.backup_dir)
+        self.assertEquals(self.restores, [
+            ("full", {"oplogReplay": True, "drop": False}),
+            ("oplog/0000000119_0000000001", {"oplogReplay": True}),
+            ("oplog/0000000129_0000000001", {"oplogReplay": True})])
+
+        # only the segments needed, up to the given timestamp
+        del self.restores[:]
+        backup.point_in_time_restore("server", self.backup_dir,
+                                     until=backup.parse_timestamp("115"),
+                                     drop=True)
+        self.assertEquals(self.restores, [
+            ("full", {"oplogReplay": True, "oplogLimit": "115:0",
+                      "drop": True}),
+            ("oplog/0000000119_0000000001", {"oplogReplay": True,
+                                             "oplogLimit": "115:0"})])
+
+        self.assertRaises(MongoctlException, backup.point_in_time_restore,
+                          "server", self.backup_dir,
+                          until=Timestamp(50, 0))
+
+    ###########################################################################
+    def test_parse_timestamp(self):
+        self.assertEquals(backup.parse_timestamp("100:3"), Timestamp(100, 3))
+        self.assertEquals(backup.parse_timestamp("100"), Timestamp(100, 0))
+        self.assertRaises(MongoctlException, backup.parse_timestamp, "x")
+        self.assertRaises(MongoctlException, backup.parse_timestamp, "1:2:3")
+
+# booty
+if __name__ == '__main__':
+    unittest.main()
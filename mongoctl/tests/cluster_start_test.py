@@ -0,0 +1,410 @@
+# The MIT License
+
+# Copyright (c) 2012 ObjectLabs Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+__author__ = 'richardxx'
+
+import unittest
+import os
+import threading
+import time
+
+import mongoctl.config as config
+from mongoctl.commands.cluster import control
+from mongoctl.context import execution_context
+from mongoctl.errors import MongoctlException
+from mongoctl.objects.replicaset_cluster import ReplicaSetCluster
+from mongoctl.tests.standin import StandinMongodProcess
+
+TESTING_CONF_DIR = os.path.join(os.path.dirname(__file__), "testing_conf")
+
+###############################################################################
+# Constants
+###############################################################################
+NUM_SHARDS = 6
+NUM_CONFIG_SERVERS = 3
+NUM_MONGOS = 2
+NUM_RS_MEMBERS = 5
+START_DELAY = 0.3
+
+###############################################################################
+class StandInServer(object):
+    """
+        Stands in for a cluster server, started as a stand-in mongod process.
+    """
+
+    # servers being started right now, and the most at once
+    starting_lock = threading.Lock()
+    starting = 0
+    max_starting = 0
+
+    ###########################################################################
+    def __init__(self, id, fail=False, start_delay=START_DELAY):
+        self.id = id
+        self.fail = fail
+        self.start_delay = start_delay
+        self.process = None
+        self.started_at = None
+        self.ready_at = None
+        self.stopped_at = None
+        self.cmd_options = {}
+
+    ###########################################################################
+    def is_online(self):
+        return self.process is not None
+
+    ###########################################################################
+    def set_cmd_option(self, name, value):
+        self.cmd_options[name] = value
+
+    ###########################################################################
+    def start(self):
+        self.started_at = time.time()
+        with StandInServer.starting_lock:
+            StandInServer.starting += 1
+            StandInServer.max_starting = max(StandInServer.max_starting,
+                                             StandInServer.starting)
+        try:
+            process = StandinMongodProcess(startup_delay=self.start_delay)
+            process.start()
+            process.wait_until_ready()
+        finally:
+            with StandInServer.starting_lock:
+                StandInServer.starting -= 1
+        if self.fail:
+            process.stop()
+            raise MongoctlException("Could not start server '%s'" % self.id)
+        self.process = process
+        self.ready_at = time.time()
+
+    ###########################################################################
+    def stop(self):
+        if self.process is not None:
+            self.stopped_at = time.time()
+            self.process.stop()
+            self.process = None
+
+###############################################################################
+class StandInMember(object):
+
+    ###########################################################################
+    def __init__(self, server):
+        self.server = server
+
+    ###########################################################################
+    def get_shard(self):
+        return self.server
+
+    ###########################################################################
+    def get_server(self):
+        return self.server
+
+###############################################################################
+def new_members(prefix, count, failing=None):
+    return [StandInMember(StandInServer("%s%d" % (prefix, i),
+                                        fail=("%s%d" % (prefix, i) in
+                                              (failing or []))))
+            for i in range(count)]
+
+###############################################################################
+class StandInReplicaSetCluster(ReplicaSetCluster):
+    """
+        A replica set of stand-in servers that records how it gets
+        initialized. Its first member is the primary once initialized.
+        With all_must_respond, it can only be initialized with all members
+        up, like replSetInitiate.
+    """
+
+    ###########################################################################
+    def __init__(self, id, failing=None, all_must_respond=False):
+        ReplicaSetCluster.__init__(self, {
+            "_id": id,
+            "members": [{"host": "%s_%d:27017" % (id, i)}
+                        for i in range(NUM_RS_MEMBERS)]})
+        for member, standin in zip(self.get_members(),
+                                   new_members(id + "_node", NUM_RS_MEMBERS,
+                                               failing=failing)):
+            member._server = standin.get_server()
+        self.all_must_respond = all_must_respond
+        self.initialized = False
+        self.inits = []
+
+    ###########################################################################
+    def all_servers(self):
+        return [member.get_server() for member in self.get_members()]
+
+    ###########################################################################
+    def is_replicaset_initialized(self):
+        return self.initialized
+
+    ###########################################################################
+    def initialize_replicaset(self, suggested_primary_server=None):
+        if self.all_must_respond and not all(server.is_online() for server
+                                             in self.all_servers()):
+            raise MongoctlException("Not all members of '%s' responded" %
+                                    self.id)
+        self.inits.append([server.is_online()
+                           for server in self.all_servers()])
+        self.initialized = True
+
+    ###########################################################################
+    def is_member_configured_for(self, server):
+        return self.initialized
+
+    ###########################################################################
+    def get_primary_member(self):
+        if self.initialized and self.all_servers()[0].is_online():
+            return self.get_members()[0]
+
+###############################################################################
+class StandInShardedCluster(object):
+
+    ###########################################################################
+    def __init__(self, failing=None, rs_shard=False):
+        def members(prefix, count):
+            return new_members(prefix, count, failing=[failing])
+
+        self.shards = members("shard", NUM_SHARDS)
+        if rs_shard:
+            self.shards[0] = StandInMember(
+                StandInReplicaSetCluster("rs_shard", failing=[failing]))
+        self.config_members = members("config", NUM_CONFIG_SERVERS)
+        self.mongos_members = members("mongos", NUM_MONGOS)
+        self.added_shards = []
+
+    ###########################################################################
+    def get_servers(self, members):
+        return [member.get_server() for member in members]
+
+    ###########################################################################
+    def all_servers(self):
+        servers = []
+        for server in self.get_servers(self.shards + self.config_members +
+                                       self.mongos_members):
+            if isinstance(server, ReplicaSetCluster):
+                servers.extend(server.all_servers())
+            else:
+                servers.append(server)
+        return servers
+
+    ###########################################################################
+    def is_shard_configured(self, shard):
+        return shard in self.added_shards
+
+    ###########################################################################
+    def add_shard(self, shard):
+        self.added_shards.append(shard)
+
+###############################################################################
+# Cluster start tests
+###############################################################################
+class ClusterStartTest(unittest.TestCase):
+
+    ###########################################################################
+    def setUp(self):
+        self._saved_functions = {
+            "start_server": control.start_server,
+            "stop_server": control.stop_server
+        }
+        control.start_server = lambda server, **kwargs: server.start()
+        control.stop_server = lambda server, **kwargs: server.stop()
+
+        StandInServer.max_starting = 0
+
+        self._context = execution_context()
+        self._context.__enter__()
+        config._set_config_root(TESTING_CONF_DIR)
+        self._clusters = []
+
+    ###########################################################################
+    def tearDown(self):
+        for cluster in self._clusters:
+            for server in cluster.all_servers():
+                server.stop()
+        self._context.__exit__(None, None, None)
+        config.__mongo_configs__.pop(TESTING_CONF_DIR, None)
+        for name, function in self._saved_functions.items():
+            setattr(control, name, function)
+
+    ###########################################################################
+    def new_cluster(self, failing=None, rs_shard=False):
+        cluster = StandInShardedCluster(failing=failing, rs_shard=rs_shard)
+        self._clusters.append(cluster)
+        return cluster
+
+    ###########################################################################
+    def start_cluster(self, concurrency):
+        config.set_mongoctl_config_val("startConcurrency", concurrency)
+        cluster = self.new_cluster()
+        start = time.time()
+        self.assertTrue(control.start_shard_cluster(cluster))
+        return cluster, time.time() - start
+
+    ###########################################################################
+    def test_start_order(self):
+        cluster, elapsed = self.start_cluster(8)
+
+        configs_ready = max(server.ready_at for server in
+                            cluster.get_servers(cluster.config_members))
+        for server in cluster.get_servers(cluster.mongos_members):
+            self.assertTrue(server.started_at >= configs_ready)
+        for server in cluster.all_servers():
+            self.assertTrue(server.is_online())
+            self.assertTrue(server.cmd_options["fork"])
+        self.assertEquals(cluster.added_shards,
+                          cluster.get_servers(cluster.shards))
+
+    ###########################################################################
+    def test_rollback(self):
+        config.set_mongoctl_config_val("startConcurrency", 4)
+        cluster = self.new_cluster(failing="config1")
+        # already running before, must be left alone
+        running = cluster.shards[0].get_server()
+        running.start()
+
+        self.assertFalse(control.start_shard_cluster(cluster))
+        for server in cluster.all_servers():
+            self.assertEquals(server.is_online(), server is running)
+        for server in cluster.get_servers(cluster.mongos_members):
+            self.assertEquals(server.started_at, None)
+        self.assertEquals(cluster.added_shards, [])
+
+    ###########################################################################
+    def test_start_replicaset(self):
+        config.set_mongoctl_config_val("startConcurrency", 8)
+        cluster = StandInReplicaSetCluster("rs")
+        self._clusters.append(cluster)
+
+        start = time.time()
+        self.assertTrue(control.start_replicaset_cluster(cluster))
+        # members started together and the set initialized once, with all
+        # of them up
+        self.assertTrue(time.time() - start < START_DELAY * 3)
+        self.assertEquals(cluster.inits, [[True] * NUM_RS_MEMBERS])
+
+        # already initialized: nothing to do
+        self.assertTrue(control.start_replicaset_cluster(cluster))
+        self.assertEquals(len(cluster.inits), 1)
+
+    ###########################################################################
+    def test_replicaset_quorum(self):
+        config.set_mongoctl_config_val("startConcurrency", 8)
+        cluster = StandInReplicaSetCluster("rs", failing=["rs_node1"])
+        self._clusters.append(cluster)
+        self.assertTrue(control.start_replicaset_cluster(cluster))
+        self.assertEquals(cluster.inits,
+                          [[i != 1 for i in range(NUM_RS_MEMBERS)]])
+
+        # no majority: no init and members stopped
+        cluster = StandInReplicaSetCluster(
+            "rs2", failing=["rs2_node0", "rs2_node1", "rs2_node2"])
+        self._clusters.append(cluster)
+        self.assertFalse(control.start_replicaset_cluster(cluster))
+        self.assertEquals(cluster.inits, [])
+        for server in cluster.all_servers():
+            self.assertFalse(server.is_online())
+
+    ###########################################################################
+    def test_replicaset_late_member(self):
+        config.set_mongoctl_config_val("startConcurrency", 8)
+        cluster = StandInReplicaSetCluster("rs", all_must_respond=True)
+        self._clusters.append(cluster)
+        cluster.all_servers()[4].start_delay = START_DELAY * 3
+
+        # initialized once the slow member is up too
+        self.assertTrue(control.start_replicaset_cluster(cluster))
+        self.assertEquals(cluster.inits, [[True] * NUM_RS_MEMBERS])
+
+    ###########################################################################
+    def test_replicaset_init_failure(self):
+        config.set_mongoctl_config_val("startConcurrency", 8)
+        cluster = StandInReplicaSetCluster("rs", failing=["rs_node1"],
+                                           all_must_respond=True)
+        self._clusters.append(cluster)
+
+        # a majority is up but the set can not be initiated: members stopped
+        self.assertFalse(control.start_replicaset_cluster(cluster))
+        self.assertEquals(cluster.inits, [])
+        for server in cluster.all_servers():
+            self.assertFalse(server.is_online())
+
+    ###########################################################################
+    def test_stop_replicaset(self):
+        config.set_mongoctl_config_val("startConcurrency", 8)
+        cluster = StandInReplicaSetCluster("rs")
+        self._clusters.append(cluster)
+        control.start_replicaset_cluster(cluster)
+
+        control.stop_replicaset_cluster(cluster)
+        primary = cluster.all_servers()[0]
+        secondaries = cluster.all_servers()[1:]
+        for server in cluster.all_servers():
+            self.assertFalse(server.is_online())
+        for server in secondaries:
+            self.assertTrue(server.stopped_at < primary.stopped_at)
+
+    ###########################################################################
+    def test_sharded_cluster_with_replicaset_shard(self):
+        config.set_mongoctl_config_val("startConcurrency", 8)
+        cluster = self.new_cluster(rs_shard=True)
+        self.assertTrue(control.start_shard_cluster(cluster))
+        rs_shard = cluster.shards[0].get_shard()
+        self.assertEquals(len(rs_shard.inits), 1)
+        self.assertTrue(rs_shard in cluster.added_shards)
+        for server in cluster.all_servers():
+            self.assertTrue(server.is_online())
+
+        # a failing config server stops the replica set shard too
+        cluster = self.new_cluster(failing="config0", rs_shard=True)
+        self.assertFalse(control.start_shard_cluster(cluster))
+        for server in cluster.all_servers():
+            self.assertFalse(server.is_online())
+
+    ###########################################################################
+    def test_total_start_concurrency(self):
+        # the replica set shard starts its members in its own pool, alongside
+        # the other shards
+        config.set_mongoctl_config_val("startConcurrency", 3)
+        cluster = self.new_cluster(rs_shard=True)
+        self.assertTrue(control.start_shard_cluster(cluster))
+        self.assertEquals(StandInServer.max_starting, 3)
+        for server in cluster.all_servers():
+            self.assertTrue(server.is_online())
+
+    ###########################################################################
+    def test_start_benchmark(self):
+        cluster, serial = self.start_cluster(1)
+        for server in cluster.all_servers():
+            server.stop()
+        cluster, parallel = self.start_cluster(8)
+
+        print "\nstart-cluster of %d shards, %d config servers and %d mongos:" \
+              " serial %.2fs, parallel %.2fs, saved %.2fs" % (
+                  NUM_SHARDS, NUM_CONFIG_SERVERS, NUM_MONGOS, serial, parallel,
+                  serial - parallel)
+        # shards and config servers then mongos: about two start times
+        self.assertTrue(parallel < serial / 2)
+
+# booty
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+# The MIT License
+
+# Copyright (c) 2012 ObjectLabs Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+__author__ = 'richardxx'
+
+import unittest
+import os
+import random
+import shutil
+import tempfile
+import threading
+
+import mongoctl.mongoctl as mongoctl_main
+import mongoctl.config as config
+from mongoctl import prompt
+from mongoctl import users
+from mongoctl.context import execution_context, get_context
+from mongoctl.objects import server
+
+TESTING_CONF_DIR = os.path.join(os.path.dirname(__file__), "testing_conf")
+
+###############################################################################
+# Constants
+###############################################################################
+NUM_THREADS = 32
+ROUNDS_PER_THREAD = 3
+
+###############################################################################
+# Concurrent execute() tests
+###############################################################################
+class ConcurrentExecuteTest(unittest.TestCase):
+
+    ###########################################################################
+    def setUp(self):
+        mongoctl_main.setup(run_service=True)
+
+        # two config roots with different ports for the same server ids
+        self._conf_roots = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+        for conf_root in self._conf_roots:
+            for name in ["mongoctl.config", "servers.config",
+                         "clusters.config"]:
+                shutil.copy(os.path.join(TESTING_CONF_DIR, name), conf_root)
+
+        servers_file = os.path.join(self._conf_roots[1], "servers.config")
+        servers = open(servers_file).read()
+        servers = servers.replace("275", "375").replace("276", "376")
+        open(servers_file, "w").write(servers)
+
+    ###########################################################################
+    def tearDown(self):
+        for conf_root in self._conf_roots:
+            config.__mongo_configs__.pop(conf_root, None)
+            shutil.rmtree(conf_root)
+
+    ###########################################################################
+    def get_commands(self):
+        commands = []
+        for conf_root in self._conf_roots:
+            root_args = ["--config-root", conf_root]
+            commands.extend([
+                root_args + ["print-uri", "simple_test_server"],
+                root_args + ["print-uri", "ReplicasetTestCluster", "-d", "a"],
+                root_args + ["--yes", "print-uri", "master_test_server"],
+                root_args + ["print-uri", "node1_test_server", "--db", "b"],
+                root_args + ["print-uri", "no_such_server"],
+                root_args + ["status", "simple_test_server",
+                             "-u", "abdulito", "-p", "mongoctlRocks"],
+                root_args + ["status", "node2_test_server"],
+                root_args + ["show-server", "arbiter_test_server"],
+                root_args + ["list-clusters"]
+            ])
+
+        return commands
+
+    ###########################################################################
+    def test_concurrent_results_match_serial(self):
+        commands = self.get_commands()
+        serial_results = [mongoctl_main.execute(command)
+                          for command in commands]
+
+        # the two config roots must not be mixed up
+        self.assertNotEquals(serial_results[0],
+                             serial_results[len(commands) / 2])
+
+        mismatches = []
+        errors = []
+
+        def run_commands():
+            try:
+                indexes = range(len(commands)) * ROUNDS_PER_THREAD
+                random.shuffle(indexes)
+                for i in indexes:
+                    result = mongoctl_main.execute(commands[i])
+                    if result != serial_results[i]:
+                        mismatches.append((commands[i], result,
+                                           serial_results[i]))
+            except BaseException, e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run_commands)
+                   for i in range(NUM_THREADS)]
+        map(lambda t: t.start(), threads)
+        map(lambda t: t.join(), threads)
+
+        self.assertEquals(errors, [])
+        self.assertEquals(mismatches, [])
+
+    ###########################################################################
+    def test_context_isolation(self):
+        ready = []
+        ready_lock = threading.Lock()
+        all_ready = threading.Event()
+        failures = []
+
+        def run_in_context(i):
+            with execution_context():
+                if i % 2:
+                    prompt.say_yes_to_everything()
+                else:
+                    prompt.set_interactive_mode(False)
+                users.parse_global_login_user_arg("user%d" % i, "pass",
+                                                  "server%d" % i)
+                server.assume_local_server("server%d" % i)
+                get_context().mongod_pids["server%d" % i] = i
+
+                # wait until all threads have set up their contexts
+                with ready_lock:
+                    ready.append(i)
+                    if len(ready) == NUM_THREADS:
+                        all_ready.set()
+                all_ready.wait(10)
+
+                context = get_context()
+                if (prompt.is_say_yes_to_everything() != bool(i % 2) or
+                        prompt.is_interactive_mode() != bool(i % 2) or
+                        context.global_login_user["username"] !=
+                        "user%d" % i or
+                        context.assumed_local_servers != ["server%d" % i] or
+                        context.mongod_pids != {"server%d" % i: i}):
+                    failures.append(i)
+
+        threads = [threading.Thread(target=run_in_context, args=(i,))
+                   for i in range(NUM_THREADS)]
+        map(lambda t: t.start(), threads)
+        map(lambda t: t.join(), threads)
+
+        self.assertEquals(failures, [])
+
+        # the default context is untouched
+        self.assertFalse(prompt.is_say_yes_to_everything())
+        self.assertTrue(prompt.is_interactive_mode())
+
+# booty
+if __name__ == '__main__':
+    unittest.main()
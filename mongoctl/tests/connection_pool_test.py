@@ -0,0 +1,226 @@
+# The MIT License
+
+# Copyright (c) 2012 ObjectLabs Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+__author__ = 'richardxx'
+
+import unittest
+import threading
+import time
+
+from mongoctl import connection_pool
+from mongoctl.connection_pool import ConnectionPool
+from mongoctl.context import execution_context
+from mongoctl.objects.server import Server
+
+###############################################################################
+# Constants
+###############################################################################
+NUM_SERVERS = 500
+
+###############################################################################
+class StandInClient(object):
+    """
+        Stands in for a MongoClient. It stays healthy when the server goes
+        down until it next talks to it.
+    """
+
+    ###########################################################################
+    def __init__(self, address):
+        self.address = address
+        self.healthy = True
+        self.server_up = True
+        self.closed = False
+        self.admin = self
+
+    ###########################################################################
+    def command(self, name):
+        if self.closed or not self.server_up:
+            raise Exception("connection closed")
+        return {"ok": 1}
+
+    ###########################################################################
+    def alive(self):
+        return self.healthy
+
+    ###########################################################################
+    def close(self):
+        self.closed = True
+
+###############################################################################
+# Connection pool tests
+###############################################################################
+class ConnectionPoolTest(unittest.TestCase):
+
+    ###########################################################################
+    def setUp(self):
+        self.clients = []
+        self.clients_lock = threading.Lock()
+        self._saved_pool = connection_pool.__connection_pool__
+        connection_pool.__connection_pool__ = self.new_pool()
+
+    ###########################################################################
+    def tearDown(self):
+        connection_pool.__connection_pool__ = self._saved_pool
+
+    ###########################################################################
+    def connect(self, address):
+        if address.endswith(":1"):
+            raise Exception("connection refused")
+        client = StandInClient(address)
+        with self.clients_lock:
+            self.clients.append(client)
+        return client
+
+    ###########################################################################
+    def new_pool(self, **kwargs):
+        return ConnectionPool(self.connect, **kwargs)
+
+    ###########################################################################
+    def test_status_sweep_reuses_connections(self):
+        servers = [Server({"_id": "server%d" % i,
+                           "address": "host%d:27017" % i})
+                   for i in range(NUM_SERVERS)]
+
+        for server in servers:
+            self.assertTrue(server.is_online())
+            self.assertTrue(server.get_status()["connection"])
+        self.assertEquals(len(self.clients), NUM_SERVERS)
+
+        # a new execution with new server objects shares the connections
+        with execution_context():
+            for i in range(NUM_SERVERS):
+                server = Server({"_id": "server%d" % i,
+                                 "address": "host%d:27017" % i})
+                self.assertTrue(server.is_online())
+        self.assertEquals(len(self.clients), NUM_SERVERS)
+
+    ###########################################################################
+    def test_offline_server(self):
+        server = Server({"_id": "offline", "address": "host:1"})
+        self.assertFalse(server.is_online())
+        self.assertFalse(server.get_status()["connection"])
+        self.assertEquals(connection_pool.get_connection_pool().size(), 0)
+
+    ###########################################################################
+    def test_close_db_connection(self):
+        server = Server({"_id": "server", "address": "host:27017"})
+        server.is_online()
+        server.get_db_connection(credentials=("admin", "user", "pass"))
+        self.assertEquals(len(self.clients), 2)
+
+        # released but not closed: other servers may be using them
+        server.close_db_connection()
+        self.assertFalse(any(client.closed for client in self.clients))
+        self.assertEquals(connection_pool.get_connection_pool().size(), 0)
+        self.assertTrue(server.is_online())
+        self.assertEquals(len(self.clients), 3)
+
+    ###########################################################################
+    def test_shared_client_kept_open(self):
+        server = Server({"_id": "server", "address": "host:27017"})
+        other_server = Server({"_id": "server", "address": "host:27017"})
+        self.assertTrue(server.is_online())
+        client = other_server.get_db_connection()
+
+        server.close_db_connection()
+        self.assertEquals(client.command("ping"), {"ok": 1})
+
+    ###########################################################################
+    def test_dead_server_offline(self):
+        server = Server({"_id": "server", "address": "host:27017"})
+        self.assertTrue(server.is_online())
+
+        # within the health check interval of the pooled client
+        self.clients[0].server_up = False
+        self.assertFalse(server.is_online())
+
+    ###########################################################################
+    def test_credentials(self):
+        pool = self.new_pool()
+        client = pool.get_connection("host:27017")
+        self.assertTrue(pool.get_connection("host:27017") is client)
+
+        user_client = pool.get_connection("host:27017",
+                                          ("admin", "user", "pass"))
+        self.assertFalse(user_client is client)
+        self.assertTrue(pool.get_connection("host:27017",
+                                            ("admin", "user", "pass")) is
+                        user_client)
+
+    ###########################################################################
+    def test_health_check(self):
+        pool = self.new_pool(health_check_interval=0)
+        client = pool.get_connection("host:27017")
+        self.assertTrue(pool.get_connection("host:27017") is client)
+
+        client.healthy = False
+        new_client = pool.get_connection("host:27017")
+        self.assertFalse(new_client is client)
+        self.assertTrue(client.closed)
+        self.assertEquals(pool.size(), 1)
+
+    ###########################################################################
+    def test_idle_eviction(self):
+        pool = self.new_pool(idle_timeout=0.1)
+        client = pool.get_connection("host0:27017")
+        time.sleep(0.2)
+
+        pool.get_connection("host1:27017")
+        self.assertTrue(client.closed)
+        self.assertEquals(pool.size(), 1)
+
+    ###########################################################################
+    def test_max_size(self):
+        pool = self.new_pool(max_size=3)
+        clients = [pool.get_connection("host%d:27017" % i) for i in range(3)]
+
+        # host0 is now the most recently used
+        pool.get_connection("host0:27017")
+        pool.get_connection("host3:27017")
+
+        self.assertEquals(pool.size(), 3)
+        self.assertTrue(clients[1].closed)
+        self.assertFalse(clients[0].closed or clients[2].closed)
+
+    ###########################################################################
+    def test_concurrent_connect(self):
+        pool = self.new_pool()
+        results = []
+
+        def get_connection():
+            results.append(pool.get_connection("host:27017"))
+
+        threads = [threading.Thread(target=get_connection) for i in range(20)]
+        map(lambda t: t.start(), threads)
+        map(lambda t: t.join(), threads)
+
+        # extra clients created by racing threads are closed
+        self.assertEquals(len(set(results)), 1)
+        self.assertEquals(pool.size(), 1)
+        self.assertTrue(all(client.closed for client in self.clients
+                            if client is not results[0]))
+
+# booty
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,258 @@
+# The MIT License
+
+# Copyright (c) 2012 ObjectLabs Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+__author__ = 'richardxx'
+
+import unittest
+import copy
+import json
+import os
+import shutil
+import tempfile
+
+from bson import DBRef
+
+import mongoctl.config as config
+import mongoctl.repository as repository
+from mongoctl.context import execution_context
+
+###############################################################################
+class CountingCollection(object):
+    """
+        A collection of documents that counts the queries it receives.
+        Supports the queries the repository issues by _id.
+    """
+
+    ###########################################################################
+    def __init__(self, name, documents):
+        self.name = name
+        self.documents = dict((doc["_id"], doc) for doc in documents)
+        self.queries = 0
+
+    ###########################################################################
+    def find_one(self, query):
+        self.queries += 1
+        doc = self.documents.get(query["_id"])
+        return copy.deepcopy(doc) if doc else None
+
+    ###########################################################################
+    def find(self, query=None):
+        self.queries += 1
+        if query is None:
+            ids = self.documents.keys()
+        else:
+            ids = query["_id"]["$in"]
+        return CountingCursor(copy.deepcopy(self.documents[doc_id])
+                              for doc_id in ids if doc_id in self.documents)
+
+###############################################################################
+class CountingCursor(list):
+
+    ###########################################################################
+    def sort(self, key, direction):
+        list.sort(self, key=lambda doc: doc[key], reverse=direction < 0)
+        return self
+
+###############################################################################
+class HashingDatabase(object):
+    """
+        Answers dbHash with a hash that the test can change, and counts them.
+    """
+
+    ###########################################################################
+    def __init__(self):
+        self.md5 = "hash0"
+        self.hashes = 0
+
+    ###########################################################################
+    def command(self, command, collections=None):
+        assert command == "dbHash"
+        self.hashes += 1
+        return {"md5": self.md5}
+
+###############################################################################
+def replicaset_doc(cluster_id, server_ids):
+    return {"_id": cluster_id,
+            "members": [{"server": DBRef("servers", server_id)}
+                        for server_id in server_ids]}
+
+###############################################################################
+def server_docs(server_ids, first_port):
+    return [{"_id": server_id, "cmdOptions": {"port": first_port + i}}
+            for i, server_id in enumerate(server_ids)]
+
+###############################################################################
+# DB repository lookup tests
+###############################################################################
+class DbRepositoryTest(unittest.TestCase):
+
+    ###########################################################################
+    def setUp(self):
+        rs_servers = ["rs_node%d" % i for i in range(7)]
+        shard0_servers = ["shard0_node%d" % i for i in range(3)]
+        shard1_servers = ["shard1_node%d" % i for i in range(3)]
+        config_servers = ["config%d" % i for i in range(3)]
+        mongos_servers = ["mongos%d" % i for i in range(2)]
+
+        servers = (server_docs(rs_servers, 20000) +
+                   server_docs(shard0_servers, 21000) +
+                   server_docs(shard1_servers, 22000) +
+                   server_docs(config_servers, 23000) +
+                   server_docs(mongos_servers, 24000))
+
+        clusters = [
+            replicaset_doc("rs", rs_servers),
+            replicaset_doc("shard0", shard0_servers),
+            replicaset_doc("shard1", shard1_servers),
+            {
+                "_id": "sharded",
+                "_type": "ShardedCluster",
+                "members": [{"server": DBRef("servers", server_id)}
+                            for server_id in mongos_servers],
+                "configServers": [{"server": DBRef("servers", server_id)}
+                                  for server_id in config_servers],
+                "shards": [{"cluster": DBRef("clusters", "shard0")},
+                           {"cluster": DBRef("clusters", "shard1")}]
+            }
+        ]
+
+        self.servers = CountingCollection("servers", servers)
+        self.clusters = CountingCollection("clusters", clusters)
+
+        self._conf_root = tempfile.mkdtemp()
+        open(os.path.join(self._conf_root, "mongoctl.config"), "w").write(
+            json.dumps({"databaseRepository": {
+                "databaseURI": "mongodb://localhost:27017/mongoctl"}}))
+
+        self._saved_functions = {}
+        self.replace_function("consulting_db_repository", lambda: True)
+        self.replace_function("get_mongoctl_server_db_collection",
+                              lambda: self.servers)
+        self.replace_function("get_mongoctl_cluster_db_collection",
+                              lambda: self.clusters)
+
+        self.database = HashingDatabase()
+        self.replace_function("get_mongoctl_database", lambda: self.database)
+        repository.__db_repository_hashes__.clear()
+
+        self._context = execution_context()
+        self._context.__enter__()
+        config._set_config_root(self._conf_root)
+
+    ###########################################################################
+    def tearDown(self):
+        self._context.__exit__(None, None, None)
+        repository.__db_repository_hashes__.clear()
+        for name, function in self._saved_functions.items():
+            setattr(repository, name, function)
+        config.__mongo_configs__.pop(self._conf_root, None)
+        shutil.rmtree(self._conf_root)
+
+    ###########################################################################
+    def replace_function(self, name, function):
+        self._saved_functions[name] = getattr(repository, name)
+        setattr(repository, name, function)
+
+    ###########################################################################
+    def queries(self):
+        return self.servers.queries + self.clusters.queries
+
+    ###########################################################################
+    def test_replicaset_members_prefetched(self):
+        cluster = repository.lookup_cluster("rs")
+        member_servers = [member.get_server()
+                          for member in cluster.get_members()]
+
+        self.assertEquals([server.id for server in member_servers],
+                          ["rs_node%d" % i for i in range(7)])
+        # one query for the cluster and one for all of its servers
+        self.assertEquals(self.queries(), 2)
+
+        # same objects, no more queries
+        for server in member_servers:
+            self.assertTrue(repository.lookup_server(server.id) is server)
+        self.assertTrue(repository.lookup_cluster("rs") is cluster)
+        self.assertEquals(self.queries(), 2)
+
+    ###########################################################################
+    def test_sharded_cluster_prefetched(self):
+        cluster = repository.lookup_cluster("sharded")
+
+        server_ids = [member.get_server().id
+                      for member in cluster.mongos_members +
+                                    cluster.config_members]
+        for shard_member in cluster.shards:
+            shard = shard_member.get_cluster()
+            server_ids.extend([member.get_server().id
+                               for member in shard.get_members()])
+
+        self.assertEquals(len(server_ids), 11)
+        # the cluster, its shard clusters and all servers
+        self.assertEquals(self.queries(), 3)
+
+    ###########################################################################
+    def test_missing_documents_fetched_once(self):
+        self.assertEquals(repository.db_lookup_server("nope"), None)
+        self.assertEquals(repository.db_lookup_server("nope"), None)
+        self.assertEquals(repository.db_lookup_cluster("nope"), None)
+        self.assertEquals(repository.db_lookup_cluster("nope"), None)
+        self.assertEquals(self.queries(), 2)
+
+    ###########################################################################
+    def test_clusters_streamed(self):
+        clusters = list(repository.iter_clusters())
+
+        self.assertEquals([cluster.id for cluster in clusters],
+                          ["rs", "shard0", "shard1", "sharded"])
+        # the clusters, then the servers they reference
+        self.assertEquals(self.queries(), 2)
+        self.assertTrue(repository.lookup_cluster("shard0") is clusters[1])
+        self.assertEquals(self.queries(), 2)
+
+    ###########################################################################
+    def test_identity_map_per_execution(self):
+        server = repository.lookup_server("rs_node0")
+        with execution_context():
+            config._set_config_root(self._conf_root)
+            other_server = repository.lookup_server("rs_node0")
+
+        self.assertFalse(server is other_server)
+        self.assertEquals(self.queries(), 2)
+
+    ###########################################################################
+    def test_repository_hash_reused(self):
+        generation = repository.get_repository_generation()
+        self.assertEquals(generation, ("hash0",))
+        # the collections are hashed at most once per ttl
+        self.database.md5 = "hash1"
+        self.assertEquals(repository.get_repository_generation(), generation)
+        self.assertEquals(self.database.hashes, 1)
+
+        config.set_mongoctl_config_val("dbRepositoryHashTTL", 0)
+        self.assertEquals(repository.get_repository_generation(),
+                          ("hash1",))
+        self.assertEquals(self.database.hashes, 2)
+
+# booty
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+# The MIT License
+
+# Copyright (c) 2012 ObjectLabs Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+__author__ = 'richardxx'
+
+import unittest
+import json
+import os
+import shutil
+import stat
+import tempfile
+
+import mongoctl.config as config
+from mongoctl.commands import command_utils
+from mongoctl.context import execution_context
+
+###############################################################################
+# Constants
+###############################################################################
+NUM_INSTALLATIONS = 15
+
+###############################################################################
+# Exe version cache tests
+###############################################################################
+class ExeVersionCacheTest(unittest.TestCase):
+
+    ###########################################################################
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+        self._conf_root = os.path.join(self._tmp_dir, "conf")
+        self._installs_dir = os.path.join(self._tmp_dir, "mongodb")
+        self._cache_file = os.path.join(self._tmp_dir, "cache",
+                                        "exe_versions.json")
+        os.makedirs(self._conf_root)
+
+        for i in range(NUM_INSTALLATIONS):
+            self.write_mongod("mongodb-2.4.%d" % i, "2.4.%d" % i)
+
+        open(os.path.join(self._conf_root, "mongoctl.config"), "w").write(
+            json.dumps({"mongoDBInstallationsDirectory": self._installs_dir,
+                        "exeVersionCacheFile": self._cache_file}))
+
+        self._saved_env = dict((name, os.environ.get(name))
+                               for name in ["PATH", "MONGO_HOME"])
+        os.environ["PATH"] = self._tmp_dir
+        os.environ.pop("MONGO_HOME", None)
+
+        self.forks = 0
+        self._execute_command = command_utils.execute_command
+
+        def counting_execute_command(command):
+            self.forks += 1
+            return self._execute_command(command)
+
+        command_utils.execute_command = counting_execute_command
+
+        self._context = execution_context()
+        self._context.__enter__()
+        config._set_config_root(self._conf_root)
+
+    ###########################################################################
+    def tearDown(self):
+        self._context.__exit__(None, None, None)
+        command_utils.execute_command = self._execute_command
+        for name, value in self._saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        config.__mongo_configs__.pop(self._conf_root, None)
+        shutil.rmtree(self._tmp_dir)
+
+    ###########################################################################
+    def write_mongod(self, installation, version):
+        bin_dir = os.path.join(self._installs_dir, installation, "bin")
+        if not os.path.exists(bin_dir):
+            os.makedirs(bin_dir)
+        mongod = os.path.join(bin_dir, "mongod")
+        open(mongod, "w").write("#!/bin/sh\necho 'db version v%s'\n" %
+                                version)
+        os.chmod(mongod, stat.S_IRWXU)
+        return mongod
+
+    ###########################################################################
+    def find_versions(self):
+        return sorted(str(version) for exe, version in
+                      command_utils.find_all_executables("mongod"))
+
+    ###########################################################################
+    def test_versions_cached(self):
+        versions = ["2.4.%d" % i for i in range(NUM_INSTALLATIONS)]
+        self.assertEquals(self.find_versions(), sorted(versions))
+        self.assertEquals(self.forks, NUM_INSTALLATIONS)
+
+        self.assertEquals(self.find_versions(), sorted(versions))
+        self.assertEquals(self.forks, NUM_INSTALLATIONS)
+
+    ###########################################################################
+    def test_changed_exe_rechecked(self):
+        self.find_versions()
+        self.forks = 0
+
+        # replaced executable, new installation and removed installation
+        self.write_mongod("mongodb-2.4.0", "2.6.0-rc1")
+        self.write_mongod("mongodb-2.6.1", "2.6.1")
+        shutil.rmtree(os.path.join(self._installs_dir, "mongodb-2.4.1"))
+
+        versions = self.find_versions()
+        self.assertTrue("2.6.0-rc1" in versions)
+        self.assertTrue("2.6.1" in versions)
+        self.assertFalse("2.4.0" in versions or "2.4.1" in versions)
+        self.assertEquals(self.forks, 2)
+
+        cache = json.load(open(self._cache_file))
+        self.assertEquals(len(cache), NUM_INSTALLATIONS)
+
+    ###########################################################################
+    def test_invalid_cache_ignored(self):
+        os.makedirs(os.path.dirname(self._cache_file))
+        open(self._cache_file, "w").write("{not json")
+
+        self.assertEquals(len(self.find_versions()), NUM_INSTALLATIONS)
+        self.assertEquals(len(json.load(open(self._cache_file))),
+                          NUM_INSTALLATIONS)
+
+# booty
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+# The MIT License
+
+# Copyright (c) 2012 ObjectLabs Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+__author__ = 'richardxx'
+
+import unittest
+import json
+import os
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+TESTING_CONF_DIR = os.path.join(os.path.dirname(__file__), "testing_conf")
+
+###############################################################################
+# Constants
+###############################################################################
+
+# seconds a clean interpreter may take to import mongoctl and build the parser
+MAX_STARTUP_TIME = 2
+
+# number of slowest imports to report
+REPORT_SIZE = 15
+
+###############################################################################
+# Runs in a clean interpreter: times each first import (like python 3's
+# -X importtime), imports mongoctl, builds the parser, parses a status
+# command line and prints the result as json
+IMPORT_TIME_SCRIPT = """
+import __builtin__, json, sys, time
+
+real_import = __builtin__.__import__
+imports = []
+stack = []
+
+def timed_import(name, *args, **kwargs):
+    before = len(sys.modules)
+    start = time.time()
+    stack.append(0)
+    try:
+        return real_import(name, *args, **kwargs)
+    finally:
+        cumulative = time.time() - start
+        nested = stack.pop()
+        if stack:
+            stack[-1] += cumulative
+        if len(sys.modules) > before:
+            imports.append({"module": name, "depth": len(stack),
+                            "self": cumulative - nested,
+                            "cumulative": cumulative})
+
+__builtin__.__import__ = timed_import
+
+start = time.time()
+import mongoctl.mongoctl as mongoctl_main
+mongoctl_main.setup()
+mongoctl_main.get_parser().parse_args(["status", "some_server"])
+elapsed = time.time() - start
+
+print json.dumps({"elapsed": elapsed, "imports": imports,
+                  "modules": sorted(name for name, module in
+                                    sys.modules.items() if module)})
+"""
+
+###############################################################################
+# Import time benchmark
+###############################################################################
+class ImportTimeTest(unittest.TestCase):
+
+    ###########################################################################
+    def run_import_time_script(self):
+        output = subprocess.check_output([sys.executable, "-c",
+                                          IMPORT_TIME_SCRIPT], cwd=ROOT_DIR)
+        return json.loads(output.strip().split("\n")[-1])
+
+    ###########################################################################
+    def test_startup(self):
+        result = self.run_import_time_script()
+
+        print >> sys.stderr, ("\nmongoctl startup: %.3f second(s), %d "
+                              "modules" % (result["elapsed"],
+                                           len(result["modules"])))
+        print >> sys.stderr, "import time: self [us] | cumulative | module"
+        slowest = sorted(result["imports"], key=lambda i: i["cumulative"],
+                         reverse=True)[:REPORT_SIZE]
+        for imported in slowest:
+            print >> sys.stderr, ("import time: %9d | %10d | %s%s" %
+                                  (imported["self"] * 1000000,
+                                   imported["cumulative"] * 1000000,
+                                   "  " * imported["depth"],
+                                   imported["module"]))
+
+        # command modules are only imported when their command runs
+        command_modules = [name for name in result["modules"]
+                           if name.startswith("mongoctl.commands.") and
+                              name.count(".") > 2]
+        self.assertEquals(command_modules, [])
+        self.assertTrue(result["elapsed"] < MAX_STARTUP_TIME)
+
+    ###########################################################################
+    def test_command_resolved_when_run(self):
+        import mongoctl.mongoctl as mongoctl_main
+        mongoctl_main.setup(run_service=True)
+        parsed_args = mongoctl_main.get_parser().parse_args(
+            ["list-clusters"])
+        self.assertEquals(parsed_args.func.function_name,
+                          "mongoctl.commands.cluster.list_clusters."
+                          "list_clusters_command")
+
+        # the parser is built once so the function stays resolved
+        mongoctl_main.execute(["--config-root", TESTING_CONF_DIR,
+                               "list-clusters"])
+        self.assertTrue(mongoctl_main.get_parser().parse_args(
+            ["list-clusters"]).func._function is not None)
+
+# booty
+if __name__ == '__main__':
+    unittest.main()
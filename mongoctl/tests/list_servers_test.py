@@ -0,0 +1,162 @@
+# The MIT License
+
+# Copyright (c) 2012 ObjectLabs Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+__author__ = 'richardxx'
+
+import unittest
+import sys
+import time
+
+import mongoctl.repository as repository
+from mongoctl.commands.server import list_servers
+
+###############################################################################
+# Constants
+###############################################################################
+NUM_SERVERS = 800
+PROBE_TIMEOUT = 0.3
+
+# how long an unreachable server takes to fail
+UNREACHABLE_DELAY = 3
+
+###############################################################################
+class StandInServer(object):
+
+    ###########################################################################
+    def __init__(self, id, online=True, reachable=True):
+        self.id = id
+        self.online = online
+        self.reachable = reachable
+        self.probes = 0
+
+    ###########################################################################
+    def get_description(self):
+        return "stand-in %s" % self.id
+
+    ###########################################################################
+    def get_address_display(self):
+        return "%s:27017" % self.id
+
+    ###########################################################################
+    def is_online(self):
+        self.probes += 1
+        if not self.reachable:
+            time.sleep(UNREACHABLE_DELAY)
+            return False
+        time.sleep(0.01)
+        return self.online
+
+###############################################################################
+class LineRecorder(object):
+    """
+        Records printed lines and the time they were printed.
+    """
+
+    ###########################################################################
+    def __init__(self):
+        self.lines = []
+        self._buffer = ""
+
+    ###########################################################################
+    def write(self, data):
+        self._buffer += data
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            self.lines.append((time.time(), line))
+
+    ###########################################################################
+    def flush(self):
+        pass
+
+###############################################################################
+class Options(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+###############################################################################
+# list-servers tests
+###############################################################################
+class ListServersTest(unittest.TestCase):
+
+    ###########################################################################
+    def setUp(self):
+        self.servers = [StandInServer("server%03d" % i,
+                                      online=i % 2 == 0,
+                                      reachable=i % 40 != 39)
+                        for i in range(NUM_SERVERS)]
+        self._iter_server_views = repository.iter_server_views
+        repository.iter_server_views = lambda: iter(self.servers)
+
+    ###########################################################################
+    def tearDown(self):
+        repository.iter_server_views = self._iter_server_views
+
+    ###########################################################################
+    def list_servers(self, **options):
+        recorder = LineRecorder()
+        stdout = sys.stdout
+        sys.stdout = recorder
+        try:
+            start = time.time()
+            list_servers.list_servers_command(Options(**options))
+            end = time.time()
+        finally:
+            sys.stdout = stdout
+
+        rows = [(line_time, line.split()) for line_time, line in
+                recorder.lines[3:] if line.strip()]
+        return start, end, rows
+
+    ###########################################################################
+    def test_parallel_probe(self):
+        start, end, rows = self.list_servers(noProbe=False,
+                                             probeTimeout=PROBE_TIMEOUT,
+                                             probeConcurrency=50)
+
+        self.assertTrue(end - start < UNREACHABLE_DELAY)
+        self.assertEquals([row[0] for _, row in rows],
+                          [server.id for server in self.servers])
+
+        for server, (_, row) in zip(self.servers, rows):
+            if not server.reachable:
+                self.assertEquals(row[3:5], ["Timed", "out"])
+            else:
+                self.assertEquals(row[3], str(server.online))
+
+        # rows are printed as they become known
+        self.assertTrue(rows[0][0] < end - PROBE_TIMEOUT)
+
+    ###########################################################################
+    def test_no_probe(self):
+        start, end, rows = self.list_servers(noProbe=True)
+
+        self.assertEquals([row for _, row in rows],
+                          [[server.id, "stand-in", server.id,
+                            server.get_address_display()]
+                           for server in self.servers])
+        self.assertEquals(sum(server.probes for server in self.servers), 0)
+
+# booty
+if __name__ == '__main__':
+    unittest.main()
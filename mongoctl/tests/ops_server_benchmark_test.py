@@ -0,0 +1,189 @@
+# The MIT License
+
+# Copyright (c) 2012 ObjectLabs Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+__author__ = 'richardxx'
+
+import unittest
+import threading
+import time
+import json
+import urllib
+import urllib2
+
+import mongoctl.mongoctl as mongoctl_main
+from mongoctl.tests.standin import StandinMongodProcess
+
+try:
+    import ops_server
+    from werkzeug.serving import make_server
+except ImportError:
+    ops_server = None
+
+###############################################################################
+# Constants
+###############################################################################
+NUM_REQUESTS = 240
+# one out of START_EVERY requests is a start, the rest are geturi
+START_EVERY = 6
+NUM_CLIENTS = 10
+START_DELAY = 0.1
+
+###############################################################################
+def standin_execute(args):
+    """
+        Replaces mongoctl.execute(). Starts are served by stand-in mongod
+        processes that take START_DELAY seconds to start up.
+    """
+    command = args[0]
+    if command == "status":
+        return json.dumps({"connection": False})
+    elif command in ["start", "start-cluster"]:
+        mongod = StandinMongodProcess(startup_delay=START_DELAY)
+        mongod.start()
+        mongod.wait_until_ready()
+        mongod.stop()
+        return "None"
+    elif command == "print-uri":
+        return "mongodb://localhost:27017/%s" % args[1]
+
+###############################################################################
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0
+    index = int(round(pct / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+###############################################################################
+# Ops server benchmark
+###############################################################################
+@unittest.skipIf(ops_server is None, "flask is not installed")
+class OpsServerBenchmarkTest(unittest.TestCase):
+
+    ###########################################################################
+    def setUp(self):
+        self._real_execute = mongoctl_main.execute
+        mongoctl_main.execute = standin_execute
+
+    ###########################################################################
+    def tearDown(self):
+        mongoctl_main.execute = self._real_execute
+
+    ###########################################################################
+    def test_ops_server_latency(self):
+        blocking = self.run_benchmark(threaded=False, async_start=False)
+        queued = self.run_benchmark(threaded=True, async_start=True)
+
+        print "\n%-12s %-8s %6s %10s %10s" % ("MODE", "REQUEST", "COUNT",
+                                              "P50 (ms)", "P99 (ms)")
+        for mode, latencies in [("blocking", blocking), ("job-queue", queued)]:
+            for kind in ["start", "geturi"]:
+                values = sorted(latencies[kind])
+                print "%-12s %-8s %6d %10.1f %10.1f" % (
+                    mode, kind, len(values),
+                    percentile(values, 50) * 1000,
+                    percentile(values, 99) * 1000)
+
+        # one slow start must not stall geturi calls anymore
+        self.assertTrue(percentile(sorted(queued["geturi"]), 99) <
+                        percentile(sorted(blocking["geturi"]), 99))
+
+    ###########################################################################
+    def run_benchmark(self, threaded, async_start):
+        ops_server.start_worker_pools()
+        server = make_server("localhost", 0, ops_server.app,
+                             threaded=threaded)
+        server_thread = threading.Thread(target=server.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+
+        base_url = "http://localhost:%s" % server.server_port
+        latencies = {"start": [], "geturi": []}
+        job_ids = []
+        lock = threading.Lock()
+        requests = range(NUM_REQUESTS)
+
+        def client():
+            while True:
+                with lock:
+                    if not requests:
+                        return
+                    i = requests.pop()
+
+                plan_name = "plan%d" % (i % 20)
+                if i % START_EVERY == 0:
+                    kind = "start"
+                    params = {"plan_name": plan_name, "plan_type": "servers"}
+                    if async_start:
+                        params["async"] = "true"
+                    url = base_url + "/op-start"
+                else:
+                    kind = "geturi"
+                    params = {"plan_name": plan_name}
+                    url = base_url + "/op-geturi"
+
+                started = time.time()
+                response = urllib2.urlopen(url, urllib.urlencode(params)).read()
+                latency = time.time() - started
+
+                with lock:
+                    latencies[kind].append(latency)
+                    if kind == "start" and async_start:
+                        job_ids.append(json.loads(response)["jobId"])
+
+                if kind == "geturi":
+                    self.assertEquals(response,
+                                      "mongodb://localhost:27017/%s" %
+                                      plan_name)
+                elif not async_start:
+                    self.assertEquals(response, "ok")
+
+        try:
+            clients = [threading.Thread(target=client)
+                       for i in range(NUM_CLIENTS)]
+            map(lambda c: c.start(), clients)
+            map(lambda c: c.join(), clients)
+
+            # all queued jobs have to finish successfully
+            for job_id in job_ids:
+                self.assertEquals(self.wait_for_job(base_url, job_id), "done")
+        finally:
+            server.shutdown()
+            ops_server.stop_worker_pools()
+
+        return latencies
+
+    ###########################################################################
+    def wait_for_job(self, base_url, job_id, timeout=60):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            job = json.loads(urllib2.urlopen("%s/jobs/%s" %
+                                             (base_url, job_id)).read())
+            if job["state"] in [ops_server.JOB_DONE, ops_server.JOB_FAILED]:
+                return job["state"]
+            time.sleep(0.05)
+
+        self.fail("Timed out waiting for job '%s'" % job_id)
+
+# booty
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,221 @@
+# The MIT License
+
+# Copyright (c) 2012 ObjectLabs Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+__author__ = 'richardxx'
+
+import unittest
+import threading
+import time
+import json
+import httplib
+import urllib2
+
+import mongoctl.mongoctl as mongoctl_main
+
+try:
+    import ops_server
+    from werkzeug.serving import make_server
+except ImportError:
+    ops_server = None
+
+###############################################################################
+# Constants
+###############################################################################
+NUM_PLANS = 5
+NUM_SUBSCRIBERS = 10
+POLL_INTERVAL = 0.2
+
+###############################################################################
+class StandInStatuses(object):
+    """
+        Replaces mongoctl.execute(): answers status commands with replica set
+        statuses that the test can change, and counts them.
+    """
+
+    ###########################################################################
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.states = {}
+        self.status_calls = 0
+
+    ###########################################################################
+    def execute(self, args):
+        if args[0] != "status":
+            return "Error"
+        with self.lock:
+            self.status_calls += 1
+            state = self.states.get(args[1], "PRIMARY")
+        return json.dumps({
+            "primary": {"address": "%s_0:27017" % args[1],
+                        "stateStr": state},
+            "otherMembers": [{"address": "%s_1:27017" % args[1],
+                              "stateStr": "SECONDARY",
+                              "replLag": {"value": 0}}]
+        })
+
+###############################################################################
+# Ops server status tests
+###############################################################################
+@unittest.skipIf(ops_server is None, "flask is not installed")
+class OpsServerStatusTest(unittest.TestCase):
+
+    ###########################################################################
+    def setUp(self):
+        self.statuses = StandInStatuses()
+        self._real_execute = mongoctl_main.execute
+        mongoctl_main.execute = self.statuses.execute
+
+        self.poller = ops_server.StatusPoller(POLL_INTERVAL, 60, 5, 8)
+        self.poller.start()
+        setattr(ops_server, "__status_poller", self.poller)
+
+        self.server = make_server("localhost", 0, ops_server.app,
+                                  threaded=True)
+        server_thread = threading.Thread(target=self.server.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+        self.base_url = "http://localhost:%s" % self.server.server_port
+        self._streams = []
+
+    ###########################################################################
+    def tearDown(self):
+        # stopping the poller ends the streams
+        ops_server.stop_status_poller()
+        for stream in self._streams:
+            stream.read()
+            stream.close()
+        self.server.shutdown()
+        mongoctl_main.execute = self._real_execute
+
+    ###########################################################################
+    def plan_names(self):
+        return ["rs%d" % i for i in range(NUM_PLANS)]
+
+    ###########################################################################
+    def test_status(self):
+        url = "%s/status?plans=%s" % (self.base_url,
+                                      ",".join(self.plan_names()))
+        statuses = json.loads(urllib2.urlopen(url).read())
+        self.assertEquals(sorted(statuses.keys()), self.plan_names())
+        self.assertEquals(statuses["rs0"]["primary"]["stateStr"], "PRIMARY")
+
+        # answered from the poller, not by asking again
+        calls = self.statuses.status_calls
+        for i in range(5):
+            urllib2.urlopen(url).read()
+        self.assertTrue(self.statuses.status_calls <= calls + NUM_PLANS)
+
+    ###########################################################################
+    def test_watch(self):
+        streams = [self.open_watch_stream(self.plan_names())
+                   for i in range(NUM_SUBSCRIBERS)]
+        start = time.time()
+
+        for stream in streams:
+            events = [self.read_event(stream) for i in range(NUM_PLANS)]
+            self.assertEquals(sorted(event["plan"] for event in events),
+                              self.plan_names())
+            for event in events:
+                self.assertTrue("status" in event)
+
+        with self.statuses.lock:
+            self.statuses.states["rs3"] = "SECONDARY"
+
+        for stream in streams:
+            self.assertEquals(self.read_event(stream),
+                              {"plan": "rs3",
+                               "changes": {"primary.stateStr": "SECONDARY"}})
+
+        # one poll of each plan per interval, whatever the subscribers
+        polls = (time.time() - start) / POLL_INTERVAL + 2
+        self.assertTrue(self.statuses.status_calls <= polls * NUM_PLANS)
+
+    ###########################################################################
+    def open_watch_stream(self, plan_names):
+        # unlike urllib2 responses, httplib ones can be read line by line
+        # as the events come
+        connection = httplib.HTTPConnection("localhost",
+                                            self.server.server_port)
+        connection.request("GET", "/status/watch?plans=%s" %
+                                  ",".join(plan_names))
+        response = connection.getresponse()
+        self._streams.append(response)
+        self.assertEquals(response.getheader("Content-Type"),
+                          "text/event-stream; charset=utf-8")
+        return response
+
+    ###########################################################################
+    def read_event(self, stream):
+        event_type = None
+        while True:
+            line = stream.fp.readline().rstrip("\n")
+            if line.startswith("event: "):
+                event_type = line[len("event: "):]
+            elif line.startswith("data: "):
+                self.assertEquals(event_type, "status")
+                return json.loads(line[len("data: "):])
+
+    ###########################################################################
+    def test_diff_status(self):
+        old = {"a": 1, "b": {"c": [1, {"d": 2}]}, "gone": True}
+        new = {"a": 1, "b": {"c": [1, {"d": 3}, 4]}, "new": "x"}
+        self.assertEquals(ops_server.diff_status(old, new),
+                          {"b.c.1.d": 3, "b.c.2": 4, "gone": None,
+                           "new": "x"})
+
+###############################################################################
+# Ops server job tests
+###############################################################################
+@unittest.skipIf(ops_server is None, "flask is not installed")
+class OpsServerJobTest(unittest.TestCase):
+
+    ###########################################################################
+    def tearDown(self):
+        ops_server.stop_worker_pools()
+
+    ###########################################################################
+    def test_interrupted_job(self):
+        def interrupted():
+            raise KeyboardInterrupt()
+
+        job = ops_server.submit_job("start", interrupted)
+        # the job still gets a final state
+        self.assertEquals(ops_server.wait_for_job(job, timeout=5), "fail")
+        self.assertEquals(job["state"], ops_server.JOB_FAILED)
+        self.assertTrue(job["finished"] is not None)
+
+    ###########################################################################
+    def test_wait_timeout(self):
+        release = threading.Event()
+        job = ops_server.submit_job("start", release.wait)
+        self.assertEquals(ops_server.wait_for_job(job, timeout=0.1), "fail")
+        self.assertEquals(job["state"], ops_server.JOB_RUNNING)
+
+        release.set()
+        self.assertEquals(ops_server.wait_for_job(job, timeout=5), True)
+        self.assertEquals(job["state"], ops_server.JOB_DONE)
+
+# booty
+if __name__ == '__main__':
+    unittest.main()
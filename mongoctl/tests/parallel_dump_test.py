@@ -0,0 +1,230 @@
+# The MIT License
+
+# Copyright (c) 2012 ObjectLabs Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+
+__author__ = 'richardxx'
+
+import unittest
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+
+from mongoctl.commands.common import dump
+from mongoctl.errors import MongoctlException
+
+###############################################################################
+# Constants
+###############################################################################
+NUM_DATABASES = 4
+COLLECTIONS_PER_DATABASE = 16
+NUM_WORKERS = 8
+# seconds a stand-in mongodump takes per KB of collection
+DUMP_SECONDS_PER_KB = 0.025
+
+# a mongodump that writes <out>/<db>/<collection>.bson, taking a time
+# proportional to the size given in the collection name
+STANDIN_MONGODUMP = """#!%s
+import os, sys, time
+args = sys.argv[1:]
+db = args[args.index("-d") + 1]
+collection = args[args.index("--collection") + 1]
+out = args[args.index("--out") + 1]
+if collection.startswith("broken"):
+    sys.exit(1)
+size = int(collection.split("_")[-1])
+time.sleep(size / 1024.0 * %s)
+path = os.path.join(out, db)
+if not os.path.isdir(path):
+    try:
+        os.makedirs(path)
+    except OSError:
+        pass
+f = open(os.path.join(path, collection + ".bson"), "w")
+f.write("x" * size)
+f.close()
+"""
+
+###############################################################################
+class StandInDb(object):
+
+    ###########################################################################
+    def __init__(self, name, collections):
+        self.name = name
+        self.collections = collections
+
+    ###########################################################################
+    def collection_names(self):
+        return self.collections.keys() + ["system.indexes"]
+
+    ###########################################################################
+    def command(self, command, value=None):
+        if command == "listDatabases":
+            return {"databases": [{"name": name} for name in
+                                  ["local"] + ["db%d" % i for i in
+                                               range(NUM_DATABASES)]]}
+        elif command == "collStats":
+            return {"size": self.collections[value], "count": 1}
+
+###############################################################################
+class StandInServer(object):
+    """
+        A server with NUM_DATABASES databases of COLLECTIONS_PER_DATABASE
+        collections named after their size.
+    """
+
+    ###########################################################################
+    def __init__(self, broken=False):
+        self.id = "standin"
+        self.dbs = {}
+        for i in range(NUM_DATABASES):
+            collections = {}
+            for j in range(COLLECTIONS_PER_DATABASE):
+                size = 1024 * (j % 4 + 1)
+                collections["coll%d_%d" % (j, size)] = size
+            if broken and i == 0:
+                collections["broken_1"] = 1
+            self.dbs["db%d" % i] = StandInDb("db%d" % i, collections)
+        self.dbs["admin"] = StandInDb("admin", {})
+
+    ###########################################################################
+    def get_db(self, dbname, username=None, password=None):
+        return self.dbs[dbname]
+
+    ###########################################################################
+    def get_connection_host_address(self):
+        return "localhost"
+
+    ###########################################################################
+    def get_port(self):
+        return 27017
+
+    ###########################################################################
+    def get_mongo_version(self):
+        return "2.6.0"
+
+###############################################################################
+# Parallel dump tests
+###############################################################################
+class ParallelDumpTest(unittest.TestCase):
+
+    ###########################################################################
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        mongodump = os.path.join(self.temp_dir, "mongodump")
+        script = open(mongodump, "w")
+        script.write(STANDIN_MONGODUMP % (sys.executable,
+                                          DUMP_SECONDS_PER_KB))
+        script.close()
+        os.chmod(mongodump, stat.S_IRWXU)
+
+        self._saved_get_executable = dump.get_mongo_dump_executable
+        dump.get_mongo_dump_executable = lambda version: mongodump
+
+    ###########################################################################
+    def tearDown(self):
+        dump.get_mongo_dump_executable = self._saved_get_executable
+        shutil.rmtree(self.temp_dir)
+
+    ###########################################################################
+    def run_dump(self, server, parallel, out_name, **kwargs):
+        out = os.path.join(self.temp_dir, out_name)
+        start_time = time.time()
+        dump.mongo_parallel_dump_server(server, dump_options={"out": out},
+                                        parallel=parallel, **kwargs)
+        return out, time.time() - start_time
+
+    ###########################################################################
+    def test_parallel_dump(self):
+        server = StandInServer()
+        serial_out, serial_time = self.run_dump(server, 1, "serial")
+        out, parallel_time = self.run_dump(server, NUM_WORKERS, "parallel")
+
+        print ("Dumping %s collections: serially %.2f second(s), %s at a "
+               "time %.2f second(s)" %
+               (NUM_DATABASES * COLLECTIONS_PER_DATABASE, serial_time,
+                NUM_WORKERS, parallel_time))
+        self.assertTrue(parallel_time < serial_time / 2)
+
+        # the usual mongodump layout, without the local db
+        self.assertEquals(sorted(os.listdir(out)),
+                          ["db%d" % i for i in range(NUM_DATABASES)] +
+                          [dump.DUMP_MANIFEST_FILE_NAME])
+        for db in server.dbs.values():
+            for collection, size in db.collections.items():
+                path = os.path.join(out, db.name, collection + ".bson")
+                self.assertEquals(os.path.getsize(path), size)
+
+        manifest = json.load(open(os.path.join(
+            out, dump.DUMP_MANIFEST_FILE_NAME)))
+        self.assertEquals(manifest["server"], "standin")
+        self.assertEquals(manifest["parallel"], NUM_WORKERS)
+        collections = manifest["collections"]
+        self.assertEquals(len(collections),
+                          NUM_DATABASES * COLLECTIONS_PER_DATABASE)
+        # largest first
+        self.assertEquals(collections[0]["size"], 4096)
+        self.assertEquals(collections[-1]["size"], 1024)
+        for collection in collections:
+            self.assertEquals(collection["dumpedSize"], collection["size"])
+            self.assertTrue(collection["duration"] > 0)
+            self.assertEquals(collection["error"], None)
+
+    ###########################################################################
+    def test_single_database(self):
+        out, duration = self.run_dump(StandInServer(), NUM_WORKERS, "single",
+                                      database="db1")
+        self.assertEquals(sorted(os.listdir(out)),
+                          ["db1", dump.DUMP_MANIFEST_FILE_NAME])
+        self.assertEquals(len(os.listdir(os.path.join(out, "db1"))),
+                          COLLECTIONS_PER_DATABASE)
+
+    ###########################################################################
+    def test_failed_collection(self):
+        server = StandInServer(broken=True)
+        self.assertRaises(MongoctlException, self.run_dump, server,
+                          NUM_WORKERS, "broken")
+
+        # the manifest tells what failed
+        manifest = json.load(open(os.path.join(
+            self.temp_dir, "broken", dump.DUMP_MANIFEST_FILE_NAME)))
+        failed = [collection for collection in manifest["collections"]
+                  if collection["error"]]
+        self.assertEquals([c["collection"] for c in failed], ["broken_1"])
+
+    ###########################################################################
+    def test_unsupported_options(self):
+        self.assertRaises(MongoctlException,
+                          dump.mongo_parallel_dump_server, StandInServer(),
+                          dump_options={"oplog": True}, parallel=2)
+        self.assertRaises(MongoctlException,
+                          dump.mongo_parallel_dump_server, StandInServer(),
+                          dump_options={"out": "-"}, parallel=2)
+
+# booty
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,324 @@
+# The MIT License
+
+# Copyright (c) 2012 ObjectLabs Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+
+__author__ = 'richardxx'
+
+import unittest
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+
+from mongoctl.commands.common import restore
+from mongoctl.errors import MongoctlException
+
+###############################################################################
+# Constants
+###############################################################################
+NUM_DATABASES = 4
+COLLECTIONS_PER_DATABASE = 16
+NUM_WORKERS = 8
+# seconds a stand-in mongorestore takes per KB of bson
+RESTORE_SECONDS_PER_KB = 0.025
+
+# a mongorestore that takes a time proportional to the size of the bson file
+# and marks the collection restored in <its dir>/restored, writing the
+# database it logged in against if any
+STANDIN_MONGORESTORE = """#!%s
+import os, sys, time
+args = sys.argv[1:]
+assert "--noIndexRestore" in args
+db = args[args.index("-d") + 1]
+collection = args[args.index("-c") + 1]
+if collection.startswith("broken"):
+    sys.exit(1)
+auth_db = ""
+if "-u" in args:
+    auth_db = db
+    if "--authenticationDatabase" in args:
+        auth_db = args[args.index("--authenticationDatabase") + 1]
+time.sleep(os.path.getsize(args[-1]) / 1024.0 * %s)
+restored = open(os.path.join(os.path.dirname(sys.argv[0]), "restored",
+                             "%%s.%%s" %% (db, collection)), "w")
+restored.write(auth_db)
+restored.close()
+"""
+
+# the metadata of a collection with a compound index whose key order matters
+COMPOUND_INDEX_METADATA = """{"indexes": [
+    {"v": 1, "key": {"_id": 1}, "name": "_id_", "ns": "db0.coll0"},
+    {"v": 1, "key": {"z": 1, "a": 1, "m": -1, "b": 1},
+     "name": "z_1_a_1_m_-1_b_1", "ns": "db0.coll0"}]}"""
+
+###############################################################################
+class StandInCollection(object):
+
+    ###########################################################################
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+
+    ###########################################################################
+    def create_index(self, key_or_list, **kwargs):
+        # what pymongo does for servers without createIndexes
+        index = dict(kwargs, key=key_or_list)
+        self.db.server.indexes.setdefault(
+            "%s.%s" % (self.db.name, self.name), []).append(index)
+
+###############################################################################
+class StandInConnection(object):
+
+    ###########################################################################
+    def __init__(self, server):
+        self.server = server
+
+    ###########################################################################
+    def __getitem__(self, name):
+        return StandInDb(name, self.server)
+
+###############################################################################
+class StandInDb(object):
+
+    ###########################################################################
+    def __init__(self, name, server):
+        self.name = name
+        self.server = server
+        self.connection = StandInConnection(server)
+
+    ###########################################################################
+    def __getitem__(self, name):
+        return StandInCollection(self, name)
+
+    ###########################################################################
+    def command(self, command, value=None, indexes=None):
+        assert command == "createIndexes"
+        assert self.server.version >= "2.6"
+        # indexes are built once all the data is loaded
+        self.server.restored_before_indexes.append(
+            len(os.listdir(self.server.restored_dir)))
+        self.server.indexes["%s.%s" % (self.name, value)] = indexes
+
+###############################################################################
+class StandInServer(object):
+
+    ###########################################################################
+    def __init__(self, restored_dir, version="2.6.0"):
+        self.id = "standin"
+        self.version = version
+        self.restored_dir = restored_dir
+        self.restored_before_indexes = []
+        self.indexes = {}
+        # (database, username) of each get_db()
+        self.logins = []
+
+    ###########################################################################
+    def get_db(self, dbname, username=None, password=None):
+        self.logins.append((dbname, username))
+        return StandInDb(dbname, self)
+
+    ###########################################################################
+    def get_connection_host_address(self):
+        return "localhost"
+
+    ###########################################################################
+    def get_port(self):
+        return 27017
+
+    ###########################################################################
+    def get_mongo_version(self):
+        return self.version
+
+###############################################################################
+# Parallel restore tests
+###############################################################################
+class ParallelRestoreTest(unittest.TestCase):
+
+    ###########################################################################
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        bin_dir = os.path.join(self.temp_dir, "bin")
+        self.restored_dir = os.path.join(bin_dir, "restored")
+        os.makedirs(self.restored_dir)
+        mongorestore = os.path.join(bin_dir, "mongorestore")
+        script = open(mongorestore, "w")
+        script.write(STANDIN_MONGORESTORE % (sys.executable,
+                                             RESTORE_SECONDS_PER_KB))
+        script.close()
+        os.chmod(mongorestore, stat.S_IRWXU)
+
+        self._saved_get_executable = restore.get_mongo_restore_executable
+        restore.get_mongo_restore_executable = lambda version: mongorestore
+
+        self.dump_dir = os.path.join(self.temp_dir, "dump")
+        self.write_dump(self.dump_dir)
+
+    ###########################################################################
+    def tearDown(self):
+        restore.get_mongo_restore_executable = self._saved_get_executable
+        shutil.rmtree(self.temp_dir)
+
+    ###########################################################################
+    def write_dump(self, dump_dir):
+        """
+            NUM_DATABASES databases of COLLECTIONS_PER_DATABASE collections
+            with one index besides _id's
+        """
+        for i in range(NUM_DATABASES):
+            db_dir = os.path.join(dump_dir, "db%d" % i)
+            os.makedirs(db_dir)
+            for j in range(COLLECTIONS_PER_DATABASE):
+                collection = "coll%d" % j
+                bson = open(os.path.join(db_dir, collection + ".bson"), "w")
+                bson.write("x" * 1024 * (j % 4 + 1))
+                bson.close()
+                ns = "db%d.%s" % (i, collection)
+                metadata = {"indexes": [
+                    {"v": 1, "key": {"_id": 1}, "name": "_id_", "ns": ns},
+                    {"v": 1, "key": {"a": 1}, "name": "a_1", "ns": ns,
+                     "unique": True}]}
+                metadata_file = open(os.path.join(
+                    db_dir, collection + ".metadata.json"), "w")
+                json.dump(metadata, metadata_file)
+                metadata_file.close()
+            open(os.path.join(db_dir, "system.indexes.bson"), "w").close()
+        open(os.path.join(dump_dir, "dump-manifest.json"), "w").close()
+
+    ###########################################################################
+    def run_restore(self, parallel, version="2.6.0", **kwargs):
+        for name in os.listdir(self.restored_dir):
+            os.remove(os.path.join(self.restored_dir, name))
+        server = StandInServer(self.restored_dir, version=version)
+        start_time = time.time()
+        collection_restores = restore.mongo_parallel_restore_server(
+            server, self.dump_dir, parallel=parallel, **kwargs)
+        return server, collection_restores, time.time() - start_time
+
+    ###########################################################################
+    def test_parallel_restore(self):
+        num_collections = NUM_DATABASES * COLLECTIONS_PER_DATABASE
+        serial_server, results, serial_time = self.run_restore(1)
+        server, collection_restores, parallel_time = self.run_restore(
+            NUM_WORKERS)
+
+        print ("Restoring %s collections: serially %.2f second(s), %s at a "
+               "time %.2f second(s)" %
+               (num_collections, serial_time, NUM_WORKERS, parallel_time))
+        self.assertTrue(parallel_time < serial_time / 2)
+
+        # every collection restored, largest first, without system.indexes
+        self.assertEquals(len(os.listdir(self.restored_dir)),
+                          num_collections)
+        self.assertEquals(len(collection_restores), num_collections)
+        self.assertEquals(collection_restores[0].size, 4096)
+        self.assertEquals(collection_restores[-1].size, 1024)
+        for collection_restore in collection_restores:
+            self.assertTrue(collection_restore.get_throughput() > 0)
+            self.assertEquals(collection_restore.index_count, 1)
+
+        # indexes built once all collections were restored
+        self.assertEquals(server.restored_before_indexes,
+                          [num_collections] * num_collections)
+        self.assertEquals(server.indexes["db0.coll1"],
+                          [{"key": {"a": 1}, "name": "a_1", "unique": True}])
+
+    ###########################################################################
+    def test_single_database(self):
+        self.dump_dir = os.path.join(self.dump_dir, "db2")
+        server, collection_restores, duration = self.run_restore(
+            NUM_WORKERS, database="target", restore_options={
+                "keepIndexVersion": True})
+
+        self.assertEquals(sorted(os.listdir(self.restored_dir)),
+                          sorted("target.coll%d" % j for j in
+                                 range(COLLECTIONS_PER_DATABASE)))
+        self.assertEquals(server.indexes["target.coll0"][0]["v"], 1)
+
+    ###########################################################################
+    def test_username(self):
+        self.dump_dir = os.path.join(self.dump_dir, "db2")
+        server, collection_restores, duration = self.run_restore(
+            NUM_WORKERS, database="target", username="admin_user",
+            password="secret")
+
+        # mongorestores and index builds log in through admin
+        for name in os.listdir(self.restored_dir):
+            self.assertEquals(open(os.path.join(self.restored_dir,
+                                                name)).read(), "admin")
+        self.assertEquals(set(server.logins), set([("admin", "admin_user")]))
+        self.assertEquals(len(server.indexes), COLLECTIONS_PER_DATABASE)
+
+        # unless told otherwise
+        server, collection_restores, duration = self.run_restore(
+            NUM_WORKERS, database="target", username="target_user",
+            password="secret",
+            restore_options={"authenticationDatabase": "target"})
+        for name in os.listdir(self.restored_dir):
+            self.assertEquals(open(os.path.join(self.restored_dir,
+                                                name)).read(), "target")
+        self.assertEquals(set(server.logins),
+                          set([("target", "target_user")]))
+
+    ###########################################################################
+    def test_compound_index(self):
+        metadata_file = open(os.path.join(self.dump_dir, "db0",
+                                          "coll0.metadata.json"), "w")
+        metadata_file.write(COMPOUND_INDEX_METADATA)
+        metadata_file.close()
+
+        server, collection_restores, duration = self.run_restore(NUM_WORKERS)
+        self.assertEquals(server.indexes["db0.coll0"][0]["key"].items(),
+                          [("z", 1), ("a", 1), ("m", -1), ("b", 1)])
+
+        # without createIndexes, the indexes are created one by one
+        server, collection_restores, duration = self.run_restore(
+            NUM_WORKERS, version="2.4.6")
+        self.assertEquals(server.indexes["db0.coll0"],
+                          [{"key": [("z", 1), ("a", 1), ("m", -1), ("b", 1)],
+                            "name": "z_1_a_1_m_-1_b_1"}])
+        self.assertEquals(server.indexes["db0.coll1"],
+                          [{"key": [("a", 1)], "name": "a_1",
+                            "unique": True}])
+
+    ###########################################################################
+    def test_failed_collection(self):
+        open(os.path.join(self.dump_dir, "db0", "broken.bson"), "w").close()
+        self.assertRaises(MongoctlException, self.run_restore, NUM_WORKERS)
+        # the other collections are restored and indexed
+        self.assertEquals(len(os.listdir(self.restored_dir)),
+                          NUM_DATABASES * COLLECTIONS_PER_DATABASE)
+
+    ###########################################################################
+    def test_unsupported_options(self):
+        self.assertRaises(MongoctlException, self.run_restore, NUM_WORKERS,
+                          restore_options={"oplogReplay": True})
+        self.dump_dir = os.path.join(self.temp_dir, "dump.archive.gz")
+        self.assertRaises(MongoctlException, self.run_restore, NUM_WORKERS)
+
+# booty
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,285 @@
+# The MIT License
+
+# Copyright (c) 2012 ObjectLabs Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+__author__ = 'richardxx'
+
+import unittest
+import os
+import threading
+import time
+
+import mongoctl.config as config
+from mongoctl.parallel import fan_out, fan_out_first, fan_out_iter
+from mongoctl.context import execution_context, get_context
+from mongoctl.objects.replicaset_cluster import ReplicaSetCluster
+
+TESTING_CONF_DIR = os.path.join(os.path.dirname(__file__), "testing_conf")
+
+###############################################################################
+# Constants
+###############################################################################
+MEMBER_TIMEOUT = 0.5
+
+# how long an offline member takes to fail
+OFFLINE_DELAY = 3
+
+###############################################################################
+class StandInServer(object):
+    """
+        Stands in for a replica set member server.
+    """
+
+    ###########################################################################
+    def __init__(self, id, primary=False, online=True):
+        self.id = id
+        self.primary = primary
+        self.online = online
+
+    ###########################################################################
+    def wait_for_connection(self):
+        if not self.online:
+            time.sleep(OFFLINE_DELAY)
+            raise Exception("timed out")
+
+    ###########################################################################
+    def is_primary(self):
+        self.wait_for_connection()
+        return self.primary
+
+    ###########################################################################
+    def get_status(self):
+        self.wait_for_connection()
+        return {"connection": True}
+
+###############################################################################
+# Parallel status tests
+###############################################################################
+class ParallelTest(unittest.TestCase):
+
+    ###########################################################################
+    def setUp(self):
+        self._context = execution_context()
+        self._context.__enter__()
+        config._set_config_root(TESTING_CONF_DIR)
+        config.set_mongoctl_config_val("memberTimeout", MEMBER_TIMEOUT)
+
+    ###########################################################################
+    def tearDown(self):
+        self._context.__exit__(None, None, None)
+        config.__mongo_configs__.pop(TESTING_CONF_DIR, None)
+
+    ###########################################################################
+    def new_cluster(self, servers):
+        cluster = ReplicaSetCluster({
+            "_id": "rs",
+            "members": [{"host": "host%d:27017" % i}
+                        for i in range(len(servers))]})
+        for member, server in zip(cluster.get_members(), servers):
+            member._server = server
+        return cluster
+
+    ###########################################################################
+    def test_offline_members_do_not_add_up(self):
+        servers = [StandInServer("node%d" % i, online=i not in (1, 2))
+                   for i in range(7)]
+        servers[6].primary = True
+        cluster = self.new_cluster(servers)
+
+        start = time.time()
+        self.assertTrue(cluster.get_primary_member().get_server() is
+                        servers[6])
+        results = fan_out(lambda member: member.get_server().get_status(),
+                          cluster.get_members())
+        self.assertTrue(time.time() - start < OFFLINE_DELAY)
+
+        # partial results
+        self.assertEquals([result.done for result in results],
+                          [True, False, False, True, True, True, True])
+        self.assertEquals([result.timed_out for result in results],
+                          [False, True, True, False, False, False, False])
+
+    ###########################################################################
+    def test_members_status(self):
+        servers = [StandInServer("node0"), StandInServer("node1")]
+        servers[1].get_status = lambda: 1 / 0
+        cluster = self.new_cluster(servers)
+
+        status = cluster.get_status()
+        self.assertEquals(status["primary"], None)
+        self.assertEquals(status["members"][0],
+                          {"server": "node0", "connection": True})
+        self.assertEquals(status["members"][1]["connection"], False)
+        self.assertTrue("division" in status["members"][1]["error"])
+
+    ###########################################################################
+    def test_fan_out_first(self):
+        def wait_and_return(item):
+            time.sleep(item / 10.0)
+            return item > 1
+
+        start = time.time()
+        self.assertEquals(fan_out_first(wait_and_return, [50, 2, 1, 0],
+                                        timeout=10), 2)
+        self.assertTrue(time.time() - start < 1)
+        self.assertEquals(fan_out_first(wait_and_return, [0, 1], timeout=10),
+                          None)
+
+    ###########################################################################
+    def test_max_workers(self):
+        running = []
+        max_running = []
+        lock = threading.Lock()
+
+        def run(item):
+            with lock:
+                running.append(item)
+                max_running.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(item)
+            return item * 2
+
+        results = fan_out(run, range(20), timeout=10, max_workers=4)
+        self.assertEquals([result.value for result in results],
+                          [i * 2 for i in range(20)])
+        self.assertTrue(max(max_running) <= 4)
+
+    ###########################################################################
+    def test_fan_out_iter(self):
+        taken = []
+
+        def items():
+            for i in range(1000):
+                taken.append(i)
+                yield i
+
+        def run(item):
+            # every 100th item never answers in time
+            if item % 100 == 99:
+                time.sleep(OFFLINE_DELAY)
+            return item * 2
+
+        start = time.time()
+        results = fan_out_iter(run, items(), timeout=MEMBER_TIMEOUT,
+                               max_workers=20, max_pending=200)
+        first = results.next()
+        # items are taken as needed
+        self.assertTrue(len(taken) <= 200)
+        results = [first] + list(results)
+        self.assertTrue(time.time() - start < OFFLINE_DELAY)
+
+        # in order, slow items reported as timed out
+        self.assertEquals([result.item for result in results], range(1000))
+        for result in results:
+            if result.item % 100 == 99:
+                self.assertTrue(result.timed_out)
+            else:
+                self.assertEquals(result.value, result.item * 2)
+
+    ###########################################################################
+    def test_timed_out_calls_hold_workers(self):
+        def new_run():
+            running = []
+            max_running = [0]
+            lock = threading.Lock()
+
+            def run(item):
+                with lock:
+                    running.append(item)
+                    max_running[0] = max(max_running[0], len(running))
+                # items under 10 answer after item seconds
+                time.sleep(item if item < 10 else 0.01)
+                with lock:
+                    running.remove(item)
+                return item
+            return run, max_running
+
+        # the other items wait for the timed out calls to return
+        delay = MEMBER_TIMEOUT * 1.5
+        run, max_running = new_run()
+        results = fan_out(run, [delay, delay] + range(10, 20),
+                          timeout=MEMBER_TIMEOUT, max_workers=2)
+        self.assertEquals([result.timed_out for result in results],
+                          [True, True] + [False] * 10)
+        self.assertEquals([result.value for result in results[2:]],
+                          range(10, 20))
+        self.assertEquals(max_running, [2])
+
+        # or give up once they held every worker for a timeout
+        run, max_running = new_run()
+        start = time.time()
+        results = fan_out(run, [OFFLINE_DELAY, OFFLINE_DELAY] + range(10, 20),
+                          timeout=MEMBER_TIMEOUT, max_workers=2)
+        self.assertTrue(time.time() - start < OFFLINE_DELAY)
+        self.assertTrue(all(result.timed_out for result in results))
+        self.assertFalse(any(result.done for result in results))
+        self.assertEquals(max_running, [2])
+
+        run, max_running = new_run()
+        start = time.time()
+        results = list(fan_out_iter(run, [OFFLINE_DELAY, OFFLINE_DELAY] +
+                                    range(10, 20), timeout=MEMBER_TIMEOUT,
+                                    max_workers=2))
+        self.assertTrue(time.time() - start < OFFLINE_DELAY)
+        self.assertTrue(all(result.timed_out for result in results))
+        self.assertEquals(max_running, [2])
+
+    ###########################################################################
+    def test_system_exit(self):
+        def run(item):
+            if item == 1:
+                # like exit(1) on a failed server start
+                exit(1)
+            return item
+
+        outcome = []
+
+        def call_fan_outs():
+            outcome.append(fan_out(run, range(3), timeout=0, max_workers=3))
+            outcome.append(list(fan_out_iter(run, range(3), timeout=0,
+                                             max_workers=3)))
+
+        # without deadlines, a call that never reports back hangs for ever
+        thread = threading.Thread(target=call_fan_outs)
+        thread.daemon = True
+        thread.start()
+        thread.join(10)
+        self.assertEquals(len(outcome), 2)
+        for results in outcome:
+            self.assertEquals([result.value for result in results],
+                              [0, None, 2])
+            self.assertTrue(isinstance(results[1].error, SystemExit))
+            self.assertTrue(all(result.done for result in results))
+
+    ###########################################################################
+    def test_context_propagation(self):
+        with execution_context() as context:
+            config._set_config_root(TESTING_CONF_DIR)
+            results = fan_out(lambda item: get_context(), range(5),
+                              timeout=10)
+        self.assertTrue(all(result.value is context for result in results))
+
+# booty
+if __name__ == '__main__':
+    unittest.main()
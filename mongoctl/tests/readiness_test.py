@@ -0,0 +1,188 @@
+# The MIT License
+
+# Copyright (c) 2012 ObjectLabs Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+__author__ = 'richardxx'
+
+import unittest
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+from mongoctl import readiness
+from mongoctl.errors import MongoctlException
+from mongoctl.readiness import (
+    LogWatcher, new_server_log_watcher, wait_for_server_ready
+)
+
+###############################################################################
+class StandInServer(object):
+    """
+        Stands in for a server being started: it goes online at online_at
+        and counts how many times it was asked.
+    """
+
+    ###########################################################################
+    def __init__(self, log_path, port, online_at=None):
+        self.id = "standin"
+        self.log_path = log_path
+        self.port = port
+        self.online_at = online_at
+        self.probes = 0
+
+    ###########################################################################
+    def get_log_file_path(self):
+        return self.log_path
+
+    ###########################################################################
+    def get_port(self):
+        return self.port
+
+    ###########################################################################
+    def is_online(self):
+        self.probes += 1
+        return self.online_at is not None and time.time() >= self.online_at
+
+###############################################################################
+def get_free_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("localhost", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+###############################################################################
+# Readiness tests
+###############################################################################
+class ReadinessTest(unittest.TestCase):
+
+    ###########################################################################
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self._dir, "mongodb.log")
+        self.append_log("an old run\nwaiting for connections on port 1\n")
+        self._timers = []
+
+    ###########################################################################
+    def tearDown(self):
+        for timer in self._timers:
+            timer.cancel()
+        shutil.rmtree(self._dir)
+
+    ###########################################################################
+    def append_log(self, text):
+        log_file = open(self.log_path, "a")
+        log_file.write(text)
+        log_file.close()
+
+    ###########################################################################
+    def later(self, delay, function, *args):
+        timer = threading.Timer(delay, function, args)
+        self._timers.append(timer)
+        timer.start()
+
+    ###########################################################################
+    def test_log_watcher(self):
+        watcher = LogWatcher(self.log_path, "waiting for connections")
+        # lines logged before the watcher was created are ignored
+        self.assertFalse(watcher.check())
+
+        self.append_log("starting up\nwaiting for conn")
+        self.assertFalse(watcher.check())
+        self.append_log("ections on port 2\n")
+        self.assertTrue(watcher.check())
+
+        # a replaced log file is read from its start
+        watcher = LogWatcher(self.log_path, "waiting for connections")
+        os.rename(self.log_path, self.log_path + ".old")
+        self.append_log("waiting for connections on port 3\n")
+        self.assertTrue(watcher.check())
+
+    ###########################################################################
+    def test_ready_on_log_line(self):
+        server = StandInServer(self.log_path, get_free_port())
+        log_watcher = new_server_log_watcher(server)
+
+        def go_online():
+            server.online_at = time.time()
+            self.append_log("waiting for connections on port %s\n" %
+                            server.port)
+
+        self.later(0.6, go_online)
+        start = time.time()
+        self.assertTrue(wait_for_server_ready(server, os.getpid(), timeout=10,
+                                              log_watcher=log_watcher))
+        self.assertTrue(time.time() - start < 1.2)
+        # not one probe per watch interval
+        self.assertTrue(server.probes <= 4)
+
+    ###########################################################################
+    def test_ready_on_port(self):
+        server = StandInServer(self.log_path, get_free_port())
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+        def go_online():
+            server.online_at = time.time()
+            listener.bind(("localhost", server.port))
+            listener.listen(5)
+
+        self.later(0.6, go_online)
+        start = time.time()
+        try:
+            self.assertTrue(wait_for_server_ready(server, os.getpid(),
+                                                  timeout=10))
+        finally:
+            listener.close()
+        self.assertTrue(time.time() - start < 1.2)
+
+    ###########################################################################
+    def test_probe_backoff(self):
+        # no log line and nothing listening: only probes tell
+        server = StandInServer(self.log_path, get_free_port(),
+                               online_at=time.time() + 1)
+        self.assertTrue(wait_for_server_ready(server, os.getpid(),
+                                              timeout=10))
+        self.assertTrue(server.probes <= 4)
+
+        server = StandInServer(self.log_path, get_free_port())
+        self.assertFalse(wait_for_server_ready(server, os.getpid(),
+                                               timeout=1))
+
+    ###########################################################################
+    def test_dead_process(self):
+        server = StandInServer(self.log_path, get_free_port())
+        saved_is_pid_alive = readiness.is_pid_alive
+        readiness.is_pid_alive = lambda pid: False
+        try:
+            self.assertRaises(MongoctlException, wait_for_server_ready,
+                              server, 12345, 10)
+        finally:
+            readiness.is_pid_alive = saved_is_pid_alive
+
+# booty
+if __name__ == '__main__':
+    unittest.main()
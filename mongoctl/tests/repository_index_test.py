@@ -0,0 +1,300 @@
+# The MIT License
+
+# Copyright (c) 2012 ObjectLabs Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+__author__ = 'richardxx'
+
+import unittest
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import mongoctl.config as config
+import mongoctl.repository as repository
+from mongoctl.context import execution_context
+
+###############################################################################
+# Constants
+###############################################################################
+NUM_REPLICASET_CLUSTERS = 500
+MEMBERS_PER_CLUSTER = 3
+
+###############################################################################
+def server_ref(server_id):
+    return {"$ref": "servers", "$id": server_id}
+
+###############################################################################
+def cluster_ref(cluster_id):
+    return {"$ref": "clusters", "$id": cluster_id}
+
+###############################################################################
+def make_repository_docs():
+    servers = []
+    clusters = []
+    port = 20000
+
+    for i in range(NUM_REPLICASET_CLUSTERS):
+        members = []
+        for j in range(MEMBERS_PER_CLUSTER):
+            server_id = "rs%d_node%d" % (i, j)
+            servers.append({"_id": server_id, "cmdOptions": {"port": port}})
+            members.append({"server": server_ref(server_id)})
+            port += 1
+        clusters.append({"_id": "rs%d" % i, "members": members})
+
+    # a sharded cluster with a replica set shard and a server shard
+    for server_id in ["config0", "mongos0", "shard_server0"]:
+        servers.append({"_id": server_id, "cmdOptions": {"port": port}})
+        port += 1
+
+    clusters.append({
+        "_id": "sharded0",
+        "_type": "ShardedCluster",
+        "members": [{"server": server_ref("mongos0")}],
+        "configServers": [{"server": server_ref("config0")}],
+        "shards": [{"cluster": cluster_ref("rs0")},
+                   {"server": server_ref("shard_server0")}]
+    })
+
+    # a cluster with members given by host
+    clusters.append({"_id": "by_host",
+                     "members": [{"host": "otherhost:27017"}]})
+
+    return servers, clusters
+
+###############################################################################
+# Repository index tests
+###############################################################################
+class RepositoryIndexTest(unittest.TestCase):
+
+    ###########################################################################
+    def setUp(self):
+        self._conf_root = tempfile.mkdtemp()
+        servers, clusters = make_repository_docs()
+        self.write_config("mongoctl.config", {
+            "fileRepository": {
+                "servers": "servers.config",
+                "clusters": "clusters.config"
+            }
+        })
+        self.write_config("servers.config", servers)
+        self.write_config("clusters.config", clusters)
+
+        self._context = execution_context()
+        self._context.__enter__()
+        config._set_config_root(self._conf_root)
+
+    ###########################################################################
+    def tearDown(self):
+        self._context.__exit__(None, None, None)
+        config.__mongo_configs__.pop(self._conf_root, None)
+        repository._clear_configured_documents(self._conf_root)
+        shutil.rmtree(self._conf_root)
+
+    ###########################################################################
+    def write_config(self, name, value):
+        path = os.path.join(self._conf_root, name)
+        open(path, "w").write(json.dumps(value))
+        # make sure that rewrites change the repository generation
+        stamp = time.time() + len(open(path).read())
+        os.utime(path, (stamp, stamp))
+
+    ###########################################################################
+    def lookup_cluster_id(self, server_id, lookup_type=None):
+        server = repository.lookup_server(server_id)
+        if lookup_type is None:
+            cluster = repository.lookup_cluster_by_server(server)
+        else:
+            cluster = repository.lookup_cluster_by_server(server, lookup_type)
+        return cluster.id if cluster else None
+
+    ###########################################################################
+    def test_lookup_by_server(self):
+        for i in range(NUM_REPLICASET_CLUSTERS):
+            for j in range(MEMBERS_PER_CLUSTER):
+                self.assertEquals(self.lookup_cluster_id("rs%d_node%d" %
+                                                         (i, j)),
+                                  "rs%d" % i)
+
+        self.assertEquals(self.lookup_cluster_id("mongos0"), "sharded0")
+        self.assertEquals(self.lookup_cluster_id("config0"), "sharded0")
+        self.assertEquals(self.lookup_cluster_id("shard_server0"), "sharded0")
+        self.assertEquals(
+            self.lookup_cluster_id("config0",
+                                   repository.LOOKUP_TYPE_REPLICA_MEMBER),
+            None)
+        self.assertEquals(
+            self.lookup_cluster_id("config0",
+                                   repository.LOOKUP_TYPE_CONFIG_SVR),
+            "sharded0")
+
+        by_host = repository.build_server_from_address("otherhost:27017")
+        self.assertEquals(repository.lookup_cluster_by_server(by_host).id,
+                          "by_host")
+
+    ###########################################################################
+    def test_lookup_by_shard(self):
+        shard_cluster = repository.lookup_cluster("rs0")
+        self.assertEquals(repository.lookup_cluster_by_shard(shard_cluster).id,
+                          "sharded0")
+
+        shard_server = repository.lookup_server("shard_server0")
+        self.assertEquals(repository.lookup_cluster_by_shard(shard_server).id,
+                          "sharded0")
+
+        self.assertEquals(
+            repository.lookup_cluster_by_shard(repository.lookup_cluster("rs1")),
+            None)
+
+        # lookups return the objects of the current context
+        self.assertTrue(repository.lookup_cluster_by_shard(shard_cluster) is
+                        repository.lookup_cluster("sharded0"))
+
+    ###########################################################################
+    def test_index_follows_reload(self):
+        self.assertEquals(self.lookup_cluster_id("rs1_node0"), "rs1")
+
+        # move rs1_node0 over to rs2
+        servers, clusters = make_repository_docs()
+        clusters[1]["members"].pop(0)
+        clusters[2]["members"].append({"server": server_ref("rs1_node0")})
+        self.write_config("clusters.config", clusters)
+
+        repository.refresh_repository()
+        self.assertEquals(self.lookup_cluster_id("rs1_node0"), "rs2")
+
+    ###########################################################################
+    def test_incremental_reload(self):
+        servers = repository.get_configured_servers()
+        clusters = repository.get_configured_clusters()
+        # build every server and cluster
+        servers.values()
+        clusters.values()
+        rs0_member = clusters["rs0"].get_members()[0]
+        self.assertEquals(rs0_member.get_server().get_port(), 20000)
+        documents = repository.get_configured_documents()
+        cluster_index = documents.get_cluster_index()
+
+        # unchanged files: same snapshot
+        self.assertTrue(repository.reload_configured_documents() is
+                        documents)
+
+        new_servers, new_clusters = make_repository_docs()
+        new_servers[0]["cmdOptions"]["port"] = 30000
+        new_servers.append({"_id": "new_node", "cmdOptions": {"port": 30001}})
+        self.write_config("servers.config", new_servers)
+
+        reloaded = repository.reload_configured_documents()
+        self.assertEquals(reloaded.version, documents.version + 1)
+        self.assertEquals(reloaded.servers_file.changed_ids,
+                          set(["rs0_node0", "new_node"]))
+        self.assertTrue(reloaded.clusters_file is documents.clusters_file)
+        self.assertTrue(reloaded.get_cluster_index() is cluster_index)
+
+        # the execution keeps the snapshot it started with
+        self.assertTrue(repository.get_configured_servers() is servers)
+        self.assertEquals(repository.lookup_server("rs0_node0").get_port(),
+                          20000)
+        self.assertEquals(repository.lookup_server("new_node"), None)
+
+        # once it moves over, only the changed servers are rebuilt
+        repository.refresh_repository()
+        reloaded_servers = repository.get_configured_servers()
+        self.assertEquals(reloaded_servers["rs0_node0"].get_port(), 30000)
+        self.assertEquals(reloaded_servers["new_node"].get_port(), 30001)
+        self.assertFalse(reloaded_servers["rs0_node0"] is
+                         servers["rs0_node0"])
+        self.assertTrue(reloaded_servers["rs0_node1"] is
+                        servers["rs0_node1"])
+
+        # and the clusters that reference them
+        reloaded_clusters = repository.get_configured_clusters()
+        rs0_member = repository.lookup_cluster("rs0").get_members()[0]
+        self.assertEquals(rs0_member.get_server().get_port(), 30000)
+        self.assertFalse(reloaded_clusters["rs0"] is clusters["rs0"])
+        self.assertFalse(reloaded_clusters["sharded0"] is clusters["sharded0"])
+        self.assertTrue(reloaded_clusters["rs1"] is clusters["rs1"])
+
+        # new executions use the reloaded files
+        with execution_context():
+            config._set_config_root(self._conf_root)
+            self.assertEquals(repository.lookup_server("rs0_node0").get_port(),
+                              30000)
+
+    ###########################################################################
+    def test_objects_built_on_lookup(self):
+        built = []
+        new_server = repository.new_server
+
+        def counting_new_server(server_doc):
+            built.append(server_doc["_id"])
+            return new_server(server_doc)
+
+        repository.new_server = counting_new_server
+        try:
+            self.assertEquals(repository.lookup_server("rs1_node2").get_port(),
+                              20005)
+            self.assertEquals(repository.lookup_server("rs1_node2").get_port(),
+                              20005)
+            self.assertEquals(repository.lookup_server("no_such_server"),
+                              None)
+            # only the server looked up is built, once per execution
+            self.assertEquals(built, ["rs1_node2"])
+
+            with execution_context():
+                config._set_config_root(self._conf_root)
+                repository.lookup_server("rs1_node2")
+            self.assertEquals(built, ["rs1_node2", "rs1_node2"])
+
+            servers = repository.get_configured_servers()
+            self.assertEquals(len(servers),
+                              NUM_REPLICASET_CLUSTERS *
+                              MEMBERS_PER_CLUSTER + 3)
+            self.assertTrue("rs0_node0" in servers)
+            self.assertEquals(len(built), 2)
+        finally:
+            repository.new_server = new_server
+
+    ###########################################################################
+    def test_reload_all_config_roots(self):
+        repository.lookup_server("rs0_node0")
+        new_servers, new_clusters = make_repository_docs()
+        new_servers[0]["cmdOptions"]["port"] = 30000
+        self.write_config("servers.config", new_servers)
+
+        # e.g. from a watcher thread
+        thread = threading.Thread(
+            target=repository.reload_all_configured_documents)
+        thread.start()
+        thread.join()
+
+        with execution_context():
+            config._set_config_root(self._conf_root)
+            self.assertEquals(repository.lookup_server("rs0_node0").get_port(),
+                              30000)
+
+# booty
+if __name__ == '__main__':
+    unittest.main()
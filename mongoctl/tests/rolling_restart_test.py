@@ -0,0 +1,282 @@
+# The MIT License
+
+# Copyright (c) 2012 ObjectLabs Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+__author__ = 'richardxx'
+
+import unittest
+import os
+import threading
+import time
+
+import mongoctl.config as config
+from mongoctl.commands.cluster import rolling_restart
+from mongoctl.context import execution_context
+from mongoctl.objects.replicaset_cluster import ReplicaSetCluster
+
+TESTING_CONF_DIR = os.path.join(os.path.dirname(__file__), "testing_conf")
+
+###############################################################################
+# Constants
+###############################################################################
+NUM_MEMBERS = 5
+# seconds a restarted member lags behind
+CATCH_UP_DELAY = 0.3
+# seconds before a new primary is elected after a step down
+ELECTION_DELAY = 0.5
+
+###############################################################################
+class StandInReplicaSet(object):
+    """
+        The state of a replica set of stand-in servers: who is primary and
+        how many members were down at once.
+    """
+
+    ###########################################################################
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.servers = []
+        self.primary = None
+        self.step_downs = []
+        self.max_down = 0
+
+    ###########################################################################
+    def member_stopped(self, server):
+        with self.lock:
+            # members still catching up count as down
+            down = len([s for s in self.servers
+                        if not s.online or s.caught_up_at > time.time()])
+            self.max_down = max(self.max_down, down)
+            if self.primary is server:
+                self.primary = None
+
+    ###########################################################################
+    def step_down(self, server, force=False, step_down_secs=10):
+        # long enough to stop the old primary before it can be re-elected
+        assert step_down_secs > ELECTION_DELAY
+        self.step_downs.append(server)
+        self.primary = None
+        timer = threading.Timer(ELECTION_DELAY, self.elect, (server,))
+        timer.daemon = True
+        timer.start()
+        return True
+
+    ###########################################################################
+    def elect(self, old_primary):
+        with self.lock:
+            for server in self.servers:
+                if (server.online and server.electable and
+                        server is not old_primary):
+                    self.primary = server
+                    return
+
+###############################################################################
+class StandInServer(object):
+
+    ###########################################################################
+    def __init__(self, id, replica_set, arbiter=False, slave_delay=0):
+        self.id = id
+        self.replica_set = replica_set
+        self.arbiter = arbiter
+        self.slave_delay = slave_delay
+        self.electable = not (arbiter or slave_delay)
+        self.online = True
+        self.caught_up_at = 0
+        self.restarts = 0
+        self.primary_checks = 0
+
+    ###########################################################################
+    def is_online(self):
+        return self.online
+
+    ###########################################################################
+    def is_primary(self):
+        self.primary_checks += 1
+        return self.online and self.replica_set.primary is self
+
+    ###########################################################################
+    def is_secondary(self):
+        return (self.online and not self.arbiter and
+                self.replica_set.primary is not self)
+
+    ###########################################################################
+    def get_member_rs_status(self):
+        if not self.online:
+            return None
+        if self.arbiter:
+            return {"self": True, "stateStr": "ARBITER"}
+        return {"self": True}
+
+    ###########################################################################
+    def get_repl_lag(self, master_status):
+        assert not self.arbiter
+        return (self.slave_delay +
+                max(self.caught_up_at - time.time(), 0) * 100)
+
+    ###########################################################################
+    def stop(self):
+        self.online = False
+        self.replica_set.member_stopped(self)
+
+    ###########################################################################
+    def start(self):
+        self.online = True
+        self.restarts += 1
+        self.caught_up_at = time.time() + CATCH_UP_DELAY
+
+###############################################################################
+# Rolling restart tests
+###############################################################################
+class RollingRestartTest(unittest.TestCase):
+
+    ###########################################################################
+    def setUp(self):
+        self.replica_set = StandInReplicaSet()
+        self._saved_functions = {
+            "start_server": rolling_restart.start_server,
+            "stop_server": rolling_restart.stop_server,
+            "step_server_down": rolling_restart.step_server_down
+        }
+        rolling_restart.start_server = lambda server, **kwargs: server.start()
+        rolling_restart.stop_server = lambda server, **kwargs: server.stop()
+        rolling_restart.step_server_down = self.replica_set.step_down
+        self._saved_catch_up_timeout = rolling_restart.CATCH_UP_TIMEOUT
+        rolling_restart.CATCH_UP_TIMEOUT = 10
+
+        self._context = execution_context()
+        self._context.__enter__()
+        config._set_config_root(TESTING_CONF_DIR)
+
+    ###########################################################################
+    def tearDown(self):
+        self._context.__exit__(None, None, None)
+        config.__mongo_configs__.pop(TESTING_CONF_DIR, None)
+        for name, function in self._saved_functions.items():
+            setattr(rolling_restart, name, function)
+        rolling_restart.CATCH_UP_TIMEOUT = self._saved_catch_up_timeout
+
+    ###########################################################################
+    def new_cluster(self, member_docs=None):
+        member_docs = member_docs or [{} for i in range(NUM_MEMBERS)]
+        cluster = ReplicaSetCluster({
+            "_id": "rs",
+            "members": [dict(member_doc, host="host%d:27017" % i)
+                        for i, member_doc in enumerate(member_docs)]})
+        for i, member in enumerate(cluster.get_members()):
+            member._server = StandInServer(
+                "node%d" % i, self.replica_set,
+                arbiter=member.is_arbiter(),
+                slave_delay=member.get_slave_delay())
+            self.replica_set.servers.append(member._server)
+        self.replica_set.primary = self.replica_set.servers[2]
+        return cluster
+
+    ###########################################################################
+    def test_rolling_restart(self):
+        cluster = self.new_cluster()
+        old_primary = self.replica_set.primary
+
+        unavailable_time = rolling_restart.rolling_restart_replicaset(
+            cluster, parallel_fraction=1, max_repl_lag=1)
+
+        for server in self.replica_set.servers:
+            self.assertTrue(server.online)
+            self.assertEquals(server.restarts, 1)
+        # never more members down than what keeps a majority up
+        self.assertEquals(self.replica_set.max_down, 2)
+        # one step down and only the election went without primary
+        self.assertEquals(self.replica_set.step_downs, [old_primary])
+        self.assertFalse(self.replica_set.primary in (None, old_primary))
+        self.assertTrue(0 < unavailable_time < ELECTION_DELAY + 1)
+
+    ###########################################################################
+    def test_arbiter_and_delayed_member(self):
+        cluster = self.new_cluster([
+            {}, {}, {}, {"arbiterOnly": True},
+            {"priority": 0, "hidden": True, "slaveDelay": 3600}])
+        old_primary = self.replica_set.primary
+
+        start_time = time.time()
+        rolling_restart.rolling_restart_replicaset(
+            cluster, parallel_fraction=1, max_repl_lag=1)
+
+        # neither waits for a catch up that never comes
+        self.assertTrue(time.time() - start_time <
+                        rolling_restart.CATCH_UP_TIMEOUT)
+        for server in self.replica_set.servers:
+            self.assertTrue(server.online)
+            self.assertEquals(server.restarts, 1)
+        self.assertFalse(self.replica_set.primary in (None, old_primary))
+        self.assertTrue(self.replica_set.primary.electable)
+
+    ###########################################################################
+    def test_primary_monitor(self):
+        cluster = self.new_cluster()
+        servers = self.replica_set.servers
+        # probes are not fanned out
+        cluster.get_primary_member = None
+
+        monitor = rolling_restart.PrimaryMonitor(cluster, interval=0.01)
+        monitor.start()
+        try:
+            time.sleep(0.05)
+            for server in servers:
+                server.primary_checks = 0
+            time.sleep(0.15)
+            # once found, only the primary is asked, from the monitor's
+            # thread
+            self.assertTrue(servers[2].primary_checks > 5)
+            self.assertEquals([server.primary_checks for server in servers
+                               if server is not servers[2]], [0] * 4)
+            threads = threading.active_count()
+
+            # then each member in turn until a new one is found
+            self.replica_set.primary = None
+            time.sleep(0.1)
+            self.replica_set.primary = servers[4]
+            time.sleep(0.1)
+        finally:
+            monitor.stop()
+        self.assertTrue(all(server.primary_checks for server in servers))
+        self.assertEquals(threading.active_count(), threads - 1)
+        self.assertTrue(0.05 < monitor.unavailable_time < 0.2)
+
+    ###########################################################################
+    def test_batch_size(self):
+        cluster = self.new_cluster()
+        servers = self.replica_set.servers
+        self.assertEquals(rolling_restart.get_batch_size(cluster, servers, 1),
+                          2)
+        self.assertEquals(rolling_restart.get_batch_size(cluster, servers,
+                                                         0.2), 1)
+        servers[0].online = False
+        self.assertEquals(rolling_restart.get_batch_size(cluster, servers, 1),
+                          1)
+        servers[1].online = False
+        servers[3].online = False
+        self.assertEquals(rolling_restart.get_batch_size(cluster, servers, 1),
+                          1)
+
+# booty
+if __name__ == '__main__':
+    unittest.main()
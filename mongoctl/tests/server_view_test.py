@@ -0,0 +1,305 @@
+# The MIT License
+
+# Copyright (c) 2012 ObjectLabs Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+__author__ = 'richardxx'
+
+import unittest
+import copy
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+import mongoctl.config as config
+import mongoctl.repository as repository
+from mongoctl.context import execution_context
+from mongoctl.objects.server_view import ServerView
+
+###############################################################################
+# Constants
+###############################################################################
+BENCHMARK_SIZES = [10000, 50000]
+
+###############################################################################
+class StandInCollection(object):
+    """
+        A collection of server documents that counts the queries it
+        receives and supports field projections on one level of nesting.
+    """
+
+    ###########################################################################
+    def __init__(self, documents):
+        self.name = "servers"
+        self.documents = documents
+        self.index = dict((doc["_id"], doc) for doc in documents)
+        self.queries = 0
+        self.read = 0
+
+    ###########################################################################
+    def find_one(self, query):
+        self.queries += 1
+        doc = self.index.get(query["_id"])
+        return copy.deepcopy(doc) if doc else None
+
+    ###########################################################################
+    def find(self, query=None, fields=None):
+        self.queries += 1
+        return StandInCursor(self, fields)
+
+###############################################################################
+class StandInCursor(object):
+    """
+        Reads the documents of a StandInCollection one at a time, counting
+        them.
+    """
+
+    ###########################################################################
+    def __init__(self, collection, fields):
+        self.collection = collection
+        self.fields = fields
+        self.documents = collection.documents
+
+    ###########################################################################
+    def sort(self, key, direction):
+        self.documents = sorted(self.documents, key=lambda doc: doc[key],
+                                reverse=direction < 0)
+        return self
+
+    ###########################################################################
+    def __iter__(self):
+        for doc in self.documents:
+            self.collection.read += 1
+            yield project(doc, self.fields)
+
+###############################################################################
+def project(doc, fields):
+    if fields is None:
+        return copy.deepcopy(doc)
+
+    projected = {}
+    for field in fields:
+        if "." in field:
+            name, sub_name = field.split(".", 1)
+            if sub_name in doc.get(name, {}):
+                projected.setdefault(name, {})[sub_name] = doc[name][sub_name]
+        elif field in doc:
+            projected[field] = doc[field]
+    return projected
+
+###############################################################################
+def server_doc(i):
+    doc = {
+        "_id": "server%05d" % i,
+        "description": "Server %d of the fleet" % i,
+        "serverHome": "/data/mongodb/server%05d" % i,
+        "mongoVersion": "2.6.4",
+        "cmdOptions": {
+            "port": 27017 + i % 1000,
+            "dbpath": "/data/mongodb/server%05d/data" % i,
+            "directoryperdb": True,
+            "journal": True,
+            "replSet": "rs%d" % (i / 3),
+            "oplogSize": 1024,
+            "logappend": True
+        }
+    }
+    if i % 2:
+        doc["address"] = "host%05d.example.com" % i
+    return doc
+
+###############################################################################
+def deep_sizeof(obj, seen=None):
+    """
+        Returns the bytes taken by obj and everything it references, skipping
+        classes, functions, modules and the objects already counted.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or isinstance(obj, (type, types.ClassType,
+                                           types.ModuleType,
+                                           types.FunctionType)):
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.iteritems():
+            size += deep_sizeof(key, seen) + deep_sizeof(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += deep_sizeof(item, seen)
+    if hasattr(obj, "__dict__"):
+        size += deep_sizeof(obj.__dict__, seen)
+    for slot in getattr(type(obj), "__slots__", ()):
+        if hasattr(obj, slot):
+            size += deep_sizeof(getattr(obj, slot), seen)
+    return size
+
+###############################################################################
+# Server view tests
+###############################################################################
+class ServerViewTest(unittest.TestCase):
+
+    ###########################################################################
+    def setUp(self):
+        self._conf_root = tempfile.mkdtemp()
+        self._saved_functions = {}
+        self.use_servers(100)
+
+    ###########################################################################
+    def tearDown(self):
+        self._context.__exit__(None, None, None)
+        for name, function in self._saved_functions.items():
+            setattr(repository, name, function)
+        config.__mongo_configs__.pop(self._conf_root, None)
+        shutil.rmtree(self._conf_root)
+
+    ###########################################################################
+    def use_servers(self, count, file_servers=None):
+        """
+            Starts a new execution with a db repository of count servers
+            (in reverse order) and a file repository of the given servers.
+        """
+        if hasattr(self, "_context"):
+            self._context.__exit__(None, None, None)
+            config.__mongo_configs__.pop(self._conf_root, None)
+
+        self.servers = StandInCollection([server_doc(i)
+                                          for i in reversed(range(count))])
+        conf = {"databaseRepository": {
+            "databaseURI": "mongodb://localhost:27017/mongoctl"}}
+        if file_servers is not None:
+            conf["fileRepository"] = {"servers": "servers.config",
+                                      "clusters": "clusters.config"}
+            open(os.path.join(self._conf_root, "servers.config"),
+                 "w").write(json.dumps(file_servers))
+            open(os.path.join(self._conf_root, "clusters.config"),
+                 "w").write("[]")
+        open(os.path.join(self._conf_root, "mongoctl.config"), "w").write(
+            json.dumps(conf))
+
+        self.replace_function("consulting_db_repository", lambda: True)
+        self.replace_function("get_mongoctl_server_db_collection",
+                              lambda: self.servers)
+
+        self._context = execution_context()
+        self._context.__enter__()
+        config._set_config_root(self._conf_root)
+
+    ###########################################################################
+    def replace_function(self, name, function):
+        self._saved_functions.setdefault(name, getattr(repository, name))
+        setattr(repository, name, function)
+
+    ###########################################################################
+    def test_views_match_servers(self):
+        views = sorted(repository.lookup_all_server_views(),
+                       key=lambda view: view.id)
+        servers = sorted(repository.lookup_all_servers(),
+                         key=lambda server: server.id)
+
+        self.assertEquals(len(views), 100)
+        for view, server in zip(views, servers):
+            self.assertTrue(isinstance(view, ServerView))
+            self.assertEquals(view.id, server.id)
+            self.assertEquals(view.get_description(),
+                              server.get_description())
+            self.assertEquals(view.get_address_display(),
+                              server.get_address_display())
+
+    ###########################################################################
+    def test_server_looked_up_lazily(self):
+        views = repository.lookup_all_server_views()
+        self.assertEquals(self.servers.queries, 1)
+        self.assertEquals(repository.get_context().db_servers, {})
+
+        # only the server of the view, once
+        server = views[3].get_server()
+        self.assertEquals(server.id, views[3].id)
+        self.assertTrue(views[3].get_server() is server)
+        self.assertTrue(repository.lookup_server(server.id) is server)
+        self.assertEquals(self.servers.queries, 2)
+        self.assertEquals(repository.get_context().db_servers.keys(),
+                          [server.id])
+
+    ###########################################################################
+    def test_views_streamed(self):
+        self.use_servers(10000)
+        views = repository.iter_server_views()
+
+        # sorted by the db and read as needed
+        self.assertEquals(views.next().id, "server00000")
+        self.assertTrue(self.servers.read < 10)
+        self.assertEquals([view.id for view in views],
+                          ["server%05d" % i for i in range(1, 10000)])
+        self.assertEquals(self.servers.queries, 1)
+
+    ###########################################################################
+    def test_file_and_db_views_merged(self):
+        file_servers = [{"_id": "server00001", "description": "file"},
+                        {"_id": "file0", "description": "file"},
+                        {"_id": "server00002a", "description": "file"}]
+        self.use_servers(4, file_servers=file_servers)
+
+        views = list(repository.iter_server_views())
+        self.assertEquals([view.id for view in views],
+                          ["file0", "server00000", "server00001",
+                           "server00002", "server00002a", "server00003"])
+        # db servers win
+        self.assertEquals(views[2].get_description(), "Server 1 of the fleet")
+        self.assertEquals(views[4].get_description(), "file")
+
+    ###########################################################################
+    def test_memory_benchmark(self):
+        for count in BENCHMARK_SIZES:
+            self.use_servers(count)
+            gc.collect()
+
+            start = time.time()
+            servers = repository.lookup_all_servers()
+            servers_time = time.time() - start
+            servers_size = deep_sizeof(servers)
+            del servers
+            self.use_servers(count)
+            gc.collect()
+
+            start = time.time()
+            views = repository.lookup_all_server_views()
+            views_time = time.time() - start
+            views_size = deep_sizeof(views)
+
+            print "\n%d servers: lookup_all_servers() %.1fMB in %.2fs, " \
+                  "lookup_all_server_views() %.1fMB in %.2fs" % (
+                      count, servers_size / 1048576.0, servers_time,
+                      views_size / 1048576.0, views_time)
+            self.assertEquals(len(views), count)
+            self.assertTrue(views_size < servers_size / 4)
+
+# booty
+if __name__ == '__main__':
+    unittest.main()
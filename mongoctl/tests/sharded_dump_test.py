@@ -0,0 +1,299 @@
+# The MIT License
+
+# Copyright (c) 2012 ObjectLabs Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+
+__author__ = 'richardxx'
+
+import unittest
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+
+from bson import Timestamp
+
+import mongoctl.config as config
+from mongoctl.commands.common import dump
+from mongoctl.context import execution_context
+from mongoctl.errors import MongoctlException
+from mongoctl.objects.base import DocumentWrapper
+from mongoctl.objects.replicaset_cluster import ReplicaSetCluster
+from mongoctl.objects.sharded_cluster import ShardedCluster
+
+TESTING_CONF_DIR = os.path.join(os.path.dirname(__file__), "testing_conf")
+
+###############################################################################
+# Constants
+###############################################################################
+NUM_SHARDS = 4
+# seconds a stand-in mongodump takes
+DUMP_SECONDS = 0.5
+
+# a mongodump that writes <out>/<db or all>/<port>.bson after DUMP_SECONDS
+STANDIN_MONGODUMP = """#!%s
+import os, sys, time
+args = sys.argv[1:]
+port = args[args.index("--port") + 1]
+db = args[args.index("-d") + 1] if "-d" in args else "all"
+out = args[args.index("--out") + 1]
+if port == "1":
+    sys.exit(1)
+time.sleep(%s)
+path = os.path.join(out, db)
+if not os.path.isdir(path):
+    os.makedirs(path)
+open(os.path.join(path, port + ".bson"), "w").close()
+"""
+
+###############################################################################
+class StandInCollection(object):
+
+    ###########################################################################
+    def __init__(self, docs=None):
+        self.docs = docs or {}
+        self.updates = []
+
+    ###########################################################################
+    def find_one(self, spec=None, sort=None):
+        if spec is None:
+            return self.docs.get("last")
+        return self.docs.get(spec["_id"])
+
+    ###########################################################################
+    def update(self, spec, document, upsert=False):
+        self.updates.append(document)
+        doc = self.docs.setdefault(spec["_id"], {"_id": spec["_id"]})
+        doc.update(document["$set"])
+
+###############################################################################
+class StandInServer(object):
+
+    ###########################################################################
+    def __init__(self, id, port, balancer_stopped=False):
+        self.id = id
+        self.port = port
+        self.oplog = StandInCollection({"last": {"ts": Timestamp(port, 1)}})
+        self.dbs = {
+            "local": {"oplog.rs": self.oplog},
+            "config": {
+                "settings": StandInCollection(
+                    {"balancer": {"_id": "balancer",
+                                  "stopped": balancer_stopped}}),
+                "locks": StandInCollection()
+            }
+        }
+
+    ###########################################################################
+    def get_db(self, dbname, username=None, password=None):
+        return StandInDb(self.dbs[dbname])
+
+    ###########################################################################
+    def is_online(self):
+        return True
+
+    ###########################################################################
+    def get_connection_host_address(self):
+        return "localhost"
+
+    ###########################################################################
+    def get_port(self):
+        return self.port
+
+    ###########################################################################
+    def get_mongo_version(self):
+        return "2.6.0"
+
+###############################################################################
+class StandInDb(dict):
+
+    ###########################################################################
+    def __getattr__(self, name):
+        return self[name]
+
+###############################################################################
+class StandInReplicaSet(ReplicaSetCluster):
+    """
+        A replica set shard whose best secondary is its second member.
+    """
+
+    ###########################################################################
+    def __init__(self, id, servers):
+        DocumentWrapper.__init__(self, {"_id": id})
+        self.servers = servers
+
+    ###########################################################################
+    def get_dump_best_secondary(self, max_repl_lag=None):
+        return StandInMember(self.servers[1])
+
+###############################################################################
+class StandInMember(object):
+
+    ###########################################################################
+    def __init__(self, shard):
+        self.shard = shard
+
+    ###########################################################################
+    def get_shard(self):
+        return self.shard
+
+    ###########################################################################
+    def get_server(self):
+        return self.shard
+
+###############################################################################
+class StandInShardedCluster(ShardedCluster):
+
+    ###########################################################################
+    def __init__(self, num_shards, broken_shard=False, balancer_stopped=False):
+        DocumentWrapper.__init__(self, {"_id": "sharded"})
+        self.mongos = StandInServer("mongos", 27017,
+                                    balancer_stopped=balancer_stopped)
+        self._members = [StandInMember(self.mongos)]
+        self._config_members = [StandInMember(StandInServer("config%d" % i,
+                                                            20000 + i))
+                                for i in range(3)]
+        self._shards = []
+        for i in range(num_shards):
+            servers = [StandInServer("shard%d_%d" % (i, j),
+                                     30000 + i * 10 + j) for j in range(3)]
+            self._shards.append(StandInMember(
+                StandInReplicaSet("shard%d" % i, servers)))
+        if broken_shard:
+            self._shards.append(StandInMember(StandInServer("broken", 1)))
+
+###############################################################################
+# Sharded dump tests
+###############################################################################
+class ShardedDumpTest(unittest.TestCase):
+
+    ###########################################################################
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        mongodump = os.path.join(self.temp_dir, "mongodump")
+        script = open(mongodump, "w")
+        script.write(STANDIN_MONGODUMP % (sys.executable, DUMP_SECONDS))
+        script.close()
+        os.chmod(mongodump, stat.S_IRWXU)
+
+        self._saved_get_executable = dump.get_mongo_dump_executable
+        dump.get_mongo_dump_executable = lambda version: mongodump
+
+        self._context = execution_context()
+        self._context.__enter__()
+        config._set_config_root(TESTING_CONF_DIR)
+
+    ###########################################################################
+    def tearDown(self):
+        self._context.__exit__(None, None, None)
+        config.__mongo_configs__.pop(TESTING_CONF_DIR, None)
+        dump.get_mongo_dump_executable = self._saved_get_executable
+        shutil.rmtree(self.temp_dir)
+
+    ###########################################################################
+    def run_dump(self, cluster, out_name, **kwargs):
+        out = os.path.join(self.temp_dir, out_name)
+        start_time = time.time()
+        dump.mongo_dump_sharded_cluster(cluster, dump_options={"out": out},
+                                        **kwargs)
+        return out, time.time() - start_time
+
+    ###########################################################################
+    def test_sharded_dump(self):
+        one_shard_out, one_shard_time = self.run_dump(
+            StandInShardedCluster(1), "one")
+        cluster = StandInShardedCluster(NUM_SHARDS)
+        out, duration = self.run_dump(cluster, "all")
+
+        print ("Dumping 1 shard took %.2f second(s), %s shards %.2f "
+               "second(s)" % (one_shard_time, NUM_SHARDS, duration))
+        # shards are dumped concurrently
+        self.assertTrue(duration < one_shard_time * 2)
+
+        # each shard from its best secondary, the config db from a config
+        # server
+        for i in range(NUM_SHARDS):
+            self.assertEquals(
+                os.listdir(os.path.join(out, dump.SHARDS_DUMP_DIR,
+                                        "shard%d" % i, "all")),
+                ["%s.bson" % (30000 + i * 10 + 1)])
+        self.assertEquals(
+            os.listdir(os.path.join(out, dump.CONFIG_SERVERS_DUMP_DIR)),
+            ["config"])
+
+        manifest = json.load(open(os.path.join(
+            out, dump.DUMP_MANIFEST_FILE_NAME)))
+        self.assertEquals(manifest["cluster"], "sharded")
+        self.assertEquals(manifest["balancer"],
+                          {"wasStopped": False, "stoppedForDump": True})
+        shards = manifest["shards"]
+        self.assertEquals([shard["name"] for shard in shards],
+                          ["shard%d" % i for i in range(NUM_SHARDS)] +
+                          [dump.CONFIG_SERVERS_DUMP_DIR])
+        self.assertEquals(shards[0]["server"], "shard0_1")
+        self.assertEquals(shards[0]["oplogEnd"], {"t": 30001, "i": 1})
+        for shard in shards:
+            self.assertEquals(shard["error"], None)
+            self.assertTrue(shard["duration"] >= DUMP_SECONDS)
+
+        # the balancer was stopped then started again
+        settings = cluster.mongos.dbs["config"]["settings"]
+        self.assertEquals(settings.updates, [{"$set": {"stopped": True}},
+                                             {"$set": {"stopped": False}}])
+
+    ###########################################################################
+    def test_balancer_left_stopped(self):
+        cluster = StandInShardedCluster(1, balancer_stopped=True)
+        out, duration = self.run_dump(cluster, "stopped", database="db")
+
+        settings = cluster.mongos.dbs["config"]["settings"]
+        self.assertEquals(settings.updates, [])
+        manifest = json.load(open(os.path.join(
+            out, dump.DUMP_MANIFEST_FILE_NAME)))
+        self.assertEquals(manifest["balancer"],
+                          {"wasStopped": True, "stoppedForDump": False})
+        self.assertEquals(os.listdir(os.path.join(out, dump.SHARDS_DUMP_DIR,
+                                                  "shard0")), ["db"])
+
+    ###########################################################################
+    def test_failed_shard(self):
+        cluster = StandInShardedCluster(2, broken_shard=True)
+        self.assertRaises(MongoctlException, self.run_dump, cluster,
+                          "broken")
+
+        # the other shards are dumped and the balancer started again
+        manifest = json.load(open(os.path.join(
+            self.temp_dir, "broken", dump.DUMP_MANIFEST_FILE_NAME)))
+        failed = [shard["name"] for shard in manifest["shards"]
+                  if shard["error"]]
+        self.assertEquals(failed, ["broken"])
+        self.assertEquals(len(manifest["shards"]), 4)
+        settings = cluster.mongos.dbs["config"]["settings"]
+        self.assertEquals(settings.docs["balancer"]["stopped"], False)
+
+# booty
+if __name__ == '__main__':
+    unittest.main()
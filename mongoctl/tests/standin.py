@@ -0,0 +1,64 @@
+"""
+    Stand-in processes that mimic mongod for tests and benchmarks running on
+    machines where MongoDB is not installed.
+"""
+__author__ = 'richardxx'
+
+import subprocess
+import sys
+
+
+###############################################################################
+# A process that needs some time to start up, like mongod does, and then
+# listens on a port until its stdin is closed
+STARTUP_STANDIN_SCRIPT = """
+import socket
+import sys
+import time
+
+listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+listener.bind(("localhost", 0))
+listener.listen(5)
+time.sleep(float(sys.argv[1]))
+
+sys.stdout.write("waiting for connections on port %d\\n" %
+                 listener.getsockname()[1])
+sys.stdout.flush()
+sys.stdin.read()
+"""
+
+###############################################################################
+class StandinMongodProcess(object):
+
+    ###########################################################################
+    def __init__(self, startup_delay=0):
+        self.startup_delay = startup_delay
+        self.port = None
+        self._process = None
+
+    ###########################################################################
+    def start(self):
+        self._process = subprocess.Popen(
+            [sys.executable, "-c", STARTUP_STANDIN_SCRIPT,
+             str(self.startup_delay)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            # or processes started concurrently keep each other's stdin open
+            close_fds=True)
+
+    ###########################################################################
+    def wait_until_ready(self):
+        """
+            Blocks until the process is listening.
+            @return: the port the process listens on
+        """
+        line = self._process.stdout.readline()
+        self.port = int(line.strip().split(" ")[-1])
+        return self.port
+
+    ###########################################################################
+    def stop(self):
+        if self._process is not None:
+            self._process.stdin.close()
+            self._process.wait()
+            self._process = None
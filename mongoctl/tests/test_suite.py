@@ -30,6 +30,28 @@ from master_slave_test import MasterSlaveTest
 from replicaset_test import ReplicasetTest
 from misc_test import MiscTest
 from auth_replicaset_test import AuthReplicasetTest
+from ops_server_benchmark_test import OpsServerBenchmarkTest
+from uri_cache_test import UriCacheTest
+from concurrent_execute_test import ConcurrentExecuteTest
+from repository_index_test import RepositoryIndexTest
+from db_repository_test import DbRepositoryTest
+from connection_pool_test import ConnectionPoolTest
+from parallel_test import ParallelTest
+from list_servers_test import ListServersTest
+from exe_version_cache_test import ExeVersionCacheTest
+from import_time_test import ImportTimeTest
+from auth_state_test import AuthStateTest
+from topology_snapshot_test import TopologySnapshotTest
+from readiness_test import ReadinessTest
+from cluster_start_test import ClusterStartTest
+from rolling_restart_test import RollingRestartTest
+from ops_server_status_test import OpsServerStatusTest, OpsServerJobTest
+from server_view_test import ServerViewTest
+from parallel_dump_test import ParallelDumpTest
+from sharded_dump_test import ShardedDumpTest
+from archive_test import ArchiveTest
+from parallel_restore_test import ParallelRestoreTest
+from backup_test import BackupTest
 
 ###############################################################################
 all_suites = [
@@ -38,7 +60,30 @@ all_suites = [
     unittest.TestLoader().loadTestsFromTestCase(MasterSlaveTest),
     unittest.TestLoader().loadTestsFromTestCase(ReplicasetTest),
     unittest.TestLoader().loadTestsFromTestCase(AuthReplicasetTest),
-    unittest.TestLoader().loadTestsFromTestCase(MiscTest)
+    unittest.TestLoader().loadTestsFromTestCase(MiscTest),
+    unittest.TestLoader().loadTestsFromTestCase(OpsServerBenchmarkTest),
+    unittest.TestLoader().loadTestsFromTestCase(UriCacheTest),
+    unittest.TestLoader().loadTestsFromTestCase(ConcurrentExecuteTest),
+    unittest.TestLoader().loadTestsFromTestCase(RepositoryIndexTest),
+    unittest.TestLoader().loadTestsFromTestCase(DbRepositoryTest),
+    unittest.TestLoader().loadTestsFromTestCase(ConnectionPoolTest),
+    unittest.TestLoader().loadTestsFromTestCase(ParallelTest),
+    unittest.TestLoader().loadTestsFromTestCase(ListServersTest),
+    unittest.TestLoader().loadTestsFromTestCase(ExeVersionCacheTest),
+    unittest.TestLoader().loadTestsFromTestCase(ImportTimeTest),
+    unittest.TestLoader().loadTestsFromTestCase(AuthStateTest),
+    unittest.TestLoader().loadTestsFromTestCase(TopologySnapshotTest),
+    unittest.TestLoader().loadTestsFromTestCase(ReadinessTest),
+    unittest.TestLoader().loadTestsFromTestCase(ClusterStartTest),
+    unittest.TestLoader().loadTestsFromTestCase(RollingRestartTest),
+    unittest.TestLoader().loadTestsFromTestCase(OpsServerStatusTest),
+    unittest.TestLoader().loadTestsFromTestCase(OpsServerJobTest),
+    unittest.TestLoader().loadTestsFromTestCase(ServerViewTest),
+    unittest.TestLoader().loadTestsFromTestCase(ParallelDumpTest),
+    unittest.TestLoader().loadTestsFromTestCase(ShardedDumpTest),
+    unittest.TestLoader().loadTestsFromTestCase(ArchiveTest),
+    unittest.TestLoader().loadTestsFromTestCase(ParallelRestoreTest),
+    unittest.TestLoader().loadTestsFromTestCase(BackupTest)
 ]
 ###############################################################################
 # booty
@@ -0,0 +1,202 @@
+# The MIT License
+
+# Copyright (c) 2012 ObjectLabs Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+__author__ = 'richardxx'
+
+import unittest
+import os
+import threading
+import time
+
+from datetime import datetime, timedelta
+
+import mongoctl.config as config
+from mongoctl import connection_pool
+from mongoctl.connection_pool import ConnectionPool
+from mongoctl.context import execution_context
+from mongoctl.objects.mongod import MongodServer
+from mongoctl.objects.replicaset_cluster import ReplicaSetCluster
+
+TESTING_CONF_DIR = os.path.join(os.path.dirname(__file__), "testing_conf")
+
+###############################################################################
+# Constants
+###############################################################################
+NUM_MEMBERS = 7
+
+###############################################################################
+class StandInDatabase(object):
+
+    ###########################################################################
+    def __init__(self, client, name):
+        self.connection = client
+        self.name = name
+
+    ###########################################################################
+    def command(self, cmd, **kwargs):
+        if isinstance(cmd, basestring):
+            return self.connection.command(cmd)
+        return self.connection.command(cmd.keys()[0])
+
+###############################################################################
+class StandInClient(object):
+    """
+        Stands in for a MongoClient of a replica set member. Member 0 is the
+        primary and the others lag behind it by their number of seconds.
+    """
+
+    ###########################################################################
+    def __init__(self, address, wire_commands, lock):
+        self.address = address
+        self.index = int(address.split(":")[0][len("host"):])
+        self.wire_commands = wire_commands
+        self.lock = lock
+
+    ###########################################################################
+    def __getitem__(self, name):
+        return StandInDatabase(self, name)
+
+    ###########################################################################
+    @property
+    def admin(self):
+        return self["admin"]
+
+    ###########################################################################
+    def command(self, name):
+        with self.lock:
+            self.wire_commands.append((self.address, name))
+
+        if name == "isMaster":
+            return {"ismaster": self.index == 0,
+                    "secondary": self.index != 0,
+                    "setName": "rs", "ok": 1}
+        elif name == "replSetGetStatus":
+            optime = datetime(2014, 1, 1) - timedelta(seconds=self.index)
+            return {"members": [{"name": self.address, "self": True,
+                                 "optimeDate": optime}],
+                    "ok": 1}
+        else:
+            return {"ok": 1}
+
+    ###########################################################################
+    def alive(self):
+        return True
+
+    ###########################################################################
+    def close(self):
+        pass
+
+###############################################################################
+# Topology snapshot tests
+###############################################################################
+class TopologySnapshotTest(unittest.TestCase):
+
+    ###########################################################################
+    def setUp(self):
+        self.wire_commands = []
+        lock = threading.Lock()
+        self._saved_pool = connection_pool.__connection_pool__
+        connection_pool.__connection_pool__ = ConnectionPool(
+            lambda address: StandInClient(address, self.wire_commands, lock),
+            health_check_interval=3600)
+
+        self._context = execution_context()
+        self._context.__enter__()
+        config._set_config_root(TESTING_CONF_DIR)
+        config.set_mongoctl_config_val("topologySnapshotTTL", 60)
+
+    ###########################################################################
+    def tearDown(self):
+        self._context.__exit__(None, None, None)
+        config.__mongo_configs__.pop(TESTING_CONF_DIR, None)
+        connection_pool.__connection_pool__ = self._saved_pool
+
+    ###########################################################################
+    def new_cluster(self):
+        addresses = ["host%d:27017" % i for i in range(NUM_MEMBERS)]
+        cluster = ReplicaSetCluster({
+            "_id": "rs",
+            "members": [{"host": address} for address in addresses]})
+        for member, address in zip(cluster.get_members(), addresses):
+            member._server = MongodServer({"_id": address,
+                                           "address": address})
+        return cluster
+
+    ###########################################################################
+    def commands_named(self, name):
+        return [address for address, command in self.wire_commands
+                if command == name]
+
+    ###########################################################################
+    def test_one_snapshot_per_member(self):
+        cluster = self.new_cluster()
+
+        self.assertTrue(cluster.is_replicaset_initialized())
+        primary_member = cluster.get_primary_member()
+        self.assertTrue(primary_member is cluster.get_members()[0])
+        best = cluster.get_dump_best_secondary()
+        self.assertTrue(best is cluster.get_members()[1])
+
+        # each member was asked isMaster and replSetGetStatus once at most
+        is_master = self.commands_named("isMaster")
+        rs_status = self.commands_named("replSetGetStatus")
+        self.assertEquals(len(is_master), len(set(is_master)))
+        self.assertEquals(len(rs_status), NUM_MEMBERS)
+        self.assertEquals(len(set(rs_status)), NUM_MEMBERS)
+
+    ###########################################################################
+    def test_snapshot_invalidated(self):
+        server = self.new_cluster().get_members()[0].get_server()
+        self.assertTrue(server.is_primary())
+        self.assertEquals(server.read_replicaset_name(), "rs")
+        self.assertEquals(len(self.commands_named("isMaster")), 1)
+
+        # read only commands keep it
+        for command in ["serverStatus", "ping", "buildinfo"]:
+            server.db_command({command: 1}, "admin")
+        self.assertTrue(server.is_primary())
+        self.assertEquals(len(self.commands_named("isMaster")), 1)
+
+        # commands that may change the topology drop the snapshot
+        server.db_command({"replSetStepDown": 1}, "admin")
+        self.assertTrue(server.is_primary())
+        self.assertEquals(len(self.commands_named("isMaster")), 2)
+
+        server.close_db_connection()
+        self.assertTrue(server.is_primary())
+        self.assertEquals(len(self.commands_named("isMaster")), 3)
+
+    ###########################################################################
+    def test_snapshot_expires(self):
+        config.set_mongoctl_config_val("topologySnapshotTTL", 0.1)
+        server = self.new_cluster().get_members()[0].get_server()
+        server.is_primary()
+        server.is_primary()
+        time.sleep(0.2)
+        server.is_primary()
+        self.assertEquals(len(self.commands_named("isMaster")), 2)
+
+# booty
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+# The MIT License
+
+# Copyright (c) 2012 ObjectLabs Corporation
+
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE
+# LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION
+# WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+__author__ = 'richardxx'
+
+import unittest
+import os
+import shutil
+import tempfile
+import time
+
+import mongoctl.mongoctl as mongoctl_main
+import mongoctl.config as config
+import mongoctl.repository as repository
+from mongoctl.commands.misc import print_uri
+
+try:
+    import ops_server
+except ImportError:
+    ops_server = None
+
+TESTING_CONF_DIR = os.path.join(os.path.dirname(__file__), "testing_conf")
+
+###############################################################################
+# URI cache tests
+###############################################################################
+class UriCacheTest(unittest.TestCase):
+
+    ###########################################################################
+    def setUp(self):
+        self._conf_root = tempfile.mkdtemp()
+        for name in ["mongoctl.config", "servers.config", "clusters.config"]:
+            shutil.copy(os.path.join(TESTING_CONF_DIR, name), self._conf_root)
+
+        self._saved_config_root = config.__config_root__
+        config.__config_root__ = self._conf_root
+
+        mongoctl_main.setup(run_service=True)
+        print_uri.clear_uri_cache()
+
+        self.lookups = 0
+        self._real_lookup_uri = print_uri.lookup_uri
+
+        def counting_lookup_uri(id, db=None):
+            self.lookups += 1
+            return self._real_lookup_uri(id, db=db)
+
+        print_uri.lookup_uri = counting_lookup_uri
+
+    ###########################################################################
+    def tearDown(self):
+        print_uri.lookup_uri = self._real_lookup_uri
+        print_uri.clear_uri_cache()
+        config.__config_root__ = self._saved_config_root
+        config.__mongo_configs__.pop(self._conf_root, None)
+        shutil.rmtree(self._conf_root)
+
+    ###########################################################################
+    def print_uri(self, id):
+        return mongoctl_main.execute(["--config-root", self._conf_root,
+                                      "print-uri", id])
+
+    ###########################################################################
+    def test_cached_until_repository_changes(self):
+        uri = self.print_uri("simple_test_server")
+        self.assertEquals(uri, "mongodb://localhost:27550")
+        self.assertEquals(self.print_uri("simple_test_server"), uri)
+        self.assertEquals(self.lookups, 1)
+
+        cluster_uri = self.print_uri("ReplicasetTestCluster")
+        self.assertTrue(cluster_uri.startswith("mongodb://"))
+        self.assertEquals(self.print_uri("ReplicasetTestCluster"),
+                          cluster_uri)
+        self.assertEquals(self.lookups, 2)
+
+        # changing servers.config invalidates the cache once reloaded, as
+        # the config watcher of the ops server does
+        servers_file = os.path.join(self._conf_root, "servers.config")
+        servers = open(servers_file).read().replace("27550", "27551")
+        open(servers_file, "w").write(servers)
+        os.utime(servers_file, (time.time() + 5, time.time() + 5))
+        self.assertEquals(self.print_uri("simple_test_server"), uri)
+        self.assertEquals(self.lookups, 2)
+
+        repository.reload_configured_documents()
+        self.assertEquals(self.print_uri("simple_test_server"),
+                          "mongodb://localhost:27551")
+        self.assertEquals(self.lookups, 3)
+
+    ###########################################################################
+    def test_cache_ttl(self):
+        config.set_mongoctl_config_val("uriCacheTTL", 0)
+        self.print_uri("simple_test_server")
+        self.print_uri("simple_test_server")
+        self.assertEquals(self.lookups, 2)
+
+        config.set_mongoctl_config_val("uriCacheTTL", 0.2)
+        self.print_uri("simple_test_server")
+        self.print_uri("simple_test_server")
+        self.assertEquals(self.lookups, 3)
+        time.sleep(0.3)
+        self.print_uri("simple_test_server")
+        self.assertEquals(self.lookups, 4)
+
+    ###########################################################################
+    def test_errors_not_cached(self):
+        self.assertEquals(self.print_uri("no_such_server"), "Error")
+        self.assertEquals(self.print_uri("no_such_server"), "Error")
+        self.assertEquals(self.lookups, 2)
+
+    ###########################################################################
+    def test_ops_server_geturi(self):
+        if ops_server is None:
+            return
+        executed = []
+        real_execute = mongoctl_main.execute
+        mongoctl_main.execute = lambda args: executed.append(args)
+        try:
+            for i in range(3):
+                self.assertEquals(
+                    ops_server.get_plan_uri("simple_test_server"),
+                    "mongodb://localhost:27550")
+            self.assertEquals(ops_server.get_plan_uri("no_such_server"),
+                              "Error")
+        finally:
+            mongoctl_main.execute = real_execute
+
+        # straight from the cache, without a print-uri command line
+        self.assertEquals(executed, [])
+        self.assertEquals(self.lookups, 2)
+
+# booty
+if __name__ == '__main__':
+    unittest.main()
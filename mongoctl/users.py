@@ -6,18 +6,10 @@ from mongoctl_logging import log_info, log_verbose, log_warning, log_exception
 from pymongo.errors import OperationFailure, AutoReconnect
 from errors import MongoctlException
 from prompt import read_password
+from context import get_context
 import pymongo.auth
 import mongo_version
 
-###############################################################################
-__global_login_user__ = {
-    "serverId": None,
-    "database": "admin",
-    "username": None,
-    "password": None
-}
-
-
 ###############################################################################
 def parse_global_login_user_arg(username, password, server_id):
 
@@ -25,32 +17,32 @@ def parse_global_login_user_arg(username, password, server_id):
     if not username:
         return
 
-    global __global_login_user__
-    __global_login_user__['serverId'] = server_id
-    __global_login_user__['username'] = username
-    __global_login_user__['password'] = password
+    global_login_user = get_context().global_login_user
+    global_login_user['serverId'] = server_id
+    global_login_user['username'] = username
+    global_login_user['password'] = password
 
 ###############################################################################
 def get_global_login_user(server, dbname):
-    global __global_login_user__
+    global_login_user = get_context().global_login_user
 
     # all server or exact server + db match
-    if ((not __global_login_user__["serverId"] or
-                 __global_login_user__["serverId"] == server.id) and
-            __global_login_user__["username"] and
-                __global_login_user__["database"] == dbname):
-        return __global_login_user__
+    if ((not global_login_user["serverId"] or
+                 global_login_user["serverId"] == server.id) and
+            global_login_user["username"] and
+                global_login_user["database"] == dbname):
+        return global_login_user
 
     # same cluster members and DB is not 'local'?
-    if (__global_login_user__["serverId"] and
-                __global_login_user__["database"] == dbname and
+    if (global_login_user["serverId"] and
+                global_login_user["database"] == dbname and
                 dbname != "local"):
-        global_login_server = repository.lookup_server(__global_login_user__["serverId"])
+        global_login_server = repository.lookup_server(global_login_user["serverId"])
         global_login_cluster = global_login_server.get_replicaset_cluster()
         cluster = server.get_replicaset_cluster()
         if (global_login_cluster and cluster and
                     global_login_cluster.id == cluster.id):
-            return __global_login_user__
+            return global_login_user
 
 
 ###############################################################################
@@ -1,19 +1,44 @@
 """
     A lightweight server that processes user requests for mongodb operations.
     The request interface is REST.
+
+    Long running operations (e.g. starting a plan) can be queued as jobs:
+    the request returns a job id right away and the job is executed by a
+    bounded pool of workers. Progress of a job is reported by /jobs/<id>.
+
+    The status of plans is polled by a single background poller, shared by
+    all /status requests and /status/watch streams.
+
+    The servers/clusters config files are checked for changes in the
+    background and reloaded incrementally, so that requests do not see stale
+    plans. A request keeps the configuration it started with.
 """
 __author__ = 'richardxx'
 
 
 import json
+import os
 from flask import Flask
 from flask import request
+from flask import jsonify
+from flask import Response
 from mongoctl import mongoctl
 from mongoctl import mongoctl_logging
+from mongoctl import repository
+from mongoctl import config
 import signal
 from mongoctl.commands.common.status import status_command
+from mongoctl.commands.misc.print_uri import get_uri
+from mongoctl.context import execution_context
+from mongoctl.errors import MongoctlException
 import subprocess
 import re
+import time
+import uuid
+import threading
+import Queue
+from multiprocessing.pool import ThreadPool
+from mongoctl.parallel import fan_out
 
 
 # host address for this TingDB service
@@ -28,6 +53,27 @@ __ting_service_db_host = "localhost"
 # Port of out service database
 __ting_service_db_port = 27017
 
+# Number of workers executing queued jobs (e.g. start)
+__ting_service_job_workers = 8
+# Number of workers answering quick queries (e.g. geturi)
+__ting_service_query_workers = 4
+# Seconds to keep a finished job around for /jobs/<id>
+__ting_service_job_ttl = 3600
+# Seconds a synchronous request waits for its job to finish
+__ting_service_job_wait_timeout = 1800
+# Seconds between two polls of the status of the watched plans
+__ting_service_status_interval = 2
+# Seconds a plan is polled for after the last /status request for it
+__ting_service_status_idle = 60
+# Seconds to wait for the status of a plan
+__ting_service_status_timeout = 10
+# Number of plans polled at once
+__ting_service_status_workers = 16
+# Seconds between keep-alive comments of idle watch streams
+__ting_service_watch_keepalive = 15
+# Seconds between checks of the servers/clusters config files for changes
+__ting_service_config_check_interval = 1
+
 
 app = Flask("__name__")
 app.config['DEBUG'] = True
@@ -38,7 +84,9 @@ def op_start():
     """
         Start a plan.
         Input parameters should be plan name and plan type.
-        @return: "ok" or "fail"
+        If "async" is given, the start is queued as a job and the job id is
+        returned right away. Poll /jobs/<job_id> for its progress.
+        @return: "ok" or "fail", or {"jobId": <job_id>} for async requests
     """
     print "Start command received..."
 
@@ -46,6 +94,133 @@ def op_start():
     plan_name = plan_doc["plan_name"]
     plan_type = plan_doc["plan_type"]
 
+    job = submit_job("start", start_plan, plan_name, plan_type)
+    if is_true_param(plan_doc.get("async")):
+        return jsonify(jobId=job["id"])
+
+    return wait_for_job(job)
+
+
+@app.route('/op-geturi', methods=['POST'])
+def op_geturi():
+    """
+        Get URI of a plan.
+        Only plan name is needed.
+        URIs are cached until the repository changes (see print_uri).
+        @return:
+    """
+    print "GetUri command received"
+
+    plan_name = request.form["plan_name"]
+    return query_uri(plan_name)
+
+
+def query_uri(plan_name):
+    return get_query_pool().apply(get_plan_uri, (plan_name,))
+
+
+def get_plan_uri(plan_name):
+    """
+        Looks the uri up in the cache of print-uri, without parsing a
+        print-uri command line.
+    """
+    with execution_context():
+        try:
+            return get_uri(plan_name)
+        except MongoctlException, e:
+            mongoctl_logging.log_error(e)
+            return "Error"
+
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """
+        List all jobs that are queued, running or recently finished.
+    """
+    with __jobs_lock:
+        jobs = [job_summary(job) for job in __jobs.values()]
+
+    jobs.sort(key=lambda job: job["submitted"])
+    return jsonify(jobs=jobs)
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+        Report the progress of a job.
+        @return: the job document, or 404 if there is no such job
+    """
+    with __jobs_lock:
+        job = __jobs.get(job_id)
+        summary = job_summary(job) if job is not None else None
+
+    if summary is None:
+        return jsonify(error="Unknown job '%s'" % job_id), 404
+
+    return jsonify(summary)
+
+
+@app.route('/status', methods=['GET'])
+def get_status():
+    """
+        Get the status of one or more plans.
+        Input parameter "plans" is a comma separated list of plan names.
+        Statuses come from the status poller: plans that are not polled yet
+        are polled once before answering, then kept polled for a while.
+        @return: {<plan_name>: <status>}
+    """
+    plan_names = get_plan_names_param()
+    return jsonify(get_status_poller().get_statuses(plan_names))
+
+
+@app.route('/status/watch', methods=['GET'])
+def watch_status():
+    """
+        Stream the status of one or more plans as server-sent events.
+        Input parameter "plans" is a comma separated list of plan names.
+        The first event of each plan has its full status, the next ones only
+        the fields that changed, e.g.
+            {"plan": "rs1", "changes": {"otherMembers.0.stateStr": ...}}
+    """
+    plan_names = get_plan_names_param()
+    poller = get_status_poller()
+    subscriber = poller.subscribe(plan_names)
+
+    def stream():
+        try:
+            while True:
+                try:
+                    event = subscriber.get(
+                        timeout=__ting_service_watch_keepalive)
+                except Queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    # the poller has stopped
+                    return
+                yield "event: status\ndata: %s\n\n" % json.dumps(event)
+        finally:
+            poller.unsubscribe(subscriber)
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache"})
+
+
+def get_plan_names_param():
+    return [plan_name.strip()
+            for plan_name in request.args.get("plans", "").split(",")
+            if plan_name.strip()]
+
+
+#################################################
+# Operations executed by the worker pools
+#################################################
+
+def start_plan(plan_name, plan_type):
+    """
+        Start a plan if it is not running yet.
+        @return: "ok" or "fail"
+    """
     # We first test if the plan has started
     status = mongoctl.execute(["status", plan_name])
     print "Status of server %s:" % plan_name
@@ -61,20 +236,441 @@ def op_start():
     return "ok"
 
 
-@app.route('/op-geturi', methods=['POST'])
-def op_geturi():
+def run_mongoctl_command(args):
+    try:
+        return mongoctl.execute(args)
+    except SystemExit, e:
+        # mongoctl may exit() on failures. Do not let it kill the worker
+        mongoctl_logging.log_verbose("%s exited: %s" % (args, e))
+        return "Error"
+
+
+#################################################
+# Job queue
+#################################################
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# job id -> job document
+__jobs = {}
+__jobs_lock = threading.Lock()
+
+__job_pool = None
+__query_pool = None
+__pools_lock = threading.Lock()
+
+
+def start_worker_pools(job_workers=None, query_workers=None):
     """
-        Get URI of a plan.
-        Only plan name is needed.
-        @return:
+        Create the worker pools. Every mongoctl.execute() call runs in its
+        own execution context, so the workers are threads.
+        This should be called after mongoctl.setup().
     """
-    print "GetUri command received"
+    global __job_pool, __query_pool
+
+    with __pools_lock:
+        if __job_pool is not None:
+            return
+
+        job_workers = job_workers or __ting_service_job_workers
+        query_workers = query_workers or __ting_service_query_workers
+
+        __job_pool = ThreadPool(processes=job_workers)
+        __query_pool = ThreadPool(processes=query_workers)
+
+
+def stop_worker_pools():
+    global __job_pool, __query_pool
+
+    with __pools_lock:
+        for pool in [__job_pool, __query_pool]:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+        __job_pool = None
+        __query_pool = None
+
+
+def get_job_pool():
+    start_worker_pools()
+    return __job_pool
+
+
+def get_query_pool():
+    start_worker_pools()
+    return __query_pool
+
+
+def submit_job(command, func, *args):
+    """
+        Queue func(*args) for execution by the job workers.
+        @return: the job document
+    """
+    job = {
+        "id": uuid.uuid4().hex,
+        "command": command,
+        "args": list(args),
+        "state": JOB_QUEUED,
+        "result": None,
+        "error": None,
+        "submitted": time.time(),
+        "started": None,
+        "finished": None,
+        "done": threading.Event()
+    }
+
+    with __jobs_lock:
+        _expire_finished_jobs()
+        __jobs[job["id"]] = job
+
+    try:
+        # the job finishes itself: apply_async has no error callback
+        get_job_pool().apply_async(_execute_job, (job["id"], func, args))
+    except Exception, e:
+        _finish_job(job["id"], {"state": JOB_FAILED, "error": "%s" % e,
+                                "started": None, "finished": time.time()})
+    return job
+
+
+def wait_for_job(job, timeout=None):
+    """
+        Waits for the job to finish, for at most timeout seconds.
+        @return: the result of the job, or "fail" if it failed or is still
+        running
+    """
+    if timeout is None:
+        timeout = __ting_service_job_wait_timeout
+    if not job["done"].wait(timeout):
+        mongoctl_logging.log_error("Job %s is still running after %s "
+                                   "second(s). See /jobs/%s" %
+                                   (job["id"], timeout, job["id"]))
+        return "fail"
+    if job["state"] == JOB_FAILED:
+        return "fail"
+    return job["result"]
+
+
+def job_summary(job):
+    summary = dict((key, value) for (key, value) in job.items()
+                   if key != "done")
+
+    now = time.time()
+    if job["started"] is not None:
+        summary["elapsed"] = (job["finished"] or now) - job["started"]
+    summary["waited"] = (job["started"] or now) - job["submitted"]
+    return summary
+
+
+def is_true_param(value):
+    return value is not None and value.lower() in ["1", "true", "yes"]
+
+
+def _finish_job(job_id, outcome):
+    with __jobs_lock:
+        job = __jobs.get(job_id)
+        if job is None:
+            return
+        job["state"] = outcome["state"]
+        job["result"] = outcome.get("result")
+        job["error"] = outcome.get("error")
+        job["started"] = job["started"] or outcome["started"]
+        job["finished"] = outcome["finished"]
+
+    job["done"].set()
+
+
+def _expire_finished_jobs():
+    expire_before = time.time() - __ting_service_job_ttl
+    for job_id, job in __jobs.items():
+        if job["finished"] is not None and job["finished"] < expire_before:
+            del __jobs[job_id]
+
+
+def _start_job(job_id, started):
+    with __jobs_lock:
+        job = __jobs.get(job_id)
+        if job is not None and job["state"] == JOB_QUEUED:
+            job["state"] = JOB_RUNNING
+            job["started"] = started
+
+
+###############################################################################
+# The following are executed by the worker threads
+
+def _execute_job(job_id, func, args):
+    """
+        Runs the job and always gives it a final state, whatever escapes.
+    """
+    started = time.time()
+    outcome = {"state": JOB_FAILED, "error": "Job was interrupted",
+               "started": started}
+    try:
+        _start_job(job_id, started)
+        result = func(*args)
+        outcome = {"state": JOB_DONE, "result": result, "started": started}
+    except (Exception, SystemExit), e:
+        # mongoctl may exit() on failures. Do not let it kill the worker
+        outcome = {"state": JOB_FAILED, "error": "%s" % e,
+                   "started": started}
+    finally:
+        outcome["finished"] = time.time()
+        _finish_job(job_id, outcome)
+
+    return outcome
+
+
+#################################################
+# Status poller
+#################################################
+
+class StatusPoller(object):
+    """
+        Polls the status of the watched plans in a background thread, all
+        plans at once, and pushes what changed to the subscribers of each
+        plan. A plan is watched while it has subscribers or was asked for by
+        get_statuses() in the last idle_timeout seconds.
+    """
+
+    def __init__(self, interval, idle_timeout, poll_timeout, poll_workers):
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self.poll_timeout = poll_timeout
+        self.poll_workers = poll_workers
+        # plan name -> last status
+        self._statuses = {}
+        # plan name -> time of the last get_statuses() asking for it
+        self._requested = {}
+        # subscriber queue -> plan names
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+        # end the streams
+        with self._lock:
+            for subscriber in self._subscribers.keys():
+                subscriber.put(None)
+
+    def get_statuses(self, plan_names):
+        now = time.time()
+        with self._lock:
+            for plan_name in plan_names:
+                self._requested[plan_name] = now
+            missing = [plan_name for plan_name in plan_names
+                       if plan_name not in self._statuses]
+
+        if missing:
+            self.poll(missing)
+
+        with self._lock:
+            return dict((plan_name, self._statuses.get(plan_name))
+                        for plan_name in plan_names)
+
+    def subscribe(self, plan_names):
+        """
+            @return: a queue receiving the status events of the plans,
+            starting with their current status
+        """
+        subscriber = Queue.Queue()
+        with self._lock:
+            self._subscribers[subscriber] = set(plan_names)
+            missing = [plan_name for plan_name in plan_names
+                       if plan_name not in self._statuses]
+            for plan_name in plan_names:
+                if plan_name in self._statuses:
+                    subscriber.put({"plan": plan_name,
+                                    "status": self._statuses[plan_name]})
+
+        if missing:
+            self.poll(missing, initial_subscriber=subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.pop(subscriber, None)
+
+    def get_watched_plans(self):
+        expire_before = time.time() - self.idle_timeout
+        with self._lock:
+            for plan_name, requested in self._requested.items():
+                if requested < expire_before:
+                    del self._requested[plan_name]
+
+            plan_names = set(self._requested.keys())
+            for subscribed in self._subscribers.values():
+                plan_names.update(subscribed)
+
+            # forget the statuses nobody watches anymore
+            for plan_name in self._statuses.keys():
+                if plan_name not in plan_names:
+                    del self._statuses[plan_name]
+
+        return sorted(plan_names)
+
+    def poll(self, plan_names, initial_subscriber=None):
+        results = fan_out(query_status, plan_names,
+                          timeout=self.poll_timeout,
+                          max_workers=self.poll_workers)
+
+        for result in results:
+            if result.done and result.error is None:
+                status = result.value
+            else:
+                status = {"error": "%s" % (result.error or "timed out")}
+            self._update_status(result.item, status, initial_subscriber)
+
+    def _update_status(self, plan_name, status, initial_subscriber=None):
+        with self._lock:
+            old_status = self._statuses.get(plan_name)
+            self._statuses[plan_name] = status
+
+            for subscriber, plan_names in self._subscribers.items():
+                if plan_name not in plan_names:
+                    continue
+                if subscriber is initial_subscriber or old_status is None:
+                    subscriber.put({"plan": plan_name, "status": status})
+                elif status != old_status:
+                    subscriber.put({"plan": plan_name,
+                                    "changes": diff_status(old_status,
+                                                           status)})
+
+    def _run(self):
+        while not self._stopped.is_set():
+            started = time.time()
+            plan_names = self.get_watched_plans()
+            if plan_names:
+                try:
+                    self.poll(plan_names)
+                except Exception, e:
+                    mongoctl_logging.log_exception(e)
+
+            self._stopped.wait(max(self.interval - (time.time() - started),
+                                   0))
+
+
+def query_status(plan_name):
+    status = run_mongoctl_command(["status", plan_name])
+    if not status or status == "Error":
+        return {"error": "Unable to get the status of '%s'" % plan_name}
+    return json.loads(status)
+
+
+def diff_status(old, new, prefix=""):
+    """
+        @return: {<dotted path>: <new value>} for each field of new that is
+        not the same in old (None for the fields that are gone)
+    """
+    changes = {}
+    if isinstance(old, list) and isinstance(new, list):
+        old = dict((str(i), value) for i, value in enumerate(old))
+        new = dict((str(i), value) for i, value in enumerate(new))
+    elif not (isinstance(old, dict) and isinstance(new, dict)):
+        if old != new:
+            changes[prefix.rstrip(".")] = new
+        return changes
+
+    for key in set(old.keys()) | set(new.keys()):
+        if key not in new:
+            changes[prefix + key] = None
+        elif key not in old:
+            changes[prefix + key] = new[key]
+        else:
+            changes.update(diff_status(old[key], new[key],
+                                       prefix + key + "."))
+    return changes
+
+
+__status_poller = None
+__status_poller_lock = threading.Lock()
+
+
+def get_status_poller():
+    global __status_poller
+
+    with __status_poller_lock:
+        if __status_poller is None:
+            __status_poller = StatusPoller(__ting_service_status_interval,
+                                           __ting_service_status_idle,
+                                           __ting_service_status_timeout,
+                                           __ting_service_status_workers)
+            __status_poller.start()
+        return __status_poller
+
+
+def stop_status_poller():
+    global __status_poller
+
+    with __status_poller_lock:
+        if __status_poller is not None:
+            __status_poller.stop()
+        __status_poller = None
+
+
+#################################################
+# Config files watcher
+#################################################
+
+class ConfigWatcher(object):
+    """
+        Reloads the servers/clusters config files that changed every
+        interval seconds in a background thread.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                repository.reload_all_configured_documents()
+            except Exception, e:
+                mongoctl_logging.log_exception(e)
+
+
+__config_watcher = None
+
+
+def start_config_watcher():
+    global __config_watcher
+
+    if __config_watcher is None:
+        __config_watcher = ConfigWatcher(__ting_service_config_check_interval)
+        __config_watcher.start()
+    return __config_watcher
 
-    plan_name = request.form["plan_name"]
-    uri = mongoctl.execute(["print-uri", plan_name])
-    return uri
 
+def stop_config_watcher():
+    global __config_watcher
 
+    if __config_watcher is not None:
+        __config_watcher.stop()
+    __config_watcher = None
 
 
 #################################################
@@ -114,6 +710,10 @@ if __name__ == "__main__":
     kill_listeners()
     mongoctl_logging.setup_logging(log_to_stdout=False)
     mongoctl.setup(True)
+    if os.getenv(mongoctl.CONF_ROOT_ENV_VAR) is not None:
+        config._set_config_root(os.getenv(mongoctl.CONF_ROOT_ENV_VAR))
+    start_worker_pools()
+    start_config_watcher()
 
-    app.run(port=__ting_service_ops_port)
+    app.run(port=__ting_service_ops_port, threaded=True)
 